@@ -2,11 +2,18 @@
 In this package there will be types used to construct the AST of the stylus
 language. It will be convertible to stylus or css tokens and strings
 """
+import threading
+
+_load_lock = threading.RLock()
+""" Guards the parsing of LazyBlocks (a tree can be evaluated by many threads
+at once). Reentrant, since the hooks of a block can load the blocks in it """
 
 
 class ASTNode(object):
     postfix_allowed = False
-    pass
+    line_num = None
+    """ The line the node starts on (set by the parser for the statements of
+    the root) """
 
 
 class Statement(ASTNode):
@@ -14,6 +21,12 @@ class Statement(ASTNode):
 
 
 class Block(ASTNode):
+    symbols = None
+    """ type: stylus.scope.SymbolTable (set by the ScopeAnalyzer) """
+    is_shared = False
+    """ Whether the (evaluated) block is shared between mixin calls, so its
+    statements are frozen (see stylus.call_cache) """
+
     def __init__(self, parent):
         """
         :param Block|None parent: Parent block
@@ -24,6 +37,67 @@ class Block(ASTNode):
         """ type: list[Statement] """
 
 
+class LazyBlock(Block):
+    """
+    A block whose statements are kept as the tokens they were lexed into,
+    and parsed only when they're first accessed (used for function bodies,
+    since most of the functions of a library are never called)
+    """
+    def __init__(self, parent, tokens, parse):
+        """
+        :param Block|None parent: Parent block
+        :param list[Token] tokens: The tokens of the block (from its indent to
+            its outdent)
+        :param parse: A function that parses the tokens of a LazyBlock into a
+            list of statements
+        """
+        super(LazyBlock, self).__init__(parent)
+        self._statements = None
+        self._ready = False
+        """ Whether the block was parsed and its on_load hooks ran """
+        self.tokens = tokens
+        self.parse = parse
+        self.on_load = []
+        """ Functions to call with the block once it's parsed (the passes that
+        already ran on the tree register here to run on the block later) """
+
+    @property
+    def is_loaded(self):
+        return self._statements is not None
+
+    def load(self):
+        """ Parses the block (if it wasn't parsed yet) """
+        if not self._ready:
+            with _load_lock:
+                if self._statements is None:
+                    self._statements = self.parse(self)
+                    self.tokens = None
+                    hooks, self.on_load = self.on_load, []
+                    for hook in hooks:
+                        hook(self)
+                    self._ready = True
+        return self
+
+    @property
+    def statements(self):
+        if not self._ready:
+            self.load()
+        return self._statements
+
+    @statements.setter
+    def statements(self, statements):
+        # the statements replace the body, so its tokens are never parsed
+        self._statements = statements
+        self.tokens = None
+        self.on_load = []
+        self._ready = True
+
+
+def is_unloaded(block):
+    """ Whether the block is a LazyBlock that wasn't parsed yet """
+    return isinstance(block, LazyBlock) and not block.is_loaded
+
+
 class Root(Block):
     """
     This represents the root node of the AST, one with no parents
@@ -35,32 +109,99 @@ class Root(Block):
 class Expression(ASTNode):
     @property
     def value(self):
+        """ The value of a constant expression. Anything else has to be
+        evaluated (see stylus.evaluator)
+        """
         raise NotImplementedError()
 
 
+class Literal(Expression):
+    """ A constant value (a number, color, string, etc. from ast.values) """
+
+    def __init__(self, value):
+        self._value = value
+
+    @property
+    def value(self):
+        return self._value
+
+
+class ExpressionList(Expression):
+    """ A list of expressions, separated by spaces or commas (1px solid red) """
+
+    def __init__(self, items, separator=' '):
+        self.items = list(items)
+        self.separator = separator
+
+
+class BinaryOperation(Expression):
+    def __init__(self, op, left, right):
+        self.op = op
+        self.left = left
+        self.right = right
+
+
+class UnaryOperation(Expression):
+    def __init__(self, op, operand):
+        self.op = op
+        self.operand = operand
+
+
+class Ternary(Expression):
+    """ cond ? true_expr : false_expr """
+
+    def __init__(self, condition, true_expr, false_expr):
+        self.condition = condition
+        self.true_expr = true_expr
+        self.false_expr = false_expr
+
+
 class FunctionCall(Expression):
-    pass
+    """ A call of a function (or a mixin, when used as a statement) """
+    binding = None
+    """ type: stylus.scope.Binding (None for built-in and CSS functions) """
+
+    def __init__(self, name, args=None):
+        """
+        :param str name: The name of the called function
+        :param list[Expression] args: The arguments expressions
+        """
+        self.name = name
+        self.args = args or []
 
 
 class Identifier(Expression):
     """ A named identifier and a value assigned to it"""
+    binding = None
+    """ type: stylus.scope.Binding (set by the ScopeAnalyzer) """
+    address = None
+    """ type: (int, int) where the value is assigned (set by the ScopeAnalyzer) """
 
-    def __init__(self, name, value=None, is_mixin=False):
+    def __init__(self, name, value=None, is_mixin=False, is_default=False):
+        """
+        :param Expression value: The assigned value (None for a reference)
+        :param bool is_default: Whether it's assigned only if not defined
+            already (name ?= value)
+        """
         # TODO: What's the deal with the mixin parameter? (ewino@2015-01-23)
         self.name = name
         self._value = value
+        self.is_default = is_default
 
+    @property
     def value(self):
         return self._value
 
+    @value.setter
+    def value(self, value):
+        self._value = value
+
 
 class Conditional(Expression):
     """
     A conditional expression with a condition, and values (or statements) for
-    when it is true or false
+    when it is true or false. The condition is evaluated by the evaluator.
     """
-    # TODO: Implement this (value should return after evaluating the
-    # condition expression as boolean and deciding (ewino@2015-01-23)
 
     def __init__(self, condition, true_block=None, negate=False,
                  is_postfix=False):
@@ -81,11 +222,64 @@ class LoopBlock(Block):
 
 
 class SelectorBlock(Block):
-    def __init__(self, selectors):
-        super(SelectorBlock, self).__init__(parent=None)
+    def __init__(self, selectors, parent=None):
+        super(SelectorBlock, self).__init__(parent=parent)
         self.selectors = []
         if selectors:
             if isinstance(selectors, basestring):
                 selectors = [selectors]
             if isinstance(selectors, list):
                 self.selectors += selectors
+
+
+class Extend(Statement):
+    """
+    An @extend directive. The selectors of the block containing it are added
+    to every rule matching one of the extended selectors
+    """
+    def __init__(self, selectors, optional=False):
+        """
+        :param list[str] selectors: The selectors to extend
+        :param bool optional: Whether to silently ignore selectors that are not
+            found (@extend .foo !optional)
+        """
+        super(Extend, self).__init__()
+        self.selectors = list(selectors)
+        self.optional = optional
+
+
+class Property(Statement):
+    """ A CSS property (color red / color: red) """
+    def __init__(self, name, expr):
+        """
+        :param str name: The property name
+        :param Expression expr: The property value
+        """
+        super(Property, self).__init__()
+        self.name = name
+        self.expr = expr
+
+
+class Return(Statement):
+    def __init__(self, expr=None):
+        super(Return, self).__init__()
+        self.expr = expr
+
+
+class Function(Statement):
+    """ A function (or mixin) definition """
+    symbols = None
+    address = None
+    cacheable = None
+    """ Whether calls can be cached (set by stylus.call_cache.is_cacheable) """
+    def __init__(self, name, params, block):
+        """
+        :param str name: The function name
+        :param list[Identifier] params: The parameters, with their default
+            values (if any)
+        :param Block block: The function body
+        """
+        super(Function, self).__init__()
+        self.name = name
+        self.params = params
+        self.block = block
@@ -1 +1,3 @@
-from colors import Color
\ No newline at end of file
+from colors import Color, ColorArray, pack, unpack, parse_hex
+from numeric import Number
+from literals import String, Ident, ValueList
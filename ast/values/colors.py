@@ -1,3 +1,96 @@
+from array import array
 from collections import namedtuple
 
-Color = namedtuple('Color', ['r', 'g', 'b', 'a'])
\ No newline at end of file
+from ...utils import LRUCache, chunks
+
+Color = namedtuple('Color', ['r', 'g', 'b', 'a'])
+
+# The typecode of an unsigned 32 bit int (for packed colors)
+PACKED_TYPECODE = 'I' if array('I').itemsize == 4 else 'L'
+
+_hex_cache = LRUCache(4096)
+
+
+def pack(color):
+    """
+    Packs a color into a 32 bit int (0xRRGGBBAA). The alpha channel is stored
+    in 8 bits (like #rrggbbaa), so it's rounded to the nearest 1/255
+    :param Color color: The color
+    :rtype: int
+    """
+    return (color.r << 24 | color.g << 16 | color.b << 8 |
+            int(round(color.a * 255)))
+
+
+def unpack(packed):
+    """ :return: The Color of a packed (0xRRGGBBAA) int """
+    packed = int(packed)
+    return Color(packed >> 24 & 0xff, packed >> 16 & 0xff, packed >> 8 & 0xff,
+                 (packed & 0xff) / 255.0)
+
+
+def parse_hex(digits):
+    """
+    Parses the digits of a hex color (#n, #nn, #rgb, #rgba, #rrggbb or
+    #rrggbbaa, without the #). The same literals appear all over a sheet, so
+    the results are cached
+    :param str digits: The hex digits
+    :rtype: Color
+    """
+    color = _hex_cache.get(digits)
+    if color is None:
+        if len(digits) in (2, 6, 8):
+            parts = map(''.join, chunks(digits, 2))  # divide to parts
+        else:
+            parts = [c * 2 for c in digits]  # double each char
+        values = [int(part, 16) for part in parts]
+        if len(values) == 1:
+            values *= 3
+        if len(values) == 3:
+            values.append(255)
+        r, g, b, a = values
+        color = _hex_cache[digits] = Color(r, g, b, a / 255.0)
+    return color
+
+
+class ColorArray(object):
+    """
+    A sequence of colors stored as packed RGBA ints (see pack()), for
+    working on whole palettes at once (see stylus.color_batch). Items are
+    unpacked into Colors when accessed
+    """
+    def __init__(self, packed=None):
+        """
+        :param packed: Packed colors (an iterable of ints or an array)
+        """
+        super(ColorArray, self).__init__()
+        if isinstance(packed, array) and packed.typecode == PACKED_TYPECODE:
+            self.packed = packed
+        else:
+            self.packed = array(PACKED_TYPECODE, packed or ())
+
+    @classmethod
+    def from_colors(cls, colors):
+        """ :param list[Color] colors: The colors to pack """
+        return cls(pack(color) for color in colors)
+
+    def __len__(self):
+        return len(self.packed)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return ColorArray(self.packed[index])
+        return unpack(self.packed[index])
+
+    def __iter__(self):
+        for packed in self.packed:
+            yield unpack(packed)
+
+    def __eq__(self, other):
+        return isinstance(other, ColorArray) and self.packed == other.packed
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return '<ColorArray of %d colors>' % len(self)
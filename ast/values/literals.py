@@ -0,0 +1,5 @@
+from collections import namedtuple
+
+String = namedtuple('String', ['val', 'quote'])
+Ident = namedtuple('Ident', ['name'])
+ValueList = namedtuple('ValueList', ['items', 'separator'])
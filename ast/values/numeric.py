@@ -0,0 +1,3 @@
+from collections import namedtuple
+
+Number = namedtuple('Number', ['val', 'unit'])
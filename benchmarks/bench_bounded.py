@@ -0,0 +1,102 @@
+"""
+Benchmark for memory-bounded compilation: compiles a generated bundle with
+render() (the whole tree in memory) and with the BoundedCompiler, each in a
+fresh interpreter, and compares their time, peak resident memory and output.
+The run fails when the bounded compilation grows the process by more than its
+budget.
+
+Usage: python benchmarks/bench_bounded.py [rules] [budget_mb]
+"""
+import os
+import subprocess
+import sys
+import tempfile
+
+from common import REPO_DIR
+
+child = r'''
+import hashlib
+import resource
+import sys
+import time
+
+stylus = __import__(%(package)r + '.stylus', fromlist=['render'])
+path, mode, budget = sys.argv[1], sys.argv[2], int(sys.argv[3])
+start = time.time()
+if mode == 'render':
+    with open(path) as source:
+        css = stylus.render(source.read().decode('utf-8'))
+    report = None
+else:
+    compiler = stylus.BoundedCompiler(memory_budget=budget)
+    with open(path) as source:
+        css = compiler.compile(source)
+    report = compiler.report
+elapsed = time.time() - start
+print elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, \
+    hashlib.md5(css).hexdigest()
+print report
+print report is not None and report.peak > report.budget
+'''
+
+
+def build_bundle(path, rule_count):
+    with open(path, 'w') as bundle:
+        bundle.write('$brand = #3366cc\n$gutter = 8px\n'
+                     'button(c)\n'
+                     '  color c\n'
+                     '  background darken(c, 10%)\n'
+                     '  &:hover\n'
+                     '    background darken(c, 20%)\n'
+                     '$card\n'
+                     '  border 1px solid #ddd\n\n')
+        for i in xrange(rule_count):
+            bundle.write('.block-%d\n' % i)
+            bundle.write('  padding $gutter * %d\n' % (i % 4 + 1))
+            bundle.write('  width %d%%\n' % (i % 100))
+            if i % 10 == 0:
+                bundle.write('  button($brand)\n')
+            if i % 25 == 0:
+                bundle.write('  @extend $card\n')
+            bundle.write('  .title\n    font-size %dpx\n\n' % (i % 12 + 10))
+
+
+def run(path, mode, budget):
+    package_dir, package = os.path.split(REPO_DIR)
+    output = subprocess.check_output(
+        [sys.executable, '-c', child % {'package': package}, path, mode,
+         str(budget)], cwd=package_dir)
+    first, report, over_budget = output.splitlines()[:3]
+    elapsed, max_rss, digest = first.split()
+    return float(elapsed), int(max_rss), digest, report, over_budget == 'True'
+
+
+def main(rule_count=10000, budget_mb=64):
+    budget = budget_mb << 20
+    fd, path = tempfile.mkstemp(suffix='.styl')
+    os.close(fd)
+    try:
+        build_bundle(path, rule_count)
+        print 'bundle: %d rules, %.1f MB' % (rule_count,
+                                              os.path.getsize(path) / 1e6)
+        results = {}
+        for mode in ('render', 'bounded'):
+            elapsed, max_rss, digest, report, over_budget = run(path, mode,
+                                                                budget)
+            results[mode] = digest
+            print '%-8s %7.2f secs, peak rss %7.1f MB' % (
+                mode, elapsed, max_rss / 1024.0)
+            if report != 'None':
+                print '         %s' % report
+        if results['render'] != results['bounded']:
+            print 'different output'
+            sys.exit(1)
+        if over_budget:
+            print 'over the budget of %d MB' % budget_mb
+            sys.exit(1)
+    finally:
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,68 @@
+"""
+Benchmark for palette generation: lighten, darken, mix and contrast over
+thousands of colors, one built-in call per color vs the batch API (which is
+vectorized when NumPy is installed).
+
+Usage: python benchmarks/bench_colors.py [palette_size]
+"""
+import random
+import sys
+import time
+
+from common import import_module
+
+values = import_module('ast.values')
+Color, Number, ColorArray = values.Color, values.Number, values.ColorArray
+color_batch = import_module('stylus.color_batch')
+builtins = import_module('stylus.functions').builtins
+
+
+def make_palette(size, distinct=None):
+    """ A palette of size random colors (out of `distinct` different ones) """
+    rand = random.Random(size)
+    distinct = distinct or size
+    colors = [Color(rand.randint(0, 255), rand.randint(0, 255),
+                    rand.randint(0, 255), 1.0) for _ in xrange(distinct)]
+    return [colors[i % distinct] for i in xrange(size)]
+
+
+def run_builtins(colors):
+    lighten, darken = builtins['lighten'], builtins['darken']
+    mix, contrast = builtins['mix'], builtins['contrast']
+    for func in (lighten, darken, mix, contrast):
+        func.cache.clear()
+    black = Color(0, 0, 0, 1.0)
+    amount = Number(20.0, '%')
+    start = time.time()
+    for color in colors:
+        lighten([color, amount])
+        darken([color, amount])
+        mix([color, black])
+        contrast([color])
+    return time.time() - start
+
+
+def run_batch(colors):
+    palette = ColorArray.from_colors(colors)
+    black = Color(0, 0, 0, 1.0)
+    amount = Number(20.0, '%')
+    start = time.time()
+    color_batch.lighten(palette, amount)
+    color_batch.darken(palette, amount)
+    color_batch.mix(palette, black)
+    color_batch.contrast(palette)
+    return time.time() - start
+
+
+def main(size=20000):
+    print 'NumPy: %s' % ('yes' if color_batch.has_numpy else 'no')
+    print '%8s %10s %10s %10s' % ('colors', 'distinct', 'builtins', 'batch')
+    for distinct in (size, size // 50):
+        colors = make_palette(size, distinct)
+        print '%8d %10d %10.3f %10.3f' % (size, distinct,
+                                          run_builtins(colors),
+                                          run_batch(colors))
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
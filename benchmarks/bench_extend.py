@@ -0,0 +1,64 @@
+"""
+Benchmark for @extend resolution: thousands of (partly chained) extends over
+large rule sets. The time per rule should stay flat as the sheet grows.
+
+Usage: python benchmarks/bench_extend.py [max_rules]
+"""
+import sys
+import time
+
+from common import import_module
+
+ast = import_module('ast')
+Root, SelectorBlock, Extend = ast.Root, ast.SelectorBlock, ast.Extend
+Normalizer = import_module('stylus.normalizer').Normalizer
+
+
+def build_tree(rule_count, extend_every=2, chain_every=5):
+    """
+    Builds a tree with rule_count rules (each with a nested rule), where every
+    `extend_every` rule extends an earlier rule and every `chain_every` rule
+    extends a placeholder
+    """
+    root = Root()
+    for i in xrange(rule_count):
+        block = SelectorBlock(['.rule-%d' % i, '.alias-%d' % i], parent=root)
+        block.statements.append('color: red')
+        nested = SelectorBlock(['&:hover', '.child'], parent=block)
+        nested.statements.append('color: blue')
+        block.statements.append(nested)
+        if i and i % extend_every == 0:
+            block.statements.append(Extend(['.rule-%d' % (i // 2)]))
+        if i % chain_every == 0:
+            block.statements.append(Extend(['$placeholder-%d' % (i % 50)]))
+        root.statements.append(block)
+    for i in xrange(50):
+        placeholder = SelectorBlock(['$placeholder-%d' % i], parent=root)
+        placeholder.statements.append('margin: 0')
+        root.statements.append(placeholder)
+    return root
+
+
+def run(rule_count):
+    root = build_tree(rule_count)
+    start = time.time()
+    rules = Normalizer(root).normalize()
+    elapsed = time.time() - start
+    selectors = sum(len(rule.selectors) for rule in rules)
+    return elapsed, len(rules), selectors
+
+
+def main(max_rules=16000):
+    rule_count = 1000
+    print '%8s %8s %10s %10s %12s' % ('rules', 'output', 'selectors', 'secs',
+                                      'usec/rule')
+    while rule_count <= max_rules:
+        elapsed, rules, selectors = run(rule_count)
+        print '%8d %8d %10d %10.3f %12.1f' % (
+            rule_count, rules, selectors, elapsed,
+            elapsed * 1e6 / rule_count)
+        rule_count *= 2
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
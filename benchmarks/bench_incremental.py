@@ -0,0 +1,85 @@
+"""
+Benchmark for incremental rebuilds: compiles a generated bundle (about 2 MB
+at the default size) with the IncrementalCompiler, then rebuilds it after
+editing one rule and after changing a root variable, and compares each
+rebuild with a full build (by a new compiler).
+
+Only the changed chunks are lexed again, and only the statements whose
+fingerprints changed are evaluated and emitted again. Every rebuild still
+parses the whole sheet (from the kept tokens), so parsing is the floor of the
+rebuild time. The bundle has no @extend directives, since a sheet with them
+is normalized and emitted as a whole on every build. There are no source maps
+to splice: the output range of each statement is in
+IncrementalCompiler.ranges.
+
+Usage: python benchmarks/bench_incremental.py [rules]
+"""
+import os
+import sys
+import tempfile
+import time
+
+from bench_bounded import build_bundle
+from common import import_module
+
+instrumentation = import_module('stylus.instrumentation')
+IncrementalCompiler = import_module('stylus.incremental').IncrementalCompiler
+
+counters = [('lexed_chunks', 'lexed'), ('reused_chunks', 'kept tokens'),
+            ('evaluated_statements', 'evaluated'),
+            ('reused_statements', 'spliced')]
+""" The counters of the incremental stats, and their columns """
+
+
+def make_source(rule_count):
+    fd, path = tempfile.mkstemp(suffix='.styl')
+    os.close(fd)
+    try:
+        build_bundle(path, rule_count)
+        with open(path) as bundle:
+            source = bundle.read().decode('utf-8')
+    finally:
+        os.remove(path)
+    return source.replace('  @extend $card\n', '')
+
+
+def timed(function, *args):
+    start = time.time()
+    result = function(*args)
+    return time.time() - start, result
+
+
+def main(rule_count=26000):
+    source = make_source(rule_count)
+    print 'bundle: %d rules, %.1f MB' % (rule_count,
+                                          len(source.encode('utf-8')) / 1e6)
+    stats = instrumentation.get_stats('incremental')
+    compiler = IncrementalCompiler()
+    builds = [
+        ('first build', source),
+        ('one rule edited', source.replace('.block-%d\n' % (rule_count // 2),
+                                           '.block-edited\n', 1)),
+        ('$gutter changed', source.replace('$gutter = 8px', '$gutter = 6px',
+                                           1)),
+    ]
+    print '%-16s %9s %9s  %s' % ('build', 'secs', 'full', ' '.join(
+        '%11s' % column for _, column in counters))
+    failed = False
+    for name, text in builds:
+        before = dict((counter, stats.counters.get(counter, 0))
+                      for counter, _ in counters)
+        elapsed, css = timed(compiler.compile, text)
+        counts = ['%11d' % (stats.counters.get(counter, 0) - before[counter])
+                  for counter, _ in counters]
+        full_elapsed, expected = timed(IncrementalCompiler().compile, text)
+        print '%-16s %9.2f %9.2f  %s' % (name, elapsed, full_elapsed,
+                                         ' '.join(counts))
+        if css != expected:
+            print '%s: different output' % name
+            failed = True
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,67 @@
+"""
+Benchmark for the lexer profiles: lexes a commented stylus sheet with the
+default and production profiles, and a plain CSS sheet with the css profile.
+
+Usage: python benchmarks/bench_lexer.py [rules]
+"""
+import sys
+import time
+
+from common import import_module
+
+lexer = import_module('stylus.lexer')
+tokens = import_module('stylus.tokens')
+
+
+def build_stylus(rule_count):
+    lines = ['// generated sheet', '$brand = #3366cc', '']
+    for i in xrange(rule_count):
+        lines.extend([
+            '/* rule %d */' % i,
+            '.rule-%d' % i,
+            '  color $brand // the brand color',
+            '  width %dpx' % (i % 100),
+            '',
+        ])
+    return u'\n'.join(lines)
+
+
+def build_css(rule_count):
+    lines = []
+    for i in xrange(rule_count):
+        lines.extend([
+            '/* rule %d */' % i,
+            '.rule-%d {' % i,
+            '  color: #3366cc;',
+            '  width: %dpx;' % (i % 100),
+            '}',
+        ])
+    return u'\n'.join(lines)
+
+
+def run(source, profile):
+    lex = lexer.StylusLexer(source, profile=profile)
+    count = 0
+    start = time.time()
+    while not isinstance(lex.next(), tokens.EOFToken):
+        count += 1
+    return time.time() - start, count
+
+
+def main(rule_count=500):
+    cases = [
+        ('stylus', build_stylus(rule_count), 'default'),
+        ('stylus', build_stylus(rule_count), 'production'),
+        ('css', build_css(rule_count), 'default'),
+        ('css', build_css(rule_count), 'css'),
+    ]
+    print '%8s %12s %8s %10s %12s' % ('source', 'profile', 'tokens', 'secs',
+                                      'tokens/sec')
+    for name, source, profile in cases:
+        elapsed, count = run(source, profile)
+        print '%8s %12s %8d %10.3f %12.0f' % (name, profile, count, elapsed,
+                                             count / elapsed)
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
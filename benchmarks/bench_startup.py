@@ -0,0 +1,77 @@
+"""
+Benchmark for cold start: the time from a fresh interpreter to the first
+token of a small file, which is what the CLI and pre-commit hooks pay for
+every file they compile.
+
+Each run starts a new interpreter. Python 2 has no -X importtime, so the child
+times its imports with an __import__ hook, and the slowest ones (with the
+time of the modules they import) are listed like importtime does. The run
+fails when the median time to the first token is over the budget.
+
+Usage: python benchmarks/bench_startup.py [runs] [budget_ms]
+"""
+import os
+import subprocess
+import sys
+
+from common import REPO_DIR
+
+child = r'''
+import __builtin__
+import sys
+import time
+
+times = {}
+real_import = __builtin__.__import__
+
+
+def timed_import(name, globals=None, locals=None, fromlist=None, level=-1):
+    start = time.time()
+    try:
+        return real_import(name, globals, locals, fromlist, level)
+    finally:
+        times[name] = times.get(name, 0) + time.time() - start
+
+__builtin__.__import__ = timed_import
+start = time.time()
+lexer = __import__(%(package)r + '.stylus.lexer', fromlist=['StylusLexer'])
+token = lexer.StylusLexer(u'.a\n  color red\n').next()
+elapsed = time.time() - start
+__builtin__.__import__ = real_import
+
+modules = [name for name in sys.modules
+           if name.startswith(%(package)r) and sys.modules[name] is not None]
+print elapsed, len(modules)
+for name, secs in sorted(times.items(), key=lambda item: -item[1])[:8]:
+    print '%%8.2f  %%s' %% (secs * 1000, name)
+'''
+
+
+def run_once():
+    package_dir, package = os.path.split(REPO_DIR)
+    output = subprocess.check_output(
+        [sys.executable, '-c', child % {'package': package}],
+        cwd=package_dir)
+    lines = output.splitlines()
+    elapsed, modules = lines[0].split()
+    return float(elapsed), int(modules), lines[1:]
+
+
+def main(runs=10, budget_ms=100):
+    results = [run_once() for _ in xrange(runs)]
+    times = sorted(elapsed for elapsed, _, _ in results)
+    median = times[len(times) // 2]
+    _, modules, slowest = results[-1]
+    print 'import to first token: median %.1f ms, best %.1f ms (%d runs)' % (
+        median * 1000, times[0] * 1000, runs)
+    print 'package modules loaded: %d' % modules
+    print 'slowest imports (ms, cumulative, last run):'
+    for line in slowest:
+        print line
+    if median * 1000 > budget_ms:
+        print 'over the budget of %d ms' % budget_ms
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,19 @@
+"""
+Shared helpers for the benchmark scripts
+"""
+import importlib
+import os
+import sys
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The modules are imported through the repository package (relative imports
+# like ..ast). The repository itself isn't put on the path, so its ast package
+# doesn't shadow the standard library's
+sys.path.insert(0, os.path.dirname(REPO_DIR))
+
+
+def import_module(name):
+    """ Imports a module of the repository package (e.g. 'stylus.parser',
+    'ast.values') """
+    return importlib.import_module('%s.%s' % (os.path.basename(REPO_DIR), name))
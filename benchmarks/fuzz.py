@@ -0,0 +1,622 @@
+"""
+Differential fuzzing of the fast paths: random stylus sheets are run through
+the baseline lexer, parser and compiler, and through every optimised mode,
+and the results have to be identical:
+- tokens: the production profile (the baseline's tokens without comments),
+  the css profile (on plain CSS sheets), and lexing again after a
+  snapshot()/restore() (speculative parsing)
+- trees: the production profile, eager function bodies (lazy_bodies=False)
+  and the recover mode (same tree and no errors, or errors recorded rather
+  than raised where the baseline raises)
+- selectors: every selector of a generated sheet is in the baseline's tree as
+  it was written (the modes all share the selector scanner, so comparing
+  them with the baseline can't catch its bugs)
+- CSS: IncrementalCompiler (a first build, and a rebuild after an edit),
+  BoundedCompiler, VariantCompiler and SharedCompiler, and
+  VariantCompiler.compile_all in worker processes with --parallel
+Where the baseline raises, every mode has to raise the same type of error
+(the BoundedCompiler only has to raise one: it evaluates a chunk of the sheet
+before parsing the next).
+
+Every sheet, and some pathological ones (long selector lists, attribute
+selectors scanned by the lexer's selector rule, nested comments, deep
+nesting, long lines), is also timed at two sizes: lexing and parsing taking
+more than `slack` times the linear growth is flagged as super-linear.
+Failing and super-linear inputs are saved to fuzz_cases/ and replayed by
+every later run before the random ones.
+
+Usage: python benchmarks/fuzz.py [cases] [seed] [--parallel]
+"""
+import glob
+import hashlib
+import os
+import random
+import sys
+import time
+import traceback
+from functools import partial
+
+from common import import_module
+
+lexer_module = import_module('stylus.lexer')
+parser_module = import_module('stylus.parser')
+tokens_module = import_module('stylus.tokens')
+ast_module = import_module('ast')
+exceptions = import_module('exceptions')
+Evaluator = import_module('stylus.evaluator').Evaluator
+Normalizer = import_module('stylus.normalizer').Normalizer
+CSSEmitter = import_module('stylus.emitter').CSSEmitter
+IncrementalCompiler = import_module('stylus.incremental').IncrementalCompiler
+BoundedCompiler = import_module('stylus.bounded').BoundedCompiler
+VariantCompiler = import_module('stylus.variants').VariantCompiler
+SharedCompiler = import_module('stylus.shared').SharedCompiler
+
+StylusLexer = lexer_module.StylusLexer
+StylusParser = parser_module.StylusParser
+EOFToken = tokens_module.EOFToken
+CommentToken = tokens_module.CommentToken
+ASTNode = ast_module.ASTNode
+LazyBlock = ast_module.LazyBlock
+SelectorBlock = ast_module.SelectorBlock
+
+CASES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                         'fuzz_cases')
+
+ERRORS = (exceptions.ParseError, exceptions.SyntaxError,
+          exceptions.CompileError)
+
+# Generation
+
+COLORS = ['#fff', '#336699', '#c0ffee', 'red', 'rgba(0, 0, 0, 0.5)',
+          'lighten(#336699, 20%)', 'darken($brand, 10%)']
+UNITS = ['px', 'em', '%', '', 'rem']
+PROPERTIES = ['color', 'background', 'margin', 'padding', 'width', 'height',
+              'border', 'z-index', 'font-size', 'line-height']
+PSEUDO = [':hover', ':first-child', ':nth-child(2n+1)', '::before',
+          ':not(.x)', ':-moz-focusring']
+
+
+class SheetGenerator(object):
+    """ Makes random (mostly valid) stylus sheets """
+    def __init__(self, rand):
+        super(SheetGenerator, self).__init__()
+        self.rand = rand
+        self.mixins = []
+        self.placeholders = []
+        self.classes = []
+        self.selectors = []
+        """ The selectors of the rules, as written """
+
+    def sheet(self, statements=12):
+        rand = self.rand
+        lines = ['$brand = %s' % rand.choice(COLORS[:4]),
+                 '$pad = %s' % self.number()]
+        for _ in xrange(statements):
+            kind = rand.random()
+            if kind < 0.1:
+                lines.extend(self.mixin())
+            elif kind < 0.15:
+                lines.extend(self.placeholder())
+            elif kind < 0.2:
+                lines.append('$%s = %s' % (rand.choice(['pad', 'gap', 'x']),
+                                           self.expression()))
+            elif kind < 0.25:
+                lines.append(self.comment())
+            elif kind < 0.3:
+                lines.extend(self.braces_rule())
+            elif kind < 0.35:
+                lines.extend(self.conditional(''))
+            else:
+                lines.extend(self.rule('', 0))
+            if rand.random() < 0.2:
+                lines.append('')
+        return u'\n'.join(lines) + u'\n'
+
+    def css_sheet(self, rules=10):
+        """ A plain CSS sheet (for the css profile) """
+        lines = []
+        for _ in xrange(rules):
+            lines.append('%s {' % ', '.join(self.selector('http:')
+                                            for _ in xrange(self.count(2))))
+            for _ in xrange(self.count(3)):
+                lines.append('  %s: %s;' % (self.rand.choice(PROPERTIES),
+                                            self.number()))
+            lines.append('}')
+            if self.rand.random() < 0.3:
+                lines.append('/* %s */' % self.word())
+        return u'\n'.join(lines) + u'\n'
+
+    def count(self, most):
+        return self.rand.randint(1, most)
+
+    def word(self):
+        return self.rand.choice(['a', 'btn', 'card', 'nav', 'x-y', 'item2'])
+
+    def number(self):
+        rand = self.rand
+        value = rand.choice(['%d' % rand.randint(0, 20),
+                             '%.1f' % rand.uniform(0, 5)])
+        return value + rand.choice(UNITS)
+
+    def expression(self):
+        rand = self.rand
+        kind = rand.random()
+        if kind < 0.3:
+            return self.number()
+        if kind < 0.5:
+            return rand.choice(COLORS)
+        if kind < 0.7:
+            return '$pad * %d' % rand.randint(1, 4)
+        if kind < 0.8:
+            return '%s %s' % (self.number(), self.number())
+        if kind < 0.9:
+            return '"%s" + "%s"' % (self.word(), self.word())
+        return '$pad > 2px ? %s : %s' % (self.number(), self.number())
+
+    def selector(self, attribute_prefix='//'):
+        """
+        :param str attribute_prefix: The start of the attribute values (// is
+            a comment in stylus, and not in CSS)
+        """
+        rand = self.rand
+        parts = []
+        for _ in xrange(self.count(3)):
+            part = rand.choice(['.', '#', '', '.']) + self.word()
+            if rand.random() < 0.2:
+                part += rand.choice(PSEUDO)
+            if rand.random() < 0.1:
+                part += '[href^="%s%s"]' % (attribute_prefix, self.word())
+            parts.append(part)
+        selector = rand.choice([' ', ' > ', ' + ', ' ~ ']).join(parts)
+        if selector.startswith('.'):
+            self.classes.append(selector)
+        return selector
+
+    def comment(self):
+        if self.rand.random() < 0.5:
+            return '// %s' % self.word()
+        return '/* %s */' % self.word()
+
+    def properties(self, indent):
+        rand = self.rand
+        lines = []
+        for _ in xrange(self.count(3)):
+            lines.append('%s%s %s' % (indent, rand.choice(PROPERTIES),
+                                      self.expression()))
+        if self.mixins and rand.random() < 0.3:
+            lines.append('%s%s(%s)' % (indent, rand.choice(self.mixins),
+                                       self.number()))
+        if self.placeholders and rand.random() < 0.2:
+            lines.append('%s@extend %s' % (indent,
+                                           rand.choice(self.placeholders)))
+        elif self.classes and rand.random() < 0.05:
+            lines.append('%s@extend %s' % (indent, rand.choice(self.classes)))
+        if rand.random() < 0.1:
+            lines.append('%s%s' % (indent, self.comment()))
+        return lines
+
+    def rule(self, indent, depth):
+        rand = self.rand
+        selectors = [self.selector() for _ in xrange(self.count(2))]
+        if depth and rand.random() < 0.4:
+            selectors = ['&' + rand.choice(PSEUDO + ['.on'])]
+        self.selectors.extend(selectors)
+        if rand.random() < 0.5:
+            lines = ['%s%s' % (indent, ', '.join(selectors))]
+        else:
+            lines = ['%s%s' % (indent, selector) for selector in
+                     [selector + ',' for selector in selectors[:-1]] +
+                     selectors[-1:]]
+        inner = indent + '  '
+        lines.extend(self.properties(inner))
+        if depth < 3 and rand.random() < 0.4:
+            lines.extend(self.rule(inner, depth + 1))
+        if rand.random() < 0.1:
+            lines.extend(self.conditional(inner))
+        if rand.random() < 0.1:
+            lines.append('%sfor i in 1..%d' % (inner, rand.randint(1, 3)))
+            lines.append('%s  z-index i' % inner)
+        return lines
+
+    def braces_rule(self):
+        selector = self.selector()
+        self.selectors.append(selector)
+        lines = ['%s {' % selector]
+        for _ in xrange(self.count(3)):
+            lines.append('  %s: %s;' % (self.rand.choice(PROPERTIES),
+                                        self.number()))
+        lines.append('}')
+        return lines
+
+    def conditional(self, indent):
+        lines = ['%sif $pad > %s' % (indent, self.number())]
+        if indent:
+            lines.extend(self.properties(indent + '  '))
+        else:
+            lines.extend(self.rule('  ', 1))
+        if self.rand.random() < 0.5:
+            lines.append('%selse' % indent)
+            if indent:
+                lines.extend(self.properties(indent + '  '))
+            else:
+                lines.extend(self.rule('  ', 1))
+        return lines
+
+    def mixin(self):
+        name = 'mix-%s%d' % (self.word(), len(self.mixins))
+        lines = ['%s(n = 1px)' % name]
+        # only earlier mixins are called, so it can't recurse forever
+        lines.extend(self.properties('  '))
+        lines.append('  margin n')
+        self.mixins.append(name)
+        return lines
+
+    def placeholder(self):
+        name = '$ph-%s%d' % (self.word(), len(self.placeholders))
+        self.placeholders.append(name)
+        return [name] + self.properties('  ')
+
+
+def mutate(rand, source):
+    """ An edit of one line (for incremental rebuilds) """
+    lines = source.split('\n')
+    index = rand.randrange(len(lines))
+    line = lines[index]
+    if line.strip() and line.startswith(' ') and ':' not in line:
+        lines[index] = line.rstrip() + ' + 1'
+    else:
+        lines.insert(index, '.inserted-%d\n  width 1px' % index)
+    return '\n'.join(lines)
+
+
+PATHOLOGICAL = {
+    'selector_list': lambda n: ', '.join('.s%d:hover' % i for i in xrange(n))
+    + '\n  color red\n',
+    'long_selector': lambda n: ' '.join('.s%d' % i for i in xrange(n))
+    + '\n  color red\n',
+    'nested_comments': lambda n: '/* ' * n + '*/\n.a\n  color red\n',
+    'line_comments': lambda n: ''.join('// %d /* x\n' % i for i in xrange(n))
+    + '.a\n  color red\n',
+    'deep_nesting': lambda n: ''.join(
+        ''.join('  ' * i + '.n%d\n' % i for i in xrange(10)) +
+        '  ' * 10 + 'color red\n' for _ in xrange(n // 10)),
+    'long_value': lambda n: '.a\n  margin ' + ' '.join(
+        '%dpx' % i for i in xrange(n)) + '\n',
+    'attribute_selectors': lambda n: ''.join(
+        '[data-x="%d"]' % i for i in xrange(n)) + '\n  color red\n',
+    # the lexer reaches a ^= or |= attribute through its selector rule (the
+    # rest of the selector, *= attributes included, is scanned with it)
+    'attribute_list': lambda n: ', '.join(
+        'a%d[href^="x"]' % i for i in xrange(n)) + '\n  color red\n',
+    'dash_attribute_list': lambda n: ', '.join(
+        'p%d[lang|=en][title*="a, b"]' % i for i in xrange(n))
+    + '\n  color red\n',
+    'slashes_in_attributes': lambda n: ', '.join(
+        'a%d[href^=//cdn][src*="//x/%d"]' % (i, i) for i in xrange(n))
+    + '\n  color red\n',
+}
+""" Inputs that stress one part of the lexer, by their size """
+
+PATHOLOGICAL_SIZES = 500, 2000
+""" The sizes the pathological inputs are timed at. They have to be large
+enough for the quadratic part of a slow path to outgrow the linear work:
+the lexer's old rescans of attribute lists weren't always flagged at 100 and
+400 """
+
+# Running the modes
+
+
+def lex_tokens(source, profile='default'):
+    lexer = StylusLexer(source, profile=profile)
+    tokens = []
+    token = lexer.next()
+    while not isinstance(token, EOFToken):
+        tokens.append(dump_token(token))
+        token = lexer.next()
+    return tokens
+
+
+def lex_with_restore(source):
+    """ Lexes half of the tokens, snapshots, lexes the rest, restores and
+    lexes the rest again """
+    lexer = StylusLexer(source)
+    tokens = []
+    token = lexer.next()
+    while not isinstance(token, EOFToken):
+        tokens.append(dump_token(token))
+        token = lexer.next()
+    lexer = StylusLexer(source)
+    head = [dump_token(lexer.next()) for _ in xrange(len(tokens) // 2)]
+    state = lexer.snapshot()
+    for _ in xrange(len(tokens) - len(head)):
+        lexer.next()
+    lexer.restore(state)
+    rest = []
+    token = lexer.next()
+    while not isinstance(token, EOFToken):
+        rest.append(dump_token(token))
+        token = lexer.next()
+    return head + rest
+
+
+def dump_token(token):
+    return type(token).__name__, sorted((name, canonical(value)) for name,
+                                        value in vars(token).iteritems())
+
+
+def canonical(value):
+    """ A comparable form of a value (names are interned as str or unicode,
+    whichever came first) """
+    if isinstance(value, basestring):
+        return unicode(value)
+    return repr(value)
+
+
+IGNORED = frozenset(['parent', 'line_num', 'symbols', 'address', 'binding',
+                     'cacheable', 'is_shared', 'tokens', 'parse', 'on_load',
+                     '_ready', '_statements'])
+""" Attributes that aren't a part of the parsed tree """
+
+
+def dump(node):
+    """ A comparable form of a tree """
+    if isinstance(node, ASTNode):
+        fields = [(name, dump(value)) for name, value in
+                  sorted(vars(node).iteritems()) if name not in IGNORED]
+        if isinstance(node, LazyBlock):
+            fields.append(('statements', dump(node.statements)))
+        name = 'Block' if type(node) is LazyBlock else type(node).__name__
+        return name, tuple(sorted(fields))
+    if isinstance(node, (list, tuple)):
+        return tuple(dump(item) for item in node)
+    return canonical(node)
+
+
+def tree_selectors(node, found=None):
+    """ :return: The selectors of the selector blocks of a tree """
+    if found is None:
+        found = set()
+    if isinstance(node, SelectorBlock):
+        found.update(unicode(selector) for selector in node.selectors)
+    if isinstance(node, ASTNode):
+        for name, value in vars(node).iteritems():
+            if name not in IGNORED:
+                tree_selectors(value, found)
+        if isinstance(node, LazyBlock):
+            tree_selectors(node.statements, found)
+    elif isinstance(node, (list, tuple)):
+        for item in node:
+            tree_selectors(item, found)
+    return found
+
+
+def missing_selectors(source, selectors):
+    """ :return: The selectors that aren't in the tree of the source as they
+    were written """
+    found = tree_selectors(StylusParser(source).parse())
+    return sorted(set(selectors) - found)
+
+
+def strip_comments(source):
+    """ :return: The source without its comment lines """
+    return u''.join(line for line in source.splitlines(True)
+                    if not line.lstrip().startswith(('//', '/*')))
+
+
+def parse_tree(source, **kwargs):
+    return dump(StylusParser(source, **kwargs).parse())
+
+
+def parse_recovering(source):
+    # errors in lazy bodies would only be raised when they're loaded
+    parser = StylusParser(source, lazy_bodies=False, recover=True)
+    tree = dump(parser.parse())
+    return tree, len(parser.errors)
+
+
+def compile_css(source):
+    root = StylusParser(source).parse()
+    tree = Evaluator(root).evaluate()
+    return CSSEmitter().emit(Normalizer(tree).normalize())
+
+
+def incremental_rebuild(source, edited):
+    compiler = IncrementalCompiler()
+    try:
+        compiler.compile(source)
+    except ERRORS:
+        pass
+    return compiler.compile(edited)
+
+
+def outcome(function, *args):
+    """
+    :return: ('ok', result), ('error', the error's type name) for compile
+        errors, ('unsupported', None) for syntax the parser doesn't support
+        yet, or ('crash', the last line of the traceback)
+    """
+    try:
+        return 'ok', function(*args)
+    except ERRORS as error:
+        return 'error', type(error).__name__
+    except NotImplementedError:
+        return 'unsupported', None
+    except Exception:
+        return 'crash', traceback.format_exc().strip().splitlines()[-1]
+
+
+def check(source, rand, parallel=False, css_source=None, selectors=None):
+    """
+    Runs the source through the baseline and every mode
+    :param list[str] selectors: The selectors of the rules of the source (for
+        checking the baseline itself)
+    :return: The names of the modes that differed (or crashed)
+    :rtype: list[str]
+    """
+    failures = []
+
+    def run(name, expected, function, *args, **kwargs):
+        if expected[0] == 'unsupported':
+            return
+        if expected[0] == 'crash':
+            failures.append('baseline of %s crashed: %s' % (name,
+                                                            expected[1]))
+            return
+        result = outcome(function, *args)
+        if kwargs.get('any_error') and result[0] == expected[0] == 'error':
+            return
+        if result != expected:
+            failures.append(name if result[0] != 'crash' else
+                            '%s crashed: %s' % (name, result[1]))
+
+    tokens = outcome(lex_tokens, source)
+    without_comments = tokens
+    if tokens[0] == 'ok':
+        without_comments = 'ok', [token for token in tokens[1]
+                                  if token[0] != CommentToken.__name__]
+    run('production tokens', without_comments, lex_tokens, source,
+        'production')
+    run('snapshot/restore tokens', tokens, lex_with_restore, source)
+    if css_source is not None:
+        css_tokens = outcome(lex_tokens, css_source)
+        if css_tokens[0] == 'ok':
+            css_tokens = 'ok', [token for token in css_tokens[1]
+                                if token[0] != CommentToken.__name__]
+        run('css profile tokens', css_tokens, lex_tokens, css_source, 'css')
+
+    # the parser doesn't take comment tokens at the root yet, so the trees
+    # are compared on the source without its comment lines (and the tree of
+    # the production profile, which skips comments, on the whole source)
+    commented, source = source, strip_comments(source)
+    tree = outcome(parse_tree, source)
+    run('production tree', tree,
+        partial(parse_tree, profile='production'), commented)
+    run('eager bodies tree', tree, partial(parse_tree, lazy_bodies=False),
+        source)
+    if tree[0] == 'ok':
+        run('recovered tree', ('ok', (tree[1], 0)), parse_recovering, source)
+        if selectors:
+            # every mode shares the selector scanner, so it's checked against
+            # the generated text instead
+            run('selectors', ('ok', []), missing_selectors, source,
+                selectors)
+    else:
+        run('recover mode', ('ok', True),
+            lambda: parse_recovering(source)[1] > 0)
+
+    css = outcome(compile_css, source)
+    run('incremental', css, IncrementalCompiler().compile, source)
+    edited = mutate(rand, source)
+    run('incremental rebuild', outcome(compile_css, edited),
+        incremental_rebuild, source, edited)
+    # the bounded compiler evaluates each chunk before it parses the next, so
+    # it can fail on an earlier error than the baseline's
+    run('bounded', css, BoundedCompiler().compile, source, any_error=True)
+    run('variants', css, lambda: VariantCompiler(source).compile())
+    run('shared', css, SharedCompiler().compile, source)
+    if parallel and css[0] == 'ok':
+        run('parallel variants', ('ok', {'a': css[1], 'b': css[1]}),
+            lambda: dict(VariantCompiler(source).compile_all(
+                {'a': {}, 'b': {}}, processes=2)))
+    return failures
+
+
+# Timing
+
+def best_time(function, *args):
+    best = None
+    for _ in xrange(3):
+        start = time.time()
+        outcome(function, *args)
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def scaling(small, large, factor, slack=2.0, minimum=0.02):
+    """
+    Times lexing and parsing the small and the large input
+    :param int factor: How much larger the large input is
+    :return: The (phase, ratio) of the phases that grew super-linearly
+    """
+    flagged = []
+    for phase, function in (('lex', lex_tokens),
+                            ('parse', lambda source: StylusParser(
+                                source, profile='production').parse())):
+        small_time = best_time(function, small)
+        large_time = best_time(function, large)
+        ratio = large_time / max(small_time, 1e-6)
+        if large_time > minimum and ratio > factor * slack:
+            flagged.append((phase, ratio))
+    return flagged
+
+
+def save_case(kind, source):
+    if not os.path.isdir(CASES_DIR):
+        os.makedirs(CASES_DIR)
+    digest = hashlib.sha1(source.encode('utf-8')).hexdigest()[:10]
+    path = os.path.join(CASES_DIR, '%s-%s.styl' % (kind, digest))
+    with open(path, 'w') as case:
+        case.write(source.encode('utf-8'))
+    return path
+
+
+def saved_cases():
+    for path in sorted(glob.glob(os.path.join(CASES_DIR, '*.styl'))):
+        with open(path) as case:
+            yield path, case.read().decode('utf-8')
+
+
+def main(cases=200, seed=1, parallel=False):
+    rand = random.Random(seed)
+    problems = 0
+
+    for path, source in saved_cases():
+        failures = check(source, rand, parallel)
+        flagged = scaling(source, source * 4, 4)
+        if failures or flagged:
+            problems += 1
+            print '%s: %s' % (os.path.basename(path),
+                              ', '.join(failures + ['super-linear %s (x%.1f)'
+                                                    % item for item in
+                                                    flagged]))
+
+    for kind, make in sorted(PATHOLOGICAL.iteritems()):
+        small, large = map(make, PATHOLOGICAL_SIZES)
+        flagged = scaling(small, large,
+                          PATHOLOGICAL_SIZES[1] // PATHOLOGICAL_SIZES[0])
+        failures = check(small, rand)
+        if flagged or failures:
+            problems += 1
+            path = save_case(kind, small)
+            print '%s: %s -> %s' % (kind, ', '.join(
+                failures + ['super-linear %s (x%.1f)' % item
+                            for item in flagged]), path)
+
+    for index in xrange(cases):
+        generator = SheetGenerator(rand)
+        source = generator.sheet(rand.randint(3, 20))
+        css_source = generator.css_sheet(rand.randint(1, 10))
+        failures = check(source, rand, parallel and index % 20 == 0,
+                         css_source, generator.selectors)
+        if failures:
+            problems += 1
+            path = save_case('diff', source)
+            print 'case %d: %s -> %s' % (index, ', '.join(failures), path)
+        if index % 10 == 0:
+            flagged = scaling(source, source * 4, 4)
+            if flagged:
+                problems += 1
+                path = save_case('slow', source)
+                print 'case %d: %s -> %s' % (index, ', '.join(
+                    'super-linear %s (x%.1f)' % item for item in flagged),
+                    path)
+
+    print '%d cases (seed %d): %d problems' % (cases, seed, problems)
+    if problems:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    args = [arg for arg in sys.argv[1:] if arg != '--parallel']
+    main(*map(int, args), parallel='--parallel' in sys.argv)
@@ -0,0 +1,116 @@
+"""
+Concurrency stress test for SharedCompiler: many threads compile a few
+sources with different overrides through one compiler (and its shared
+caches), and every result is compared with the output of a single-threaded
+compile. The interpreter switches threads after every bytecode, so the caches
+are hit concurrently.
+
+Usage: python benchmarks/stress_threads.py [threads] [compiles_per_thread]
+"""
+import random
+import sys
+import threading
+import time
+import traceback
+
+from common import import_module
+
+stylus = import_module('stylus')
+SharedCompiler = import_module('stylus.shared').SharedCompiler
+VariantCompiler = import_module('stylus.variants').VariantCompiler
+parse_value = import_module('stylus.variants').parse_value
+
+
+def make_source(seed, rules=60):
+    lines = [
+        '$brand = #%06x' % (seed * 0x10101 % 0xffffff),
+        '$pad = %dpx' % (seed % 7 + 2),
+        'shade(c, amount)',
+        '  darken(c, amount)',
+        'button(c)',
+        '  color c',
+        '  background shade(c, 10%)',
+        '  &:hover',
+        '    background shade(c, 20%)',
+        '$base',
+        '  margin 0',
+    ]
+    for i in xrange(rules):
+        lines.append('.rule-%d-%d' % (seed, i))
+        lines.append('  padding $pad * %d' % (i % 4 + 1))
+        if i % 3 == 0:
+            lines.append('  button($brand)')
+        if i % 5 == 0:
+            lines.append('  @extend $base')
+        lines.append('  .child')
+        lines.append('    width %d%%' % (i % 100))
+    return u'\n'.join(lines) + u'\n'
+
+
+THEMES = [
+    {},
+    {'$brand': u'#222'},
+    {'$brand': u'#c0ffee', '$pad': u'10px'},
+    {'$pad': u'1em'},
+]
+
+
+def expected_outputs(sources):
+    """ The output of each (source, theme), compiled in this thread """
+    expected = {}
+    for s, source in enumerate(sources):
+        compiler = VariantCompiler(source)
+        for t, theme in enumerate(THEMES):
+            overrides = dict((name, parse_value(value))
+                             for name, value in theme.iteritems())
+            expected[s, t] = compiler.compile(overrides)
+    return expected
+
+
+def main(thread_count=16, compiles=40):
+    sources = [make_source(seed) for seed in xrange(1, 4)]
+    expected = expected_outputs(sources)
+    # fewer cached trees than sources, so trees are evicted and parsed again
+    # while other threads use them
+    compiler = SharedCompiler(max_sources=2)
+    failures = []
+    start_event = threading.Event()
+
+    def work(seed):
+        rand = random.Random(seed)
+        start_event.wait()
+        for _ in xrange(compiles):
+            s = rand.randrange(len(sources))
+            t = rand.randrange(len(THEMES))
+            overrides = dict((name, parse_value(value))
+                             for name, value in THEMES[t].iteritems())
+            try:
+                css = compiler.compile(sources[s], overrides)
+            except Exception:
+                failures.append(traceback.format_exc())
+                continue
+            if css != expected[s, t]:
+                failures.append('source %d theme %d: different output' % (s, t))
+
+    sys.setcheckinterval(1)
+    threads = [threading.Thread(target=work, args=(seed,))
+               for seed in xrange(thread_count)]
+    for thread in threads:
+        thread.start()
+    began = time.time()
+    start_event.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.time() - began
+
+    total = thread_count * compiles
+    print '%d compiles in %d threads: %.2f secs, %d failures' % (
+        total, thread_count, elapsed, len(failures))
+    for failure in failures[:5]:
+        print failure
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
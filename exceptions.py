@@ -11,4 +11,26 @@ class ParseError(Exception):
             next token in the parser
         :return:
         """
-        super(ParseError, self).__init__(message.format(peek=parser.peek()))
+        super(ParseError, self).__init__(message)
+        # speculative parsing raises (and drops) many errors, so the message
+        # is only formatted when it's shown, and the next token is only taken
+        # if it was lexed already
+        self.token = parser.peeked()
+        if self.token is not None:
+            self.line_num = self.token.line_num
+            self.column = self.token.column
+        else:
+            self.line_num = parser.lexer.line_num
+            self.column = parser.lexer.column
+        self._text = None
+
+    def __str__(self):
+        if self._text is None:
+            peek = self.token if self.token is not None else \
+                'the input at line %d' % self.line_num
+            self._text = self.args[0].format(peek=peek)
+        return self._text
+
+
+class CompileError(Exception):
+    pass
@@ -3,11 +3,108 @@ In this package there will be the stylus language handlers:
 - tokens.py - A list of the tokens that could be found in a stylus file
 - lexer.py (StylusLexer) - Tools for turning a textual stylus file into a list
     of stylus tokens (from stylus/tokens.py)
+- units.py - The CSS units registry: recognizing units and converting
+    between them
+- selectors.py (Selector) - Scans selectors into their components (classes,
+    pseudo-classes, combinators, ...)
 - parser.py (StylusParser, WIP) - Tools for turning a bunch of stylus files (
     using the StylusLexer class) into an AST (using types defined in the ast
     package)
+- evaluator.py (Evaluator) - Evaluates the AST (variables, functions, mixins,
+    conditionals and loops) into selector blocks with plain CSS values.
+    Built-in functions are in functions.py (with batch versions of the color
+    functions in color_batch.py), and calls of user functions are cached by
+    call_cache.py
+- dce.py (DeadCodeEliminator) - Removes unused definitions before evaluation
+- normalizer.py (Normalizer) - Flattens the evaluated selector blocks into
+    rules and applies @extend (using extend.py)
+- emitter.py (CSSEmitter) - Formats the rules as CSS
+- variants.py (VariantCompiler) - Compiles many variants of a source (with
+    different values for some variables) from one parsed tree
+- incremental.py (IncrementalCompiler) - Rebuilds a changed source, reusing
+    the output of the root statements that didn't change
+- artifacts.py (ArtifactWriter) - Writes compiled sheets as content-addressed,
+    pre-compressed files with a manifest
+- shared.py (SharedCompiler) - Compiles from many threads, sharing the parsed
+    trees and caches
+- bounded.py (BoundedCompiler) - Compiles huge bundles a top-level block at
+    a time, spilling the rules to disk
+- lint.py - Reports all the syntax errors of files, one parse per file
+- instrumentation.py - Counters of the caches and passes, for profiling
+- profile.py - Profiles the lex, parse and compile phases of a file
+    (python -m <package>.stylus.profile FILE)
 - compiler.py (StylusCompiler, WIP) - A reversed parser. Turns AST into
     stylus tokens.
 - renderer.py (StylusRenderer, WIP) - A reversed lexer. Formats a list of
     stylus tokens into a stylus file.
-"""
\ No newline at end of file
+
+The submodules, and the main classes (stylus.StylusParser,
+stylus.VariantCompiler, ...), are imported when they're first accessed, so
+importing the package doesn't import the whole compiler.
+"""
+import imp
+import importlib
+import sys
+from types import ModuleType
+
+exports = {
+    'StylusLexer': 'lexer',
+    'StylusParser': 'parser',
+    'Evaluator': 'evaluator',
+    'Normalizer': 'normalizer',
+    'CSSEmitter': 'emitter',
+    'VariantCompiler': 'variants',
+    'IncrementalCompiler': 'incremental',
+    'ArtifactWriter': 'artifacts',
+    'compile_batch': 'artifacts',
+    'SharedCompiler': 'shared',
+    'BoundedCompiler': 'bounded',
+}
+""" The submodule of each lazily imported name """
+
+
+def render(source):
+    """ Compiles stylus source into CSS (safe to call from many threads; see
+    shared.py for sharing the work between them)
+    :param unicode source: The stylus source
+    :rtype: str
+    """
+    from .parser import StylusParser
+    from .evaluator import Evaluator
+    from .normalizer import Normalizer
+    from .emitter import CSSEmitter
+
+    root = StylusParser(source, profile='production').parse()
+    tree = Evaluator(root).evaluate()
+    return CSSEmitter().emit(Normalizer(tree).normalize())
+
+
+class LazyModule(ModuleType):
+    """ The package module, importing submodules and exported names on first
+    access """
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        module_name = exports.get(name)
+        if module_name is None:
+            try:
+                imp.find_module(name, self.__path__)
+            except ImportError:
+                raise AttributeError('%r has no attribute %r'
+                                     % (__name__, name))
+            module_name = name
+        module = importlib.import_module('.' + module_name, __name__)
+        value = module if module_name == name else getattr(module, name)
+        setattr(self, name, value)
+        return value
+
+    def __dir__(self):
+        return sorted(set(self.__dict__) | set(exports))
+
+
+_module = LazyModule(__name__, __doc__)
+_module.__dict__.update(sys.modules[__name__].__dict__)
+# keep the original module alive (its functions use its dict as globals, and
+# a collected module's dict is cleared)
+_module.__dict__['_original_module'] = sys.modules[__name__]
+sys.modules[__name__] = _module
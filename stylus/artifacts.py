@@ -0,0 +1,210 @@
+"""
+Writes compiled sheets as content-addressed, pre-compressed artifacts (for
+serving from a CDN).
+
+Each sheet is written as name.<hash>.css, next to a compressed copy
+(name.<hash>.css.gz). The CSS is hashed as its chunks come out of the
+emitter, into a spooled buffer (in memory, or in the system's temporary
+directory for large sheets). A manifest.json in the output directory maps each
+name to its artifacts; a sheet whose hash is already in the manifest (with its
+files still in place) isn't compressed or written again, so nothing is written
+to the output directory for it. Otherwise the buffer is copied (and
+compressed) into temporary files in the directory, which are renamed to the
+artifacts.
+
+    writer = ArtifactWriter('build/css')
+    writer.write('main', CSSEmitter().iter_emit(rules))
+    writer.save()
+
+or, for stylus sources:
+
+    compile_batch({'main': source, 'admin': admin_source}, 'build/css')
+"""
+import hashlib
+import json
+import os
+import tempfile
+import zlib
+from collections import namedtuple
+
+from . import instrumentation
+
+__all__ = ['ArtifactWriter', 'Artifact', 'compile_batch']
+
+stats = instrumentation.get_stats('artifacts')
+
+Artifact = namedtuple('Artifact', ['name', 'hash', 'path', 'compressed_path',
+                                   'written'])
+""" The files of a sheet (the paths are relative to the output directory) """
+
+block_size = 64 << 10
+""" The size of the blocks a sheet is read in for writing it out """
+
+spool_size = 4 << 20
+""" Sheets up to this size are buffered in memory (larger ones in a
+temporary file) while they're hashed """
+
+compression_formats = {
+    # name: (suffix, zlib window bits)
+    'gzip': ('.gz', 16 + zlib.MAX_WBITS),
+    'zlib': ('.zz', zlib.MAX_WBITS),
+}
+
+
+class ArtifactWriter(object):
+    def __init__(self, directory, compression='gzip', level=9, hash_length=16,
+                 manifest='manifest.json'):
+        """
+        :param str directory: The output directory (created if needed)
+        :param str compression: 'gzip', 'zlib' or None (no compressed copy)
+        :param int level: The compression level (1-9)
+        :param int hash_length: The number of hex digits of the hash to put in
+            file names
+        :param str manifest: The name of the manifest file
+        """
+        super(ArtifactWriter, self).__init__()
+        if compression is not None and compression not in compression_formats:
+            raise ValueError('Unknown compression: %r' % compression)
+        self.directory = directory
+        self.compression = compression
+        self.level = level
+        self.hash_length = hash_length
+        self.manifest_path = os.path.join(directory, manifest)
+        self.manifest = self._load_manifest()
+        """ type: dict[str, dict] The artifacts of each sheet, by name """
+        self.dirty = False
+
+    def write(self, name, chunks):
+        """
+        Writes a sheet, unless an identical one was already written (and its
+        files are still there)
+        :param str name: The name of the sheet (main for main.<hash>.css)
+        :param chunks: The CSS text, or an iterable of its chunks
+        :rtype: Artifact
+        """
+        if isinstance(chunks, basestring):
+            chunks = [chunks]
+        digest = hashlib.sha1()
+        size = 0
+        with tempfile.SpooledTemporaryFile(spool_size) as spool:
+            for chunk in chunks:
+                if isinstance(chunk, unicode):
+                    chunk = chunk.encode('utf-8')
+                digest.update(chunk)
+                spool.write(chunk)
+                size += len(chunk)
+            content_hash = digest.hexdigest()
+
+            entry = self.manifest.get(name)
+            if entry is not None and entry['hash'] == content_hash and \
+                    entry.get('compression') == self.compression and \
+                    self._has_files(entry):
+                stats.incr('skipped')
+                return self._artifact(name, entry, False)
+
+            path = '%s.%s.css' % (name, content_hash[:self.hash_length])
+            entry = {'hash': content_hash, 'path': path, 'size': size,
+                     'compression': self.compression}
+            if self.compression is not None:
+                entry['compressed_path'] = \
+                    path + compression_formats[self.compression][0]
+                spool.seek(0)
+                entry['compressed_size'] = self._write_file(
+                    entry['compressed_path'], self._compress(spool))
+            spool.seek(0)
+            self._write_file(path, iter(lambda: spool.read(block_size), ''))
+        self.manifest[name] = entry
+        self.dirty = True
+        stats.incr('written')
+        return self._artifact(name, entry, True)
+
+    def save(self):
+        """ Writes the manifest (if anything changed) """
+        if self.dirty:
+            self._write_file(os.path.basename(self.manifest_path), [
+                json.dumps(self.manifest, indent=2, sort_keys=True)])
+            self.dirty = False
+
+    def _artifact(self, name, entry, written):
+        return Artifact(name, entry['hash'], entry['path'],
+                        entry.get('compressed_path'), written)
+
+    def _load_manifest(self):
+        try:
+            with open(self.manifest_path, 'rb') as manifest:
+                return json.load(manifest)
+        except (IOError, ValueError):
+            return {}
+
+    def _has_files(self, entry):
+        """ Whether the files of a manifest entry are in the directory (it
+        might have been cleaned since the manifest was written) """
+        paths = [entry['path']]
+        if entry.get('compressed_path'):
+            paths.append(entry['compressed_path'])
+        return all(os.path.exists(os.path.join(self.directory, path))
+                   for path in paths)
+
+    def _compress(self, source):
+        """
+        Yields the compressed copy of a file, in parts
+        :param file source: The file (read from its current position)
+        """
+        compressor = zlib.compressobj(
+            self.level, zlib.DEFLATED,
+            compression_formats[self.compression][1])
+        for block in iter(lambda: source.read(block_size), ''):
+            yield compressor.compress(block)
+        yield compressor.flush()
+
+    def _write_file(self, path, chunks):
+        """
+        Writes the file atomically (through a temporary file), so a
+        half-written artifact is never served
+        :param str path: The path of the file in the directory
+        :param chunks: The content of the file, in chunks
+        :return: The size of the file
+        :rtype: int
+        """
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        size = 0
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                for chunk in chunks:
+                    out.write(chunk)
+                    size += len(chunk)
+            # mkstemp makes the file private
+            os.chmod(temp_path, 0644)
+            os.rename(temp_path, os.path.join(self.directory, path))
+        except:
+            os.remove(temp_path)
+            raise
+        stats.incr('bytes_written', size)
+        return size
+
+
+def compile_batch(sources, directory, **kwargs):
+    """
+    Compiles stylus sources into artifacts
+    :param dict[str, unicode] sources: The sources, by the names of their
+        sheets
+    :param str directory: The output directory
+    :param kwargs: Options for the ArtifactWriter
+    :return: The artifacts of each sheet, by name
+    :rtype: dict[str, Artifact]
+    """
+    from .parser import StylusParser
+    from .evaluator import Evaluator
+    from .normalizer import Normalizer
+    from .emitter import CSSEmitter
+
+    writer = ArtifactWriter(directory, **kwargs)
+    artifacts = {}
+    for name, source in sources.iteritems():
+        root = StylusParser(source, profile='production').parse()
+        rules = Normalizer(Evaluator(root).evaluate()).normalize()
+        artifacts[name] = writer.write(name, CSSEmitter().iter_emit(rules))
+    writer.save()
+    return artifacts
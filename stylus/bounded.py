@@ -0,0 +1,292 @@
+"""
+Memory-bounded compilation, for bundles too big to hold as one tree: the
+source is parsed, evaluated and flattened a top-level block at a time, and
+only what later blocks need stays in memory.
+
+The source is split into chunks at unindented lines (outside of braces, and
+not continuing a selector list, a line ending with a backslash or an if with
+an else), so it can be read from a file as it's compiled. Each chunk is
+parsed on its own, and its statements are analyzed (see
+ScopeAnalyzer.analyze_statement) and evaluated against one root frame that
+lives for the whole compilation. What stays resident is:
+- the root frame: the values of the root variables, and the root functions
+  and mixins (with their definitions)
+- the @extend index (the extended and extending selectors)
+
+Everything else (the parsed statements, their evaluated nodes) is dropped once
+the statement's rules are collected. @extend directives can change rules
+anywhere in the sheet, so the collected rules are pickled to a spill file
+(kept in memory until it's over buffer_size, then on disk) and emitted in a
+second pass, once all the directives are known.
+
+The growth of the process's resident memory is sampled while compiling, and
+reported against the budget:
+
+    compiler = BoundedCompiler(memory_budget=256 << 20)
+    with open('bundle.css', 'w') as output:
+        for chunk in compiler.iter_compile(codecs.open('bundle.styl',
+                                                       encoding='utf-8')):
+            output.write(chunk)
+    print compiler.report
+"""
+import cPickle as pickle
+import os
+import re
+import resource
+import tempfile
+from collections import namedtuple
+
+from ..ast import Root
+from . import instrumentation
+from .emitter import CSSEmitter
+from .evaluator import Evaluator, ConstantFolder
+from .lexer import StylusLexer
+from .normalizer import Normalizer
+from .parser import StylusParser
+from .scope import ScopeAnalyzer, SymbolTable, UNSET
+from .variants import defined_functions
+
+__all__ = ['BoundedCompiler', 'MemoryReport', 'iter_chunks']
+
+stats = instrumentation.get_stats('bounded')
+
+MemoryReport = namedtuple('MemoryReport', [
+    'budget', 'peak', 'spilled', 'on_disk', 'statements', 'resident'])
+"""
+The memory use of a compilation: the budget and the peak growth of the
+resident memory (in bytes, None where it can't be measured), the size of the
+spilled rules and whether they went to disk, the number of root statements,
+and the number of root variables and functions that were kept resident
+"""
+
+line_pattern = re.compile(r'[^\n]*\n|[^\n]+$')
+brace_pattern = re.compile(r'''
+    "(?:[^"\\\n]|\\.)*"|'(?:[^'\\\n]|\\.)*'
+    |url\([^)\n]*\)
+    |/\*|//|[{}]
+''', re.VERBOSE)
+continuation_keyword_pattern = re.compile(r'else\b')
+
+
+class BoundedCompiler(object):
+    def __init__(self, indent='  ', memory_budget=256 << 20,
+                 buffer_size=8 << 20, spill_dir=None, sample_every=64):
+        """
+        :param str indent: The indentation of the output
+        :param int memory_budget: The memory the compilation may grow the
+            process by, in bytes (it's reported against, not enforced)
+        :param int buffer_size: The size of spilled rules kept in memory
+            before the spill file moves to disk
+        :param str spill_dir: The directory of the spill file (the system's
+            temporary directory by default)
+        :param int sample_every: The number of root statements between
+            samples of the memory use
+        """
+        super(BoundedCompiler, self).__init__()
+        self.indent = indent
+        self.memory_budget = memory_budget
+        self.buffer_size = buffer_size
+        self.spill_dir = spill_dir
+        self.sample_every = sample_every
+        self.report = None
+        """ type: MemoryReport The memory use of the last compilation """
+
+    def compile(self, source):
+        """
+        :param source: The stylus source (unicode, or an iterable of lines
+            like a file)
+        :return: The CSS text
+        :rtype: str
+        """
+        return ''.join(self.iter_compile(source))
+
+    def iter_compile(self, source):
+        """
+        Compiles the source, yielding the CSS a rule at a time (nothing is
+        yielded before the whole source is evaluated, since the rules can be
+        extended up to its end)
+        :param source: The stylus source (unicode, or an iterable of lines)
+        """
+        baseline = resident_memory()
+        peak = [0]
+
+        def sample():
+            current = resident_memory()
+            if current is not None and baseline is not None:
+                peak[0] = max(peak[0], current - baseline)
+
+        root = Root()
+        root.symbols = table = SymbolTable()
+        evaluator = Evaluator(root, eliminate_dead_code=False)
+        frame = evaluator.root_frame()
+        folder = ConstantFolder()
+        analyzer = ScopeAnalyzer()
+        normalizer = Normalizer(None)
+        functions = []
+        """ The root functions (resolved again when the root gets new names)
+        """
+        declared = (0, 0, 0)
+        count = 0
+
+        spill = tempfile.SpooledTemporaryFile(self.buffer_size,
+                                              dir=self.spill_dir)
+        try:
+            for line_num, chunk in iter_chunks(source):
+                lexer = StylusLexer(chunk, profile='production')
+                lexer.line_num = line_num
+                tree = StylusParser(None, lexer=lexer).parse()
+                folder.fold(tree)
+                for stmt in tree.statements:
+                    analyzer.analyze_statement(stmt, table)
+                    functions.extend(function for function in
+                                     defined_functions(stmt)
+                                     if function.symbols.parent is table)
+                    now_declared = (table.size, len(table.variables),
+                                    len(functions))
+                    if now_declared != declared:
+                        declared = now_declared
+                        self._grow(frame, functions, analyzer, evaluator)
+                    output = Root()
+                    evaluator.eval_statement(stmt, output, frame)
+                    rules = normalizer.collect(output)
+                    if rules:
+                        pickle.dump(rules, spill, pickle.HIGHEST_PROTOCOL)
+                    count += 1
+                    stats.incr('statements')
+                    if count % self.sample_every == 0:
+                        sample()
+                stats.incr('chunks')
+            sample()
+
+            spilled = spill.tell()
+            on_disk = spilled > self.buffer_size
+            stats.incr('spilled_bytes', spilled)
+            if on_disk:
+                stats.incr('spilled_to_disk')
+            self.report = MemoryReport(
+                self.memory_budget, peak[0] if baseline is not None else None,
+                spilled, on_disk, count,
+                sum(1 for value in frame.values if value is not UNSET))
+            if self.report.peak is not None and \
+                    self.report.peak > self.memory_budget:
+                stats.incr('over_budget')
+
+            spill.seek(0)
+            emitter = CSSEmitter(self.indent)
+            found = set()
+            first = True
+            while spill.tell() < spilled:
+                for rule in normalizer.extend_rules(pickle.load(spill), found):
+                    if not first:
+                        yield '\n'
+                    first = False
+                    yield emitter.emit_rule(rule)
+            normalizer.extends.check_found(found)
+        finally:
+            spill.close()
+
+    def _grow(self, frame, functions, analyzer, evaluator):
+        """
+        Updates the compilation for names newly declared at the root: the
+        root frame gets their slots, and the root functions see them
+        """
+        values = frame.values
+        values.extend([UNSET] * (frame.table.size - len(values)))
+        for function in functions:
+            analyzer.refresh(function)
+        if evaluator.call_cache is not None:
+            evaluator.call_cache.clear()
+        stats.incr('refreshes')
+
+
+def iter_chunks(source):
+    """
+    Splits stylus source into chunks of whole top-level blocks: a chunk starts
+    at an unindented line, unless it's inside of braces or a comment, it
+    continues the previous line (a selector list ending with a comma, or a
+    line ending with a backslash), or it's an else
+    :param source: The source (unicode, or an iterable of lines, which are
+        decoded as UTF-8 if they're bytes)
+    :return: The line number of each chunk and its text
+    :rtype: collections.Iterable[(int, unicode)]
+    """
+    if isinstance(source, unicode):
+        lines = (match.group() for match in line_pattern.finditer(source))
+    else:
+        lines = (line.decode('utf-8') if isinstance(line, str) else line
+                 for line in source)
+    chunk = []
+    first_line = 1
+    depth = 0
+    in_comment = False
+    continued = False
+    for line_num, line in enumerate(lines, 1):
+        if chunk and not depth and not in_comment and not continued and \
+                _starts_block(line):
+            yield first_line, u''.join(chunk)
+            chunk = []
+            first_line = line_num
+        chunk.append(line)
+        depth, in_comment, content = _scan_line(line, depth, in_comment)
+        if content:
+            continued = content[-1] in u',\\'
+    if chunk:
+        yield first_line, u''.join(chunk)
+
+
+def _starts_block(line):
+    return line[:1] not in (u'', u' ', u'\t', u'\r', u'\n', u'}') and \
+        not continuation_keyword_pattern.match(line)
+
+
+def _scan_line(line, depth, in_comment):
+    """
+    :return: The brace depth and whether a /* comment is open after the line,
+        and the line's content (without its // comment and trailing space)
+    :rtype: (int, bool, unicode)
+    """
+    pos = 0
+    end = len(line)
+    if in_comment:
+        pos = line.find(u'*/')
+        if pos == -1:
+            return depth, True, u''
+        pos += 2
+    match = brace_pattern.search(line, pos)
+    while match is not None:
+        token = match.group()
+        if token == u'/*':
+            close = line.find(u'*/', match.end())
+            if close == -1:
+                return depth, True, line[:match.start()].rstrip()
+            pos = close + 2
+        else:
+            pos = match.end()
+            if token == u'//':
+                end = match.start()
+                break
+            elif token == u'{':
+                depth += 1
+            elif token == u'}':
+                depth = max(depth - 1, 0)
+        match = brace_pattern.search(line, pos)
+    return depth, False, line[:end].rstrip()
+
+
+def resident_memory():
+    """
+    :return: The resident memory of this process in bytes (the peak, where
+        the current size can't be read), or None if it can't be measured
+    :rtype: int
+    """
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (IOError, OSError, ValueError, IndexError):
+        pass
+    try:
+        # kilobytes on Linux, bytes on OS X
+        usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    except (ValueError, resource.error):
+        return None
+    return usage if os.uname()[0] == 'Darwin' else usage * 1024
@@ -0,0 +1,144 @@
+"""
+A cache for the results of user function and mixin calls.
+
+Calls are keyed by the function definition and a fingerprint of the argument
+values. A hit returns the value of the first call, and for mixins the nodes it
+expanded to. Those nodes are shared between all the call sites, so they are
+frozen (their statements become tuples). Nothing changes evaluated blocks:
+the normalizer copies their statements into rules.
+
+Only functions whose expansion depends on nothing but their arguments are
+cached (see is_cacheable()).
+"""
+from ..ast import Block, Identifier, FunctionCall
+from ..utils import LRUCache
+from . import instrumentation
+from .functions import builtins
+from .scope import walk_expressions
+
+__all__ = ['CallCache', 'is_cacheable', 'fingerprint', 'share']
+
+stats = instrumentation.get_stats('call_cache')
+
+
+class CallCache(object):
+    def __init__(self, maxsize=4096):
+        super(CallCache, self).__init__()
+        self._entries = LRUCache(maxsize)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, definition, args):
+        """
+        :param Function definition: The called function
+        :param list args: The argument values
+        :return: The (value, nodes) of a previous call with the same arguments
+            or None
+        """
+        entry = self._entries.get((definition, fingerprint(args)))
+        stats.incr('hits' if entry is not None else 'misses')
+        return entry
+
+    def store(self, definition, args, value, nodes):
+        """
+        Stores the result of a call
+        :param list nodes: The nodes the call expanded to (for mixins)
+        :return: The stored (value, nodes) entry
+        """
+        entry = value, share(nodes)
+        self._entries[(definition, fingerprint(args))] = entry
+        stats['entries'] = len(self._entries)
+        return entry
+
+    def clear(self):
+        self._entries.clear()
+        stats['entries'] = 0
+
+
+def fingerprint(args):
+    """ A hashable key of argument values. Values of different types might
+    be equal as tuples, so their types are a part of it
+    """
+    return tuple((type(arg), arg) for arg in args)
+
+
+def is_cacheable(definition):
+    """
+    Checks whether calls of the function depend only on their arguments: it
+    doesn't read variables from outside of it, doesn't call impure built-ins
+    (like lookup() or selector()), and only calls functions that are
+    cacheable too. The result is kept in definition.cacheable
+    :param Function definition: A function definition (after the
+        ScopeAnalyzer ran)
+    :rtype: bool
+    """
+    if definition.cacheable is None:
+        definition.cacheable = _check_cacheable(definition)
+        if not definition.cacheable:
+            stats.incr('uncacheable_functions')
+    return definition.cacheable
+
+
+def _check_cacheable(definition):
+    """ Checks the function and all the functions it (transitively) calls,
+    so (mutually) recursive functions are handled
+    """
+    seen = {definition}
+    pending = [definition]
+    while pending:
+        callees = _own_callees(pending.pop())
+        if callees is None:
+            return False
+        for callee in callees:
+            if callee.cacheable is False:
+                return False
+            if callee.cacheable is None and callee not in seen:
+                seen.add(callee)
+                pending.append(callee)
+    return True
+
+
+def _own_callees(definition):
+    """
+    :return: The user functions the function calls, or None if it reads
+        outer variables, calls impure built-ins or calls functions that can't
+        be resolved statically
+    :rtype: list[Function]|None
+    """
+    table = definition.symbols
+    callees = []
+    for expr in walk_expressions(definition):
+        if isinstance(expr, Identifier) and expr.binding is not None:
+            for level, _ in expr.binding.addresses:
+                if level < table.level:
+                    return None
+        elif isinstance(expr, FunctionCall):
+            if expr.binding is None:
+                builtin = builtins.get(expr.name)
+                if builtin is not None and not builtin.pure:
+                    return None
+                continue
+            for level, slot in expr.binding.addresses:
+                if level >= table.level:
+                    # a function defined inside this one
+                    continue
+                callee = table.table_at(level).definition_at(slot)
+                if callee is None:
+                    return None
+                callees.append(callee)
+    return callees
+
+
+def share(nodes):
+    """
+    Freezes nodes so they can be shared between call sites
+    :return: The nodes, as a tuple
+    """
+    for node in nodes:
+        if isinstance(node, Block) and not node.is_shared:
+            share(node.statements)
+            node.statements = tuple(node.statements)
+            node.is_shared = True
+    return tuple(nodes)
+
@@ -0,0 +1,206 @@
+"""
+Batch versions of the built-in color functions (lighten, darken, mix and
+contrast), working on whole palettes (ColorArrays) at once.
+
+When NumPy is installed the channels are unpacked into arrays and the math is
+vectorized. Otherwise every color goes through the built-in function (and its
+memo cache, which helps palettes with repeated colors). Both give the same
+colors as the built-ins.
+"""
+from ..ast.values import Color, Number, ColorArray, pack
+from ..exceptions import CompileError
+from .functions import builtins
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+__all__ = ['lighten', 'darken', 'mix', 'contrast', 'has_numpy']
+
+has_numpy = numpy is not None
+""" Whether the vectorized implementation is used """
+
+_white = Color(255, 255, 255, 1.0)
+
+
+def lighten(colors, amount):
+    """
+    :param ColorArray colors: The colors
+    :param Number amount: The amount (a percentage of the remaining
+        lightness, or absolute lightness points)
+    :rtype: ColorArray
+    """
+    amount = _expect_number(amount, 'lighten')
+    if not has_numpy:
+        return _map('lighten', colors, amount)
+    return _adjust_lightness(colors, amount.val, amount.unit == '%')
+
+
+def darken(colors, amount):
+    """
+    :param ColorArray colors: The colors
+    :param Number amount: The amount (a percentage of the current lightness,
+        or absolute lightness points)
+    :rtype: ColorArray
+    """
+    amount = _expect_number(amount, 'darken')
+    if not has_numpy:
+        return _map('darken', colors, amount)
+    return _adjust_lightness(colors, -amount.val, amount.unit == '%')
+
+
+def mix(colors1, colors2, weight=None):
+    """
+    Mixes two palettes color by color
+    :param ColorArray colors1: The first colors
+    :param ColorArray|Color colors2: The second colors (or one color for all)
+    :param Number weight: The percentage of colors1 (50% by default)
+    :rtype: ColorArray
+    """
+    if isinstance(colors2, Color):
+        colors2 = ColorArray([pack(colors2)] * len(colors1))
+    if len(colors1) != len(colors2):
+        raise CompileError('mix() got palettes of %d and %d colors'
+                           % (len(colors1), len(colors2)))
+    if not has_numpy:
+        func = builtins['mix']
+        return ColorArray.from_colors(
+            func([color1, color2] + ([weight] if weight else []))
+            for color1, color2 in zip(colors1, colors2))
+    p = _expect_number(weight, 'mix').val / 100.0 if weight else 0.5
+    r1, g1, b1, a1 = _unpack(colors1)
+    r2, g2, b2, a2 = _unpack(colors2)
+    w = p * 2 - 1
+    a = a1 - a2
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        w1 = numpy.where(w * a == -1, w, (w + a) / (1 + w * a))
+    w1 = (w1 + 1) / 2.0
+    w2 = 1 - w1
+    return _pack(r1 * w1 + r2 * w2, g1 * w1 + g2 * w2, b1 * w1 + b2 * w2,
+                 a1 * p + a2 * (1 - p))
+
+
+def contrast(colors, bottom=None):
+    """
+    The WCAG contrast ratios of the colors against one color
+    :param ColorArray colors: The colors
+    :param Color bottom: The color to compare to (white by default)
+    :return: The ratios (rounded to 2 decimal places)
+    :rtype: list[float]
+    """
+    bottom = bottom or _white
+    if not has_numpy:
+        func = builtins['contrast']
+        return [func([color, bottom]).val for color in colors]
+    r, g, b, _ = _unpack(colors)
+    top = _luminance(r, g, b)
+    other = _luminance(*(numpy.array([float(channel)])
+                         for channel in bottom[:3]))
+    lighter = numpy.maximum(top, other)
+    darker = numpy.minimum(top, other)
+    ratios = (lighter + 0.05) / (darker + 0.05)
+    return [round(ratio, 2) for ratio in ratios.tolist()]
+
+
+def _expect_number(value, func_name):
+    if not isinstance(value, Number):
+        raise CompileError('%s() expected a number, but got %r'
+                           % (func_name, value))
+    return value
+
+
+def _map(name, colors, *args):
+    """ Applies a built-in function to each color (the fallback) """
+    func = builtins[name]
+    args = list(args)
+    return ColorArray.from_colors(func([color] + args) for color in colors)
+
+
+# Vectorized implementation
+
+def _unpack(colors):
+    """ :return: The r, g, b (0-255) and a (0-1) arrays of packed colors """
+    packed = numpy.frombuffer(colors.packed, dtype=numpy.uint32) \
+        if colors.packed.itemsize == 4 else \
+        numpy.array(colors.packed, dtype=numpy.uint32)
+    return ((packed >> 24).astype(float), (packed >> 16 & 0xff).astype(float),
+            (packed >> 8 & 0xff).astype(float), (packed & 0xff) / 255.0)
+
+
+def _round(values):
+    """ Rounds half away from zero, like round() (for non negative values) """
+    return numpy.floor(values + 0.5).astype(numpy.uint32)
+
+
+def _pack(r, g, b, a):
+    """ Clamps the channels (like make_color) and packs them """
+    packed = (_round(numpy.clip(r, 0, 255)) << 24 |
+              _round(numpy.clip(g, 0, 255)) << 16 |
+              _round(numpy.clip(b, 0, 255)) << 8 |
+              _round(numpy.clip(a, 0.0, 1.0) * 255))
+    return ColorArray(packed.tolist())
+
+
+def _adjust_lightness(colors, amount, relative):
+    """ The vectorized functions.adjust(color, LIGHTNESS, amount) """
+    r, g, b, a = _unpack(colors)
+    # the same steps as to_hsla() and from_hsla(), so the rounding matches
+    h, l, s = _rgb_to_hls(r / 255.0, g / 255.0, b / 255.0)
+    h, l, s = h * 360, l * 100, s * 100
+    if relative:
+        amount = ((100 - l) if amount > 0 else l) * amount / 100.0
+    l = numpy.clip(l + amount, 0, 100)
+    s = numpy.clip(s, 0, 100)
+    r, g, b = _hls_to_rgb((h % 360) / 360.0, l / 100.0, s / 100.0)
+    return _pack(r * 255, g * 255, b * 255, a)
+
+
+def _rgb_to_hls(r, g, b):
+    """ The vectorized colorsys.rgb_to_hls """
+    maxc = numpy.maximum(numpy.maximum(r, g), b)
+    minc = numpy.minimum(numpy.minimum(r, g), b)
+    l = (minc + maxc) / 2.0
+    delta = maxc - minc
+    gray = delta == 0
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        s = numpy.where(l <= 0.5, delta / (maxc + minc),
+                        delta / (2.0 - maxc - minc))
+        rc = (maxc - r) / delta
+        gc = (maxc - g) / delta
+        bc = (maxc - b) / delta
+    h = numpy.where(r == maxc, bc - gc,
+                    numpy.where(g == maxc, 2.0 + rc - bc, 4.0 + gc - rc))
+    h = (h / 6.0) % 1.0
+    h[gray] = 0.0
+    s[gray] = 0.0
+    return h, l, s
+
+
+def _hls_to_rgb(h, l, s):
+    """ The vectorized colorsys.hls_to_rgb """
+    m2 = numpy.where(l <= 0.5, l * (1.0 + s), l + s - (l * s))
+    m1 = 2.0 * l - m2
+    gray = s == 0
+    r = numpy.where(gray, l, _hue_to_channel(m1, m2, h + 1 / 3.0))
+    g = numpy.where(gray, l, _hue_to_channel(m1, m2, h))
+    b = numpy.where(gray, l, _hue_to_channel(m1, m2, h - 1 / 3.0))
+    return r, g, b
+
+
+def _hue_to_channel(m1, m2, hue):
+    hue = hue % 1.0
+    return numpy.select(
+        [hue < 1 / 6.0, hue < 0.5, hue < 2 / 3.0],
+        [m1 + (m2 - m1) * hue * 6.0, m2,
+         m1 + (m2 - m1) * (2 / 3.0 - hue) * 6.0],
+        m1)
+
+
+def _luminance(r, g, b):
+    """ The vectorized functions.luminance """
+    def channel(values):
+        values = values / 255.0
+        return numpy.where(values <= 0.03928, values / 12.92,
+                           ((values + 0.055) / 1.055) ** 2.4)
+    return 0.2126 * channel(r) + 0.7152 * channel(g) + 0.0722 * channel(b)
@@ -0,0 +1,158 @@
+"""
+Dead code elimination: removes the function (and mixin) definitions and the
+variable assignments that nothing uses, before the tree is evaluated.
+
+The pass runs after the ScopeAnalyzer. It builds a reference graph whose
+nodes are the variables and functions (a symbol table and a slot), with an
+edge from each definition to everything its body (or value) refers to.
+Everything referred to from outside of definitions (properties, selector
+blocks, mixin calls, ...) is live, and so is everything reachable from a live
+node. The definitions of the rest are removed.
+
+Only definitions outside of function bodies are removed (the last statement of
+a body is its implicit return value), and variables are kept altogether when
+they might be looked up by name (lookup()).
+
+Function bodies that weren't parsed yet (see ast.LazyBlock) are parsed only
+when their function turns out to be reachable, so the bodies of unused
+functions are never parsed at all.
+"""
+from ..ast import Block, SelectorBlock, LoopBlock, Expression, Identifier, \
+    FunctionCall, Conditional, Property, Return, Function, is_unloaded
+from . import instrumentation
+from .functions import builtins
+from .scope import walk_expr
+
+__all__ = ['DeadCodeEliminator']
+
+stats = instrumentation.get_stats('dce')
+
+
+class DeadCodeEliminator(object):
+    def __init__(self):
+        super(DeadCodeEliminator, self).__init__()
+        self.edges = {}
+        """ type: dict[(SymbolTable, int), set] What each definition refers
+        to """
+        self.live = set()
+        """ The symbols referred to from outside of definitions """
+        self.sites = []
+        """ type: list[(Block, Statement, (SymbolTable, int))] The statements
+        defining each symbol """
+        self.dynamic_lookups = False
+        self.lazy = {}
+        """ type: dict[(SymbolTable, int), list[Function]] Definitions whose
+        bodies weren't parsed yet """
+
+    def eliminate(self, root):
+        """
+        Removes the unused definitions from the tree (in place)
+        :param Root root: The tree (after the ScopeAnalyzer ran)
+        :return: The number of removed statements
+        :rtype: int
+        """
+        self._visit_block(root, root.symbols, None)
+        reachable = self.reachable()
+        dead = set()
+        for block, stmt, key in self.sites:
+            if key in reachable:
+                continue
+            if self.dynamic_lookups and not isinstance(stmt, Function):
+                continue
+            dead.add(id(stmt))
+            stats.incr('removed_functions' if isinstance(stmt, Function)
+                       else 'removed_variables')
+        if dead:
+            for block in set(block for block, _, _ in self.sites):
+                block.statements = [stmt for stmt in block.statements
+                                    if id(stmt) not in dead]
+        return len(dead)
+
+    def reachable(self):
+        """ :return: All the symbols reachable from the live ones """
+        reachable = set(self.live)
+        pending = list(reachable)
+        while pending:
+            key = pending.pop()
+            for function in self.lazy.pop(key, ()):
+                self._visit_function(function, key)
+            for key in self.edges.get(key, ()):
+                if key not in reachable:
+                    reachable.add(key)
+                    pending.append(key)
+        return reachable
+
+    # Building the graph
+
+    def _visit_block(self, block, table, owner):
+        """
+        :param SymbolTable table: The table of the block's scope
+        :param owner: The symbol whose definition the block is a part of (None
+            outside of definitions)
+        """
+        for stmt in block.statements:
+            if owner is None and isinstance(stmt, Function):
+                key = table.table_at(stmt.address[0]), stmt.address[1]
+                self.sites.append((block, stmt, key))
+                if is_unloaded(stmt.block):
+                    # parsed only if it turns out to be reachable
+                    self.lazy.setdefault(key, []).append(stmt)
+                else:
+                    self._visit_function(stmt, key)
+            elif owner is None and isinstance(stmt, Identifier) and \
+                    stmt.value is not None:
+                key = table.table_at(stmt.address[0]), stmt.address[1]
+                self.sites.append((block, stmt, key))
+                self._visit_expr(stmt.value, table, key)
+                if stmt.is_default:
+                    self._visit_expr(stmt, table, key)
+            else:
+                self._visit_statement(stmt, table, owner)
+
+    def _visit_function(self, function, owner):
+        for param in function.params:
+            self._visit_expr(param.value, function.symbols, owner)
+        self._visit_block(function.block, function.symbols, owner)
+
+    def _visit_statement(self, stmt, table, owner):
+        if isinstance(stmt, Function):
+            self._visit_function(stmt, owner)
+        elif isinstance(stmt, LoopBlock):
+            self._visit_expr(stmt.loop_expr, table, owner)
+            self._visit_block(stmt, stmt.symbols, owner)
+        elif isinstance(stmt, SelectorBlock):
+            self._visit_block(stmt, stmt.symbols, owner)
+        elif isinstance(stmt, Conditional):
+            self._visit_expr(stmt.condition, table, owner)
+            for branch in (stmt.block, stmt.else_block):
+                if isinstance(branch, Block):
+                    self._visit_block(branch, table, owner)
+                elif branch is not None:
+                    self._visit_statement(branch, table, owner)
+        elif isinstance(stmt, Block):
+            self._visit_block(stmt, table, owner)
+        elif isinstance(stmt, (Property, Return)):
+            self._visit_expr(stmt.expr, table, owner)
+        elif isinstance(stmt, Expression):
+            self._visit_expr(stmt, table, owner)
+
+    def _visit_expr(self, expr, table, owner):
+        """ Adds the references in the expression, as edges from owner (or as
+        live symbols)
+        """
+        refs = self.live if owner is None else \
+            self.edges.setdefault(owner, set())
+        for node in walk_expr(expr):
+            if isinstance(node, (Identifier, FunctionCall)):
+                binding = node.binding
+                if binding is None:
+                    if isinstance(node, FunctionCall):
+                        builtin = builtins.get(node.name)
+                        if builtin is not None and not builtin.pure:
+                            self.dynamic_lookups = True
+                    continue
+                for level, slot in binding.addresses:
+                    refs.add((table.table_at(level), slot))
+            elif isinstance(node, Conditional):
+                # an inline conditional (if it's used as an expression)
+                self._visit_statement(node, table, owner)
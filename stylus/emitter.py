@@ -0,0 +1,98 @@
+"""
+Formats normalized rules (see normalizer.py) and values as CSS text
+"""
+from ..ast import Property
+from ..ast.values import Color, Number, String, Ident, ValueList
+
+__all__ = ['CSSEmitter', 'format_value', 'format_number', 'format_color']
+
+
+class CSSEmitter(object):
+    def __init__(self, indent='  ', cache=None):
+        """
+        :param str indent: The indentation of properties
+        :param cache: A mapping to keep the text of emitted rules in, so rules
+            made of the same shared nodes are formatted once. Evaluated nodes
+            are never changed, so they're keyed by identity. Only the rules of
+            shared blocks are cached (other nodes are new in every compile)
+        """
+        super(CSSEmitter, self).__init__()
+        self.indent = indent
+        self.cache = cache
+
+    def emit(self, rules):
+        """
+        :param list[Rule] rules: The normalized rules
+        :return: The CSS text
+        :rtype: str
+        """
+        return ''.join(self.iter_emit(rules))
+
+    def iter_emit(self, rules):
+        """
+        Yields the CSS text in chunks (a rule at a time), for writing it out
+        as it's formatted
+        :param list[Rule] rules: The normalized rules
+        """
+        for index, rule in enumerate(rules):
+            if index:
+                yield '\n'
+            yield self.emit_rule(rule)
+
+    def emit_rule(self, rule):
+        if self.cache is None or not rule.is_shared:
+            return self._format_rule(rule)
+        key = tuple(rule.selectors), tuple(rule.statements)
+        text = self.cache.get(key)
+        if text is None:
+            text = self.cache[key] = self._format_rule(rule)
+        return text
+
+    def _format_rule(self, rule):
+        lines = [',\n'.join(rule.selectors) + ' {']
+        for stmt in rule.statements:
+            if isinstance(stmt, Property):
+                lines.append('%s%s: %s;' % (self.indent, stmt.name,
+                                            format_value(stmt.expr.value)))
+        lines.append('}\n')
+        return '\n'.join(lines)
+
+
+def format_value(value):
+    """ Formats an evaluated value as CSS """
+    if value is None:
+        return 'null'
+    if value is True:
+        return 'true'
+    if value is False:
+        return 'false'
+    if isinstance(value, Number):
+        return format_number(value.val) + (value.unit or '')
+    if isinstance(value, Color):
+        return format_color(value)
+    if isinstance(value, String):
+        return value.quote + value.val + value.quote
+    if isinstance(value, Ident):
+        return value.name
+    if isinstance(value, ValueList):
+        separator = ', ' if value.separator == ',' else value.separator
+        return separator.join(format_value(item) for item in value.items)
+    return str(value)
+
+
+def format_number(val):
+    """ Formats a number with up to 5 decimal places (1, 0.5, 3.33333) """
+    if val == int(val):
+        return '%d' % val
+    return ('%.5f' % val).rstrip('0').rstrip('.')
+
+
+def format_color(color):
+    """ Formats a color as #rgb, #rrggbb or rgba(r,g,b,a) """
+    if color.a < 1:
+        return 'rgba(%d,%d,%d,%s)' % (color.r, color.g, color.b,
+                                      format_number(color.a))
+    hex_color = '%02x%02x%02x' % (color.r, color.g, color.b)
+    if hex_color[0::2] == hex_color[1::2]:
+        return '#' + hex_color[0::2]
+    return '#' + hex_color
@@ -0,0 +1,579 @@
+"""
+Evaluates a parsed AST into a tree of selector blocks holding plain CSS values.
+Before evaluating, a constant folding pass collapses operations on literals
+(arithmetic, unit math, color math and calls of pure built-in functions) into
+literals, so they're computed once per tree instead of once per use.
+Calls of user functions and mixins that depend only on their arguments are
+cached (see call_cache), so a mixin used with the same arguments all over a
+sheet is expanded once.
+"""
+import operator
+
+from ..ast import Block, Root, SelectorBlock, LoopBlock, Extend, Expression, \
+    Literal, Identifier, ExpressionList, BinaryOperation, UnaryOperation, \
+    Ternary, FunctionCall, Conditional, Property, Return, Function, \
+    is_unloaded
+from ..ast.values import Color, Number, String, Ident, ValueList
+from ..exceptions import CompileError
+from .emitter import format_value
+from .call_cache import CallCache, is_cacheable
+from .dce import DeadCodeEliminator
+from .functions import builtins, make_color, adjust, LIGHTNESS
+from .normalizer import nest_selectors
+from .scope import ScopeAnalyzer, Frame, UNSET
+from .units import conversion_factor
+
+__all__ = ['Evaluator', 'ConstantFolder', 'UserFunction', 'operate',
+           'is_truthy']
+
+
+class UserFunction(object):
+    """ A function (or mixin) defined in stylus, with its defining frame """
+    def __init__(self, definition, frame):
+        """
+        :param Function definition: The function definition
+        :param Frame frame: The frame of the scope it was defined in
+        """
+        super(UserFunction, self).__init__()
+        self.definition = definition
+        self.frame = frame
+
+    def __repr__(self):
+        return '<UserFunction %s>' % self.definition.name
+
+
+class _Return(Exception):
+    """ Used to unwind a function's body on a return statement """
+    def __init__(self, value):
+        super(_Return, self).__init__()
+        self.value = value
+
+
+class Evaluator(object):
+    def __init__(self, root, fold_constants=True, call_cache=None,
+                 overrides=None, eliminate_dead_code=True):
+        """
+        :param Root root: The parsed tree
+        :param bool fold_constants: Whether to run the ConstantFolder on the
+            tree before evaluating it
+        :param bool eliminate_dead_code: Whether to remove unused definitions
+            from the tree before evaluating it (see dce.py)
+        :param CallCache|bool call_cache: The cache for user function calls.
+            A new one is used by default, False disables caching
+        :param dict overrides: Values for root variables (by name, like
+            '$brand'), replacing the ones assigned in the source
+        """
+        super(Evaluator, self).__init__()
+        self.root = root
+        self.fold_constants = fold_constants
+        self.eliminate_dead_code = eliminate_dead_code
+        if call_cache is None or call_cache is True:
+            call_cache = CallCache()
+        self.call_cache = call_cache if call_cache is not False else None
+        self.overrides = overrides or {}
+        self.pinned = frozenset()
+        """ The addresses of the overridden variables """
+        self.selectors = [None]
+        """ The full selectors of the blocks being evaluated (for selector())
+        """
+
+    def evaluate(self):
+        """
+        :return: A new tree with only selector blocks, properties (with
+            Literal values) and extends
+        :rtype: Root
+        """
+        self.prepare()
+        output = Root()
+        self.eval_block(self.root, output, self.root_frame())
+        return output
+
+    def prepare(self):
+        """ Folds the constants of the tree, resolves its scopes and removes
+        its dead code (once per tree; the tree can be evaluated many times
+        afterwards)
+        """
+        if self.root.symbols is None:
+            if self.fold_constants:
+                ConstantFolder().fold(self.root)
+            ScopeAnalyzer().analyze(self.root)
+            if self.eliminate_dead_code:
+                DeadCodeEliminator().eliminate(self.root)
+
+    def root_frame(self):
+        """ :return: A new frame for the root, with the overrides set """
+        table = self.root.symbols
+        frame = Frame(table)
+        pinned = set()
+        for name, value in self.overrides.iteritems():
+            slot = table.slots.get(name)
+            if slot is None or slot not in table.variables:
+                raise CompileError('Cannot override %s, it is not assigned '
+                                   'at the root' % name)
+            frame.values[slot] = value
+            pinned.add((table.level, slot))
+        self.pinned = frozenset(pinned)
+        return frame
+
+    def eval_block(self, block, output, frame):
+        """
+        Evaluates the statements of block into output
+        :return: The value of the last statement
+        """
+        value = None
+        for stmt in block.statements:
+            value = self.eval_statement(stmt, output, frame)
+        return value
+
+    def eval_statement(self, stmt, output, frame):
+        """
+        Evaluates a statement. Properties, selector blocks and extends are
+        added to output
+        :param Block output: The evaluated block to add the results to
+        :return: The value of the statement (for expressions and conditionals)
+        """
+        if isinstance(stmt, Property):
+            output.statements.append(
+                Property(stmt.name, Literal(self.eval(stmt.expr, frame))))
+        elif isinstance(stmt, SelectorBlock):
+            block = SelectorBlock(list(stmt.selectors), parent=output)
+            if stmt.symbols is not frame.table:
+                frame = Frame(stmt.symbols, frame)
+            self.selectors.append(nest_selectors(self.selectors[-1],
+                                                 stmt.selectors))
+            try:
+                self.eval_block(stmt, block, frame)
+            finally:
+                self.selectors.pop()
+            output.statements.append(block)
+        elif isinstance(stmt, Extend):
+            output.statements.append(stmt)
+        elif isinstance(stmt, Function):
+            frame.set(stmt.address, UserFunction(stmt, frame))
+        elif isinstance(stmt, Conditional):
+            return self.eval_conditional(stmt, output, frame)
+        elif isinstance(stmt, LoopBlock):
+            return self.eval_loop(stmt, output, frame)
+        elif isinstance(stmt, Return):
+            raise _Return(self.eval(stmt.expr, frame)
+                          if stmt.expr is not None else None)
+        elif isinstance(stmt, FunctionCall):
+            return self.call(stmt, frame, output)
+        elif isinstance(stmt, Expression):
+            return self.eval(stmt, frame)
+        elif isinstance(stmt, Block):
+            return self.eval_block(stmt, output, frame)
+
+    def eval_conditional(self, cond, output, frame):
+        is_true = is_truthy(self.eval(cond.condition, frame)) != cond.negate
+        branch = cond.block if is_true else cond.else_block
+        if branch is None:
+            return None
+        if isinstance(branch, Block):
+            return self.eval_block(branch, output, frame)
+        return self.eval_statement(branch, output, frame)
+
+    def eval_loop(self, loop, output, frame):
+        """ Evaluates the loop body for each item. All the iterations share
+        one frame, which is reset between them
+        """
+        iterable = self.eval(loop.loop_expr, frame)
+        if isinstance(iterable, ValueList):
+            items = iterable.items
+        else:
+            items = () if iterable is None else (iterable,)
+        value = None
+        loop_frame = Frame(loop.symbols, frame)
+        values = loop_frame.values
+        for index, item in enumerate(items):
+            if index:
+                loop_frame.reset()
+            values[0] = item
+            if loop.key_name:
+                values[1] = Number(float(index), None)
+            value = self.eval_block(loop, output, loop_frame)
+        return value
+
+    def eval(self, expr, frame):
+        """
+        Evaluates an expression
+        :param Expression expr: The expression
+        :param Frame frame: The frame to look variables up in
+        :return: The value (from ast.values, or a bool or None)
+        """
+        if isinstance(expr, Literal):
+            return expr.value
+        if isinstance(expr, Identifier):
+            if expr.value is None:
+                return self.lookup(expr, frame)
+            if expr.address in self.pinned:
+                # overridden from the outside
+                level, slot = expr.address
+                return frame.display[level][slot]
+            if expr.is_default:
+                value = frame.get(expr.binding)
+                if value is not UNSET:
+                    return value
+            value = self.eval(expr.value, frame)
+            frame.set(expr.address, value)
+            return value
+        if isinstance(expr, BinaryOperation):
+            left = self.eval(expr.left, frame)
+            if expr.op == '&&' and not is_truthy(left):
+                return left
+            if expr.op == '||' and is_truthy(left):
+                return left
+            return operate(expr.op, left, self.eval(expr.right, frame))
+        if isinstance(expr, UnaryOperation):
+            return unary_operate(expr.op, self.eval(expr.operand, frame))
+        if isinstance(expr, ExpressionList):
+            return ValueList(tuple(self.eval(item, frame)
+                                   for item in expr.items), expr.separator)
+        if isinstance(expr, FunctionCall):
+            return self.call(expr, frame)
+        if isinstance(expr, Ternary):
+            if is_truthy(self.eval(expr.condition, frame)):
+                return self.eval(expr.true_expr, frame)
+            return self.eval(expr.false_expr, frame)
+        if isinstance(expr, Conditional):
+            return self.eval_conditional(expr, Block(None), frame)
+        raise CompileError('Cannot evaluate %r' % expr)
+
+    def lookup(self, identifier, frame):
+        """ Returns the value of a variable. Undefined names are literals
+        :param Identifier identifier: A (resolved) reference
+        """
+        value = frame.get(identifier.binding)
+        if value is UNSET:
+            return Ident(identifier.name)
+        if identifier.binding.negate:
+            # -$var is lexed as one identifier
+            if isinstance(value, Number):
+                return Number(-value.val, value.unit)
+            return Ident(identifier.name)
+        return value
+
+    def lookup_name(self, name, frame):
+        """ Returns the value of a variable by its name (for lookup()) """
+        value = frame.lookup_name(name)
+        return None if value is UNSET else value
+
+    def call(self, call, frame, output=None):
+        """
+        Calls a function. When output is given, the function is used as a
+        mixin, and the properties and blocks in its body are added to output
+        :param FunctionCall call: The call
+        :param Block output: The block the call was made in (for mixins)
+        :return: The returned value
+        """
+        args = [self.eval(arg, frame) for arg in call.args]
+        if call.binding is not None:
+            func = frame.get(call.binding)
+            if isinstance(func, UserFunction):
+                return self.invoke(func, args, output)
+        builtin = builtins.get(call.name)
+        if builtin is not None:
+            return builtin(args, evaluator=self, frame=frame)
+        # Not a stylus function, so it must be a CSS one (translate(), etc)
+        return Ident('%s(%s)' % (call.name, ', '.join(format_value(arg)
+                                                       for arg in args)))
+
+    def invoke(self, func, args, output=None):
+        """
+        Runs a user function's body with the given argument values, or reuses
+        the result of a previous call with the same values
+        :param UserFunction func: The function
+        :param list args: The argument values
+        :param Block output: The block to mix the body into (for mixins)
+        :return: The returned value, or the value of the last statement
+        """
+        definition = func.definition
+        cache = self.call_cache
+        if cache is None or not is_cacheable(definition):
+            return self.expand(func, args, output)
+        entry = cache.get(definition, args)
+        if entry is None:
+            expansion = Block(None)
+            entry = cache.store(definition, args,
+                                self.expand(func, args, expansion),
+                                expansion.statements)
+        value, nodes = entry
+        if output is not None:
+            output.statements.extend(nodes)
+        return value
+
+    def expand(self, func, args, output=None):
+        """ Runs a user function's body (see invoke) """
+        definition = func.definition
+        if is_unloaded(definition.block):
+            # the body declares its locals, so parse it before making a frame
+            definition.block.load()
+        local = Frame(definition.symbols, func.frame)
+        local.values[0] = ValueList(tuple(args), ' ')  # arguments
+        for i, param in enumerate(definition.params):
+            if i < len(args):
+                value = args[i]
+            elif param.value is not None:
+                value = self.eval(param.value, local)
+            else:
+                value = None
+            local.set(param.address, value)
+        if output is None:
+            output = Block(None)
+        try:
+            return self.eval_block(definition.block, output, local)
+        except _Return as ret:
+            return ret.value
+
+
+class ConstantFolder(object):
+    """
+    Replaces operations whose operands are all literals (1px + 2px,
+    #fff - 10%, lighten(#000, 20%)) with their value. Operations that fail are
+    left for the evaluator, to report them in context.
+    """
+    def __init__(self):
+        super(ConstantFolder, self).__init__()
+        self.shadowed = set()
+        """ type: set[str] built-in names that are redefined in stylus """
+
+    def fold(self, root):
+        """ Folds the tree in place
+        :param Block root: The root of the tree
+        """
+        self._collect_functions(root)
+        self.fold_block(root)
+        return root
+
+    def _collect_functions(self, block):
+        for stmt in block.statements:
+            if isinstance(stmt, Function):
+                self.shadowed.add(stmt.name)
+                if not is_unloaded(stmt.block):
+                    self._collect_functions(stmt.block)
+            elif isinstance(stmt, Block):
+                self._collect_functions(stmt)
+
+    def fold_block(self, block):
+        statements = block.statements
+        for i, stmt in enumerate(statements):
+            if isinstance(stmt, (FunctionCall, Conditional)):
+                self.fold_statement(stmt)
+            elif isinstance(stmt, Expression):
+                statements[i] = self.fold_expr(stmt)
+            else:
+                self.fold_statement(stmt)
+
+    def fold_statement(self, stmt):
+        if isinstance(stmt, Property):
+            stmt.expr = self.fold_expr(stmt.expr)
+        elif isinstance(stmt, FunctionCall):
+            stmt.args = [self.fold_expr(arg) for arg in stmt.args]
+        elif isinstance(stmt, Conditional):
+            stmt.condition = self.fold_expr(stmt.condition)
+            for branch in (stmt.block, stmt.else_block):
+                if isinstance(branch, Block):
+                    self.fold_block(branch)
+                elif branch is not None:
+                    self.fold_statement(branch)
+        elif isinstance(stmt, Function):
+            for param in stmt.params:
+                if param.value is not None:
+                    param.value = self.fold_expr(param.value)
+            if is_unloaded(stmt.block):
+                stmt.block.on_load.append(self._fold_loaded)
+            else:
+                self.fold_block(stmt.block)
+        elif isinstance(stmt, Return):
+            if stmt.expr is not None:
+                stmt.expr = self.fold_expr(stmt.expr)
+        elif isinstance(stmt, LoopBlock):
+            stmt.loop_expr = self.fold_expr(stmt.loop_expr)
+            self.fold_block(stmt)
+        elif isinstance(stmt, Block):
+            self.fold_block(stmt)
+        elif isinstance(stmt, Identifier) and stmt.value is not None:
+            stmt.value = self.fold_expr(stmt.value)
+
+    def fold_expr(self, expr):
+        """ :return: The folded expression (a Literal if it's constant) """
+        if isinstance(expr, BinaryOperation):
+            expr.left = self.fold_expr(expr.left)
+            expr.right = self.fold_expr(expr.right)
+            if isinstance(expr.left, Literal) and \
+                    isinstance(expr.right, Literal):
+                return self._try_fold(expr, operate, expr.op, expr.left.value,
+                                      expr.right.value)
+        elif isinstance(expr, UnaryOperation):
+            expr.operand = self.fold_expr(expr.operand)
+            if isinstance(expr.operand, Literal):
+                return self._try_fold(expr, unary_operate, expr.op,
+                                      expr.operand.value)
+        elif isinstance(expr, ExpressionList):
+            expr.items = [self.fold_expr(item) for item in expr.items]
+            if all(isinstance(item, Literal) for item in expr.items):
+                return Literal(ValueList(tuple(item.value for item in
+                                               expr.items), expr.separator))
+        elif isinstance(expr, Ternary):
+            expr.condition = self.fold_expr(expr.condition)
+            expr.true_expr = self.fold_expr(expr.true_expr)
+            expr.false_expr = self.fold_expr(expr.false_expr)
+            if isinstance(expr.condition, Literal):
+                return expr.true_expr if is_truthy(expr.condition.value) \
+                    else expr.false_expr
+        elif isinstance(expr, FunctionCall):
+            expr.args = [self.fold_expr(arg) for arg in expr.args]
+            builtin = builtins.get(expr.name)
+            if builtin is not None and builtin.pure and \
+                    expr.name not in self.shadowed and \
+                    all(isinstance(arg, Literal) for arg in expr.args):
+                return self._try_fold(expr, builtin,
+                                      [arg.value for arg in expr.args])
+        elif isinstance(expr, Identifier) and expr.value is not None:
+            expr.value = self.fold_expr(expr.value)
+        return expr
+
+    def _fold_loaded(self, block):
+        """ Folds a lazy function body once it's parsed """
+        self._collect_functions(block)
+        self.fold_block(block)
+
+    @staticmethod
+    def _try_fold(expr, func, *args):
+        try:
+            return Literal(func(*args))
+        except CompileError:
+            return expr
+
+
+_arithmetic_operators = {
+    '+': operator.add,
+    '-': operator.sub,
+    '*': operator.mul,
+    '/': operator.truediv,
+    '%': operator.mod,
+    '**': operator.pow,
+}
+
+_comparison_operators = {
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+}
+
+
+def operate(op, left, right):
+    """
+    Performs a binary operation on two values
+    :param str op: The operator
+    :return: The resulting value
+    """
+    if op == '&&':
+        return right if is_truthy(left) else left
+    if op == '||':
+        return left if is_truthy(left) else right
+    if op == '==':
+        return _equals(left, right)
+    if op == '!=':
+        return not _equals(left, right)
+    if isinstance(left, Number) and isinstance(right, Number):
+        return _number_operate(op, left, right)
+    if isinstance(left, Color):
+        return _color_operate(op, left, right)
+    if isinstance(left, String) and op == '+':
+        return String(left.val + _text(right), left.quote)
+    if isinstance(left, Ident) and op == '+' and \
+            isinstance(right, (String, Ident)):
+        return Ident(left.name + _text(right))
+    raise CompileError('Cannot perform %r %s %r' % (left, op, right))
+
+
+def _number_operate(op, left, right):
+    if op in _comparison_operators:
+        return _comparison_operators[op](left.val, _coerce(right, left.unit))
+    if op in ('..', '...'):
+        start, end = int(left.val), int(right.val)
+        step = 1 if end >= start else -1
+        if op == '..':
+            end += step
+        return ValueList(tuple(Number(float(i), left.unit)
+                               for i in xrange(start, end, step)), ' ')
+    func = _arithmetic_operators.get(op)
+    if func is None:
+        raise CompileError('Invalid operator %s for numbers' % op)
+    value = _coerce(right, left.unit)
+    if op in ('/', '%') and value == 0:
+        raise CompileError('Division by zero')
+    return Number(func(left.val, value), left.unit or right.unit)
+
+
+def _coerce(number, unit):
+    """ :return: The value of number in the given unit, if its unit can be
+    converted to it (its own value otherwise)
+    """
+    if unit and number.unit and number.unit != unit:
+        factor = conversion_factor(number.unit, unit)
+        if factor is not None:
+            return number.val * factor
+    return number.val
+
+
+def _color_operate(op, color, other):
+    if isinstance(other, Number):
+        if other.unit == '%' and op in ('+', '-'):
+            amount = other.val if op == '+' else -other.val
+            return adjust(color, LIGHTNESS, Number(amount, '%'))
+        func = _arithmetic_operators.get(op)
+        if func is None or (op in ('/', '%') and other.val == 0):
+            raise CompileError('Cannot perform %r %s %r' % (color, op, other))
+        return make_color(func(color.r, other.val), func(color.g, other.val),
+                          func(color.b, other.val), color.a)
+    if isinstance(other, Color):
+        func = _arithmetic_operators.get(op)
+        if func is None or op in ('/', '%'):
+            raise CompileError('Cannot perform %r %s %r' % (color, op, other))
+        return make_color(func(color.r, other.r), func(color.g, other.g),
+                          func(color.b, other.b), color.a)
+    raise CompileError('Cannot perform %r %s %r' % (color, op, other))
+
+
+def unary_operate(op, value):
+    if op == '!':
+        return not is_truthy(value)
+    if isinstance(value, Number):
+        if op == '-':
+            return Number(-value.val, value.unit)
+        if op == '+':
+            return value
+    raise CompileError('Cannot perform %s%r' % (op, value))
+
+
+def is_truthy(value):
+    """ Converts a value to a boolean, the way stylus does """
+    if value is None or value is False:
+        return False
+    if isinstance(value, Number):
+        return value.val != 0
+    if isinstance(value, String):
+        return bool(value.val)
+    if isinstance(value, ValueList):
+        return len(value.items) > 1 or \
+            (bool(value.items) and is_truthy(value.items[0]))
+    return True
+
+
+def _equals(left, right):
+    if isinstance(left, Number) and isinstance(right, Number):
+        return left.val == _coerce(right, left.unit)
+    if isinstance(left, (String, Ident)) and isinstance(right, (String, Ident)):
+        return _text(left) == _text(right)
+    return type(left) is type(right) and left == right
+
+
+def _text(value):
+    if isinstance(value, String):
+        return value.val
+    if isinstance(value, Ident):
+        return value.name
+    return format_value(value)
@@ -0,0 +1,105 @@
+"""
+@extend support. Instead of scanning every rule for every @extend, we build an
+inverted index (extended selector -> extending selectors) once, close it over
+chained extends with a worklist, and then rewrite all the rules in a single
+pass where each selector costs one dict lookup.
+"""
+from ..exceptions import CompileError
+from .selectors import Selector
+
+__all__ = ['ExtendIndex', 'is_placeholder']
+
+
+def is_placeholder(selector):
+    """ Whether the selector uses a placeholder ($name), which is only meant to
+    be extended and never emitted
+    """
+    if isinstance(selector, Selector):
+        return selector.is_placeholder
+    return '$' in selector
+
+
+class ExtendIndex(object):
+    def __init__(self):
+        self._extenders = {}
+        """ type: dict[str, list[str]] target selector -> direct extenders """
+        self._optional = set()
+        self._closure = None
+
+    def __len__(self):
+        return len(self._extenders)
+
+    def add(self, targets, extenders, optional=False):
+        """
+        Registers that the extenders selectors extend the target selectors
+        :param list[str] targets: The selectors being extended
+        :param list[str] extenders: The selectors of the extending block
+        :param bool optional: Whether it's fine for the targets to not exist
+        """
+        for target in targets:
+            self._extenders.setdefault(target, []).extend(extenders)
+            if optional:
+                self._optional.add(target)
+        self._closure = None
+
+    def closure(self):
+        """
+        Resolves chained extends (.c extends .b which extends .a, so .c
+        extends .a too) with a worklist per target.
+        :return: A map of target selector -> all of its (direct and indirect)
+            extenders, in the order they were found
+        :rtype: dict[str, list[str]]
+        """
+        if self._closure is not None:
+            return self._closure
+        direct = self._extenders
+        closure = {}
+        for target, extenders in direct.iteritems():
+            seen = {target}
+            resolved = []
+            worklist = list(reversed(extenders))
+            while worklist:
+                extender = worklist.pop()
+                if extender in seen:
+                    continue
+                seen.add(extender)
+                resolved.append(extender)
+                chained = direct.get(extender)
+                if chained:
+                    worklist.extend(reversed(chained))
+            closure[target] = resolved
+        self._closure = closure
+        return closure
+
+    def extend(self, selectors, found=None):
+        """
+        Returns the selectors with all the selectors extending them added
+        :param list[str] selectors: The selectors of a rule
+        :param set found: If given, the extended selectors are added to it
+        :rtype: list[str]
+        """
+        closure = self.closure()
+        result = None
+        for selector in selectors:
+            extenders = closure.get(selector)
+            if extenders:
+                if result is None:
+                    result = list(selectors)
+                    present = set(selectors)
+                if found is not None:
+                    found.add(selector)
+                for extender in extenders:
+                    if extender not in present:
+                        present.add(extender)
+                        result.append(extender)
+        return selectors if result is None else result
+
+    def check_found(self, found):
+        """
+        Raises an error for non-optional extended selectors that did not match
+        any rule
+        :param set found: The selectors that matched (from extend())
+        """
+        for target in self._extenders:
+            if target not in found and target not in self._optional:
+                raise CompileError('Failed to @extend "%s"' % target)
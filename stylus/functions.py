@@ -0,0 +1,384 @@
+"""
+The built-in stylus functions.
+Pure functions (whose result depends only on their arguments) are memoized in
+an LRU cache keyed by the argument values, since the same mixins tend to call
+them with the same arguments over and over.
+"""
+import colorsys
+import math
+
+from ..ast.values import Color, Number, String, Ident, ValueList
+from ..utils import LRUCache
+from ..exceptions import CompileError
+from . import instrumentation
+from .units import get_unit
+
+__all__ = ['BuiltinFunction', 'builtin', 'builtins', 'make_color', 'to_hsla',
+           'from_hsla']
+
+_missing = object()
+
+builtins = {}
+""" type: dict[str, BuiltinFunction] """
+
+
+class BuiltinFunction(object):
+    def __init__(self, name, func, pure=True, cache_size=1024):
+        """
+        :param str name: The name of the function in stylus
+        :param func: The implementation. Pure functions get the argument
+            values, the rest get the evaluator and the calling frame first
+        :param bool pure: Whether the result depends only on the arguments
+            (so it can be memoized and folded into a constant)
+        """
+        super(BuiltinFunction, self).__init__()
+        self.name = name
+        self.func = func
+        self.pure = pure
+        self.cache = LRUCache(cache_size) if pure else None
+        """ The memoized results (of pure functions) """
+
+    def __call__(self, args, evaluator=None, frame=None):
+        """
+        :param list args: The argument values
+        :return: The resulting value
+        """
+        if not self.pure:
+            return self._invoke(evaluator, frame, *args)
+        # values of different types might be equal as tuples
+        key = tuple((type(arg), arg) for arg in args)
+        result = self.cache.get(key, _missing)
+        if result is _missing:
+            result = self._invoke(*args)
+            self.cache[key] = result
+        return result
+
+    def _invoke(self, *args):
+        try:
+            return self.func(*args)
+        except TypeError:
+            raise CompileError('Invalid arguments for %s()' % self.name)
+
+    def __repr__(self):
+        return '<BuiltinFunction %s>' % self.name
+
+
+def builtin(name=None, pure=True):
+    """ Registers the decorated function as a built-in function
+    :param str name: The stylus name. Defaults to the function name, with
+        dashes instead of underscores (and without trailing underscores)
+    :param bool pure: See BuiltinFunction
+    """
+    def decorator(func):
+        builtin_name = name or func.__name__.rstrip('_').replace('_', '-')
+        builtins[builtin_name] = BuiltinFunction(builtin_name, func, pure)
+        return func
+    return decorator
+
+
+def cache_stats():
+    """ The hits and misses of the built-in functions' memo caches, for the
+    instrumentation report
+    """
+    caches = set(func.cache for func in builtins.itervalues()
+                 if func.cache is not None)
+    return {'hits': sum(cache.hits for cache in caches),
+            'misses': sum(cache.misses for cache in caches),
+            'entries': sum(len(cache) for cache in caches)}
+
+instrumentation.register_provider('builtins', cache_stats)
+
+
+def _expect(value, value_type, func_name):
+    if not isinstance(value, value_type):
+        raise CompileError('%s() expected a %s, but got %r'
+                           % (func_name, value_type.__name__.lower(), value))
+    return value
+
+
+def make_color(r, g, b, a=1.0):
+    """ Creates a color, clamping (and rounding) the channels """
+    return Color(int(round(min(max(r, 0), 255))),
+                 int(round(min(max(g, 0), 255))),
+                 int(round(min(max(b, 0), 255))),
+                 min(max(a, 0.0), 1.0))
+
+
+def to_hsla(color):
+    """ :return: (hue 0-360, saturation 0-100, lightness 0-100, alpha) """
+    h, l, s = colorsys.rgb_to_hls(color.r / 255.0, color.g / 255.0,
+                                  color.b / 255.0)
+    return h * 360, s * 100, l * 100, color.a
+
+
+def from_hsla(h, s, l, a):
+    s = min(max(s, 0), 100)
+    l = min(max(l, 0), 100)
+    r, g, b = colorsys.hls_to_rgb((h % 360) / 360.0, l / 100.0, s / 100.0)
+    return make_color(r * 255, g * 255, b * 255, a)
+
+
+HUE, SATURATION, LIGHTNESS = 0, 1, 2
+
+
+def adjust(color, channel, amount):
+    """
+    Adjusts an HSL channel of the color. Percentages are relative to the
+    current value (or to what's left, when lightening)
+    :param Color color: The color to adjust
+    :param int channel: HUE, SATURATION or LIGHTNESS
+    :param Number amount: The amount to add
+    """
+    hsla = list(to_hsla(color))
+    value = amount.val
+    if amount.unit == '%':
+        if channel == LIGHTNESS and value > 0:
+            value = (100 - hsla[LIGHTNESS]) * value / 100.0
+        else:
+            value = hsla[channel] * value / 100.0
+    hsla[channel] += value
+    return from_hsla(*hsla)
+
+
+def luminance(color):
+    """ The relative luminance of the color (as defined by WCAG) """
+    def channel(value):
+        value /= 255.0
+        if value <= 0.03928:
+            return value / 12.92
+        return ((value + 0.055) / 1.055) ** 2.4
+    return (0.2126 * channel(color.r) + 0.7152 * channel(color.g) +
+            0.0722 * channel(color.b))
+
+
+# Math
+
+@builtin('abs')
+def abs_(n):
+    n = _expect(n, Number, 'abs')
+    return Number(abs(n.val), n.unit)
+
+
+@builtin()
+def ceil(n):
+    n = _expect(n, Number, 'ceil')
+    return Number(float(math.ceil(n.val)), n.unit)
+
+
+@builtin()
+def floor(n):
+    n = _expect(n, Number, 'floor')
+    return Number(float(math.floor(n.val)), n.unit)
+
+
+@builtin('round')
+def round_(n, precision=None):
+    n = _expect(n, Number, 'round')
+    digits = int(precision.val) if precision is not None else 0
+    return Number(round(n.val, digits), n.unit)
+
+
+@builtin('min')
+def min_(a, b):
+    return a if _expect(a, Number, 'min').val <= _expect(b, Number, 'min').val \
+        else b
+
+
+@builtin('max')
+def max_(a, b):
+    return a if _expect(a, Number, 'max').val >= _expect(b, Number, 'max').val \
+        else b
+
+
+@builtin()
+def unit(n, unit_type=None):
+    n = _expect(n, Number, 'unit')
+    if unit_type is None:
+        return String(n.unit or '', "'")
+    name = unit_type.name if isinstance(unit_type, Ident) else unit_type.val
+    return Number(n.val, get_unit(name or None))
+
+
+@builtin()
+def percentage(n):
+    return Number(_expect(n, Number, 'percentage').val * 100, '%')
+
+
+# Colors
+
+@builtin()
+def rgba(r, g=None, b=None, a=None):
+    if isinstance(r, Color):
+        alpha = _expect(g, Number, 'rgba')
+        return make_color(r.r, r.g, r.b, alpha.val / 100.0
+                          if alpha.unit == '%' else alpha.val)
+    channels = []
+    for channel in (r, g, b):
+        channel = _expect(channel, Number, 'rgba')
+        channels.append(channel.val * 2.55 if channel.unit == '%'
+                        else channel.val)
+    alpha = _expect(a, Number, 'rgba')
+    return make_color(*channels, a=alpha.val / 100.0
+                      if alpha.unit == '%' else alpha.val)
+
+
+@builtin()
+def rgb(r, g=None, b=None):
+    if isinstance(r, Color):
+        return make_color(r.r, r.g, r.b)
+    return rgba(r, g, b, Number(1.0, None))
+
+
+@builtin()
+def red(color):
+    return Number(_expect(color, Color, 'red').r, None)
+
+
+@builtin()
+def green(color):
+    return Number(_expect(color, Color, 'green').g, None)
+
+
+@builtin()
+def blue(color):
+    return Number(_expect(color, Color, 'blue').b, None)
+
+
+@builtin()
+def alpha(color):
+    return Number(_expect(color, Color, 'alpha').a, None)
+
+
+@builtin()
+def hue(color):
+    return Number(to_hsla(_expect(color, Color, 'hue'))[HUE], 'deg')
+
+
+@builtin()
+def saturation(color):
+    return Number(to_hsla(_expect(color, Color, 'saturation'))[SATURATION],
+                  '%')
+
+
+@builtin()
+def lightness(color):
+    return Number(to_hsla(_expect(color, Color, 'lightness'))[LIGHTNESS], '%')
+
+
+@builtin()
+def lighten(color, amount):
+    return adjust(_expect(color, Color, 'lighten'), LIGHTNESS,
+                  _expect(amount, Number, 'lighten'))
+
+
+@builtin()
+def darken(color, amount):
+    amount = _expect(amount, Number, 'darken')
+    return adjust(_expect(color, Color, 'darken'), LIGHTNESS,
+                  Number(-amount.val, amount.unit))
+
+
+@builtin()
+def saturate(color, amount):
+    return adjust(_expect(color, Color, 'saturate'), SATURATION,
+                  _expect(amount, Number, 'saturate'))
+
+
+@builtin()
+def desaturate(color, amount):
+    amount = _expect(amount, Number, 'desaturate')
+    return adjust(_expect(color, Color, 'desaturate'), SATURATION,
+                  Number(-amount.val, amount.unit))
+
+
+@builtin()
+def grayscale(color):
+    return desaturate(color, Number(100.0, '%'))
+
+
+@builtin()
+def invert(color):
+    color = _expect(color, Color, 'invert')
+    return make_color(255 - color.r, 255 - color.g, 255 - color.b, color.a)
+
+
+@builtin()
+def mix(color1, color2, weight=None):
+    """ Mixes two colors by weight (percentage of color1, 50% by default) """
+    color1 = _expect(color1, Color, 'mix')
+    color2 = _expect(color2, Color, 'mix')
+    p = _expect(weight, Number, 'mix').val / 100.0 if weight else 0.5
+    w = p * 2 - 1
+    a = color1.a - color2.a
+    w1 = ((w if w * a == -1 else (w + a) / (1 + w * a)) + 1) / 2.0
+    w2 = 1 - w1
+    return make_color(color1.r * w1 + color2.r * w2,
+                      color1.g * w1 + color2.g * w2,
+                      color1.b * w1 + color2.b * w2,
+                      color1.a * p + color2.a * (1 - p))
+
+
+@builtin()
+def contrast(top, bottom=None):
+    """ The WCAG contrast ratio between two colors (bottom defaults to
+    white)
+    """
+    top = _expect(top, Color, 'contrast')
+    bottom = _expect(bottom, Color, 'contrast') if bottom else \
+        Color(255, 255, 255, 1.0)
+    lighter, darker = sorted((luminance(top), luminance(bottom)), reverse=True)
+    return Number(round((lighter + 0.05) / (darker + 0.05), 2), None)
+
+
+# Misc
+
+@builtin()
+def length(value=None):
+    if value is None:
+        return Number(0.0, None)
+    if isinstance(value, ValueList):
+        return Number(float(len(value.items)), None)
+    return Number(1.0, None)
+
+
+@builtin('type-of')
+def type_of(value):
+    if isinstance(value, Number):
+        type_name = 'unit'
+    elif isinstance(value, Color):
+        type_name = 'rgba'
+    elif isinstance(value, String):
+        type_name = 'string'
+    elif isinstance(value, Ident):
+        type_name = 'ident'
+    elif isinstance(value, bool):
+        type_name = 'boolean'
+    elif value is None:
+        type_name = 'null'
+    elif isinstance(value, ValueList):
+        type_name = 'expression'
+    else:
+        type_name = 'function'
+    return String(type_name, "'")
+
+builtins['typeof'] = builtins['type-of']
+
+
+@builtin()
+def unquote(value):
+    return Ident(value.val) if isinstance(value, String) else value
+
+
+@builtin(pure=False)
+def lookup(evaluator, frame, name):
+    """ Looks up the value of the variable with the given name """
+    return evaluator.lookup_name(_expect(name, String, 'lookup').val, frame)
+
+
+@builtin(pure=False)
+def selector(evaluator, frame):
+    """ The full selector of the block the call is made in """
+    selectors = evaluator.selectors[-1]
+    if not selectors:
+        raise CompileError('selector() called outside of a selector block')
+    return String(','.join(selectors), "'")
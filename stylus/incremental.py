@@ -0,0 +1,273 @@
+"""
+Incremental rebuilds: recompiles a changed source, re-lexing only the
+top-level blocks whose text changed, and re-evaluating and re-emitting only
+the root statements whose output may have changed.
+
+The source is split into chunks of whole top-level blocks (see
+bounded.iter_chunks), and the tokens of each chunk are kept by its text: an
+unchanged chunk isn't lexed again (its tokens are moved to its new lines). All
+the chunks are parsed again from their tokens, since Evaluator.prepare
+annotates the parsed nodes in place, so parsed statements can't be shared
+between builds.
+
+Each root statement gets a fingerprint: a hash of its source lines, and of
+the values of the root variables it reads when it's evaluated (following the
+root functions and mixins it calls into their definitions, see
+variants.root_effects). A statement whose fingerprint was seen in the
+previous build reuses that build's evaluated nodes and CSS, and the CSS of
+the statements is spliced together in order. The byte range of each
+statement in the output is kept in `ranges` (there are no source maps yet,
+so that's what a caller has for mapping output back to statements).
+
+Statements that assign root variables (or define root functions) are always
+evaluated, since the statements after them read their values from the frame,
+and so are statements that call impure built-ins. When the output has
+@extend directives, which apply across statements, the rules are normalized
+and emitted as a whole (the evaluated nodes are still reused).
+
+    compiler = IncrementalCompiler()
+    css = compiler.compile(source)
+    css = compiler.compile(changed_source)  # mostly spliced
+"""
+import hashlib
+from collections import namedtuple
+
+from ..ast import Block, Root, Extend
+from . import instrumentation
+from .bounded import iter_chunks
+from .call_cache import share
+from .emitter import CSSEmitter
+from .evaluator import Evaluator, UserFunction
+from .interning import InternTable
+from .lexer import StylusLexer
+from .normalizer import Normalizer
+from .parser import StylusParser, TokenReplay
+from .tokens import EOFToken
+from .variants import root_effects, defined_functions
+
+__all__ = ['IncrementalCompiler', 'Segment']
+
+stats = instrumentation.get_stats('incremental')
+
+Segment = namedtuple('Segment', ['nodes', 'css', 'has_extends'])
+""" The (frozen) evaluated nodes of a root statement, their CSS, and whether
+they have @extend directives """
+
+
+class IncrementalCompiler(object):
+    def __init__(self, indent='  '):
+        """
+        :param str indent: The indentation of the output
+        """
+        super(IncrementalCompiler, self).__init__()
+        self.indent = indent
+        self.segments = {}
+        """ type: dict[str, Segment] The output of the root statements of the
+        last build, by their fingerprints """
+        self.chunks = {}
+        """ type: dict[unicode, (int, list[Token])] The first line and the
+        tokens of the chunks of the last build, by their text """
+        self.interner = InternTable()
+        self.output = None
+        self.ranges = None
+        """ type: list[(int, int)] The range of the output of each (live) root
+        statement of the last build, or None if its rules were emitted as a
+        whole """
+
+    def compile(self, source):
+        """
+        Compiles the source, reusing the output of the previous build for the
+        statements that didn't change
+        :param unicode source: The stylus source
+        :return: The CSS text
+        :rtype: str
+        """
+        root = self._parse(source)
+        evaluator = Evaluator(root)
+        evaluator.prepare()
+        frame = evaluator.root_frame()
+        fingerprints = Fingerprints(root, source)
+
+        segments = {}
+        output = []
+        for index, stmt in enumerate(root.statements):
+            fingerprint = fingerprints.of(index, frame)
+            segment = self.segments.get(fingerprint) \
+                if fingerprint is not None else None
+            if segment is None:
+                segment = self._evaluate(evaluator, stmt, frame)
+                stats.incr('evaluated_statements')
+            else:
+                stats.incr('reused_statements')
+            if fingerprint is not None:
+                segments[fingerprint] = segment
+            output.append(segment)
+        self.segments = segments
+
+        if any(segment.has_extends for segment in output):
+            tree = Root()
+            for segment in output:
+                tree.statements.extend(segment.nodes)
+            rules = Normalizer(tree).normalize()
+            self.output = CSSEmitter(self.indent).emit(rules)
+            self.ranges = None
+            stats.incr('full_emits')
+            return self.output
+        self.output, self.ranges = splice(segment.css for segment in output)
+        return self.output
+
+    def _parse(self, source):
+        """ Parses the source, lexing only the chunks that weren't in the last
+        build """
+        root = Root()
+        chunks = {}
+        for line_num, text in iter_chunks(source):
+            cached = self.chunks.get(text)
+            if cached is None or text in chunks:
+                # a chunk that's repeated in the source gets its own tokens
+                tokens = lex_chunk(text, line_num, self.interner)
+                stats.incr('lexed_chunks')
+            else:
+                first_line, tokens = cached
+                if first_line != line_num:
+                    for token in tokens:
+                        token.line_num += line_num - first_line
+                stats.incr('reused_chunks')
+            chunks[text] = line_num, tokens
+            StylusParser(None, parent_node=root,
+                         lexer=TokenReplay(tokens, self.interner)).parse()
+        self.chunks = chunks
+        return root
+
+    def _evaluate(self, evaluator, stmt, frame):
+        block = Block(None)
+        evaluator.eval_statement(stmt, block, frame)
+        if has_extends(block):
+            # the extended rules may be in other statements
+            return Segment(share(block.statements), None, True)
+        rules = Normalizer(block).normalize()
+        return Segment(share(block.statements),
+                       CSSEmitter(self.indent).emit(rules), False)
+
+
+class Fingerprints(object):
+    """ Computes the fingerprints of the root statements of a tree """
+    def __init__(self, root, source):
+        """
+        :param Root root: The tree (after Evaluator.prepare)
+        :param unicode source: The source the tree was parsed from
+        """
+        super(Fingerprints, self).__init__()
+        self.level = root.symbols.level
+        statements = root.statements
+        self.effects = [root_effects(stmt, self.level) for stmt in statements]
+        self.hashes = source_hashes(statements, source)
+        self.names = dict((slot, name) for name, slot
+                          in root.symbols.slots.iteritems())
+        self.definers = {}
+        """ type: dict[int, int] The statement defining each root function,
+        by its slot """
+        for index, stmt in enumerate(statements):
+            for function in defined_functions(stmt):
+                if function.address[0] == self.level:
+                    self.definers[function.address[1]] = index
+
+    def of(self, index, frame):
+        """
+        :param int index: The index of a root statement
+        :param Frame frame: The root frame, before evaluating the statement
+        :return: The statement's fingerprint, or None if it always has to be
+            evaluated
+        :rtype: str
+        """
+        reads, writes, impure = self.effects[index]
+        if writes or impure:
+            return None
+        values = frame.values
+        keys = {}
+        pending = list(reads)
+        while pending:
+            slot = pending.pop()
+            if slot in keys:
+                continue
+            value = values[slot]
+            if isinstance(value, UserFunction):
+                definer = self.definers.get(slot)
+                if definer is None:
+                    return None
+                reads, _, impure = self.effects[definer]
+                if impure:
+                    return None
+                keys[slot] = 'function ' + self.hashes[definer]
+                pending.extend(reads)
+            else:
+                keys[slot] = repr(value)
+        # by name, since the slots move when variables are added
+        digest = hashlib.sha1(self.hashes[index])
+        for name, key in sorted((self.names[slot], key)
+                                for slot, key in keys.iteritems()):
+            digest.update('%s=%s;' % (name, key))
+        return digest.hexdigest()
+
+
+def lex_chunk(text, line_num, interner):
+    """
+    :param unicode text: A chunk of the source
+    :param int line_num: The line the chunk starts at
+    :param InternTable interner: The table to intern the tokens' values in
+    :return: The tokens of the chunk (without its EOF)
+    :rtype: list[Token]
+    """
+    lexer = StylusLexer(text, interner, profile='production')
+    lexer.line_num = line_num
+    tokens = []
+    token = lexer.next()
+    while not isinstance(token, EOFToken):
+        tokens.append(token)
+        token = lexer.next()
+    return tokens
+
+
+def has_extends(block):
+    """ Whether there are @extend directives in an evaluated block """
+    for stmt in block.statements:
+        if isinstance(stmt, Extend) or \
+                (isinstance(stmt, Block) and has_extends(stmt)):
+            return True
+    return False
+
+
+def source_hashes(statements, source):
+    """
+    Hashes the source lines of each statement: from its first line to the
+    first line of the next statement (which they might share), or to the
+    end of the source
+    :rtype: list[str]
+    """
+    lines = source.split('\n')
+    starts = [stmt.line_num for stmt in statements] + [len(lines)]
+    hashes = []
+    for start, end in zip(starts, starts[1:]):
+        text = '\n'.join(lines[start - 1:end])
+        hashes.append(hashlib.sha1(text.encode('utf-8')).hexdigest())
+    return hashes
+
+
+def splice(chunks):
+    """
+    Joins the CSS of the statements (like CSSEmitter.emit joins rules)
+    :return: The text, and the range of each chunk in it
+    :rtype: (str, list[(int, int)])
+    """
+    parts = []
+    ranges = []
+    offset = 0
+    for chunk in chunks:
+        if chunk and parts:
+            parts.append('\n')
+            offset += 1
+        ranges.append((offset, offset + len(chunk)))
+        if chunk:
+            parts.append(chunk)
+            offset += len(chunk)
+    return ''.join(parts), ranges
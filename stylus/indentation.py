@@ -0,0 +1,74 @@
+"""
+The indentation of the lines of a stylus source, measured up front.
+
+One scan over the (normalized) source finds every line break, along with the
+blank lines after it and the indentation of the next non-blank line. The
+lexer looks a line break up by its offset, and compares integer widths to
+decide between a NewLineToken, an IndentToken and OutdentTokens.
+
+The indentation of a sheet is either spaces or tabs (decided by its first
+indented line); lines that mix them, or use the other kind, are an error.
+"""
+import re
+from array import array
+
+__all__ = ['IndentTable', 'NONE', 'SPACES', 'TABS', 'MIXED']
+
+NONE = 0
+SPACES = 1
+TABS = 2
+MIXED = SPACES | TABS
+
+style_names = {SPACES: 'spaces', TABS: 'tabs'}
+
+line_break_pattern = re.compile(r'\n(?:[ \t]*\n)*([ \t]*)')
+""" A line break, the blank lines after it, and the indentation of the next
+line """
+
+
+class IndentTable(object):
+    def __init__(self, source):
+        """
+        :param unicode source: The normalized source (see StylusLexer)
+        """
+        super(IndentTable, self).__init__()
+        self.source = source
+        self.index = {}
+        """ type: dict[int, int] The row of each line break, by its offset """
+        self.lengths = array('l')
+        """ The length of each line break (with its blank lines and
+        indentation) """
+        self.widths = array('l')
+        """ The indentation width of each line """
+        self.styles = array('b')
+        """ The indentation style of each line (NONE, SPACES, TABS, MIXED) """
+        self.line_counts = array('l')
+        """ The number of line breaks in each row (with the blank lines) """
+        for match in line_break_pattern.finditer(source):
+            self._add(match)
+
+    def __len__(self):
+        return len(self.widths)
+
+    def row(self, offset):
+        """
+        :param int offset: The offset of a line break in the source
+        :return: The line break's row in the table
+        :rtype: int
+        """
+        row = self.index.get(offset)
+        if row is None:
+            # A line break inside of a row (after a token that ended with
+            # blank lines). Rare, so it's measured on demand
+            row = self._add(line_break_pattern.match(self.source, offset))
+        return row
+
+    def _add(self, match):
+        indent = match.group(1)
+        row = self.index[match.start()] = len(self.widths)
+        self.lengths.append(match.end() - match.start())
+        self.widths.append(len(indent))
+        self.styles.append((SPACES if ' ' in indent else NONE) |
+                           (TABS if '\t' in indent else NONE))
+        self.line_counts.append(match.group().count('\n'))
+        return row
@@ -0,0 +1,99 @@
+"""
+Counters of the compiler's caches and passes, for profiling and tuning.
+
+Components keep their counters in a named Stats group (get_stats('name')), or
+register a provider function that returns them when a report is made.
+"""
+import threading
+from collections import OrderedDict
+
+__all__ = ['Stats', 'get_stats', 'register_provider', 'report',
+           'format_report', 'reset']
+
+_stats = OrderedDict()
+_providers = OrderedDict()
+_lock = threading.Lock()
+""" Guards adding groups and counters (an OrderedDict is corrupted by
+concurrent insertions). Increments of existing counters aren't locked, so
+under threads the counts are approximate """
+
+
+class Stats(object):
+    """ A named group of counters """
+    def __init__(self, name):
+        super(Stats, self).__init__()
+        self.name = name
+        self.counters = OrderedDict()
+
+    def incr(self, counter, amount=1):
+        counters = self.counters
+        if counter in counters:
+            counters[counter] += amount
+        else:
+            with _lock:
+                counters[counter] = counters.get(counter, 0) + amount
+
+    def __getitem__(self, counter):
+        return self.counters.get(counter, 0)
+
+    def __setitem__(self, counter, value):
+        with _lock:
+            self.counters[counter] = value
+
+    def reset(self):
+        self.counters.clear()
+
+    def as_dict(self):
+        return dict(self.counters)
+
+    def __repr__(self):
+        return '<Stats %s %r>' % (self.name, self.as_dict())
+
+
+def get_stats(name):
+    """ Returns the Stats group with the given name (creating it if needed) """
+    stats = _stats.get(name)
+    if stats is None:
+        with _lock:
+            stats = _stats.get(name)
+            if stats is None:
+                stats = _stats[name] = Stats(name)
+    return stats
+
+
+def register_provider(name, provider):
+    """
+    Registers a function that returns a dict of counters for the report
+    :param str name: The name of the group in the report
+    :param ()->dict provider: The function
+    """
+    _providers[name] = provider
+
+
+def report():
+    """
+    :return: All the counters, by group name
+    :rtype: dict[str, dict[str, int|float]]
+    """
+    result = OrderedDict()
+    for name, stats in _stats.iteritems():
+        result[name] = stats.as_dict()
+    for name, provider in _providers.iteritems():
+        result.setdefault(name, {}).update(provider())
+    return result
+
+
+def format_report():
+    """ :return: The report as text, one counter per line """
+    lines = []
+    for name, counters in report().iteritems():
+        lines.append('%s:' % name)
+        for counter in sorted(counters):
+            lines.append('  %-24s %s' % (counter, counters[counter]))
+    return '\n'.join(lines)
+
+
+def reset():
+    """ Resets all the counter groups """
+    for stats in _stats.itervalues():
+        stats.reset()
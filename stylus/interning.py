@@ -0,0 +1,45 @@
+"""
+Interning of the names and strings of a compilation.
+
+The same identifiers, selector fragments and strings (color, $primary, .btn)
+appear thousands of times in a sheet. The lexer passes them through an
+InternTable, so all the tokens (and later the scope and selector dicts they
+become keys of) share a single copy of each. Equal interned strings are the
+same object, so dict lookups with them succeed on the identity check, before
+comparing any characters.
+
+Python's intern() only handles byte strings (and keeps them for the life of
+the process), so the table is a plain dict, owned by one compilation.
+"""
+import sys
+
+from . import instrumentation
+
+__all__ = ['InternTable']
+
+stats = instrumentation.get_stats('interning')
+
+
+class InternTable(object):
+    def __init__(self):
+        super(InternTable, self).__init__()
+        self.strings = {}
+
+    def __len__(self):
+        return len(self.strings)
+
+    def intern(self, string):
+        """
+        :param basestring string: A string
+        :return: The table's copy of the string (the string itself, the first
+            time it's seen)
+        """
+        interned = self.strings.get(string)
+        if interned is None:
+            interned = self.strings[string] = string
+            stats.incr('entries')
+        elif interned is not string:
+            # the duplicate will be freed
+            stats.incr('hits')
+            stats.incr('bytes_saved', sys.getsizeof(string))
+        return interned
@@ -1,13 +1,62 @@
 import re
+from collections import namedtuple
 
 from .tokens import *
-from utils import chunks
-from css_consts import units
-
-__all__ = ['StylusLexer']
+from ..ast.values.colors import parse_hex
+from ..exceptions import SyntaxError
+from .indentation import IndentTable, MIXED, style_names
+from .interning import InternTable
+from .selectors import selector_at
+from .units import registry as units
+
+__all__ = ['StylusLexer', 'LexerState', 'profiles']
+
+# The patterns of the rules, compiled once (rather than on first use, in the
+# re module's small cache, next to the application's own patterns)
+null_pattern = re.compile(r'(null)\b[ \t]*')
+keyword_pattern = re.compile(r'(return|if|else|unless|for|in)\b[ \t]*')
+urlchars_pattern = re.compile(r'[/:@.;?&=*!,<>#%0-9]+')
+literal_css_pattern = re.compile(r'@css[ \t]*\{')
+literal_css_end_pattern = re.compile(r'\s*}$')
+atrule_pattern = re.compile(r'@(?:-(\w+)-)?([\w-]+)[ \t]*')
+function_start_pattern = re.compile(r'(-*[_a-zA-Z$][-\w$]*)\(([ \t]*)')
+paren_pattern = re.compile(r'([()])([ \t]*)')
+# rrggbbaa(8), rrggbb(6), rgba(4), rgb(3), nn(2), n(1). Longest first
+color_pattern = re.compile(r'#(%s)(?![a-fA-F0-9])[ \t]*' % '|'.join(
+    '[a-fA-F0-9]{%d}' % length for length in (8, 6, 4, 3, 2, 1)))
+string_pattern = re.compile(r'''("[^"]*"|'[^']*')[ \t]*''')
+number_pattern = re.compile(r'(-?\d+\.\d+|-?\d+|-?\.\d+)(%s)?[ \t]*'
+                            % units.pattern)
+textual_operator_pattern = re.compile(r'(not|and|or|is a|is defined|'
+                                      r'isnt|is not|is)(?!-)\b([ \t]*)')
+operator_pattern = re.compile(r'(\.{1,3}|&&|\|\||[!<>=?:]=|\*\*|[-+*/%]=?|'
+                              r'[,=?:!~<>&\[\]])([ \t]*)')
+space_pattern = re.compile(r'[ \t]+')
+indent_pattern = re.compile(r'[ \t]*')
+
+# Normalization of the input
+trailing_space_pattern = re.compile(r'\s+$')
+carriage_return_pattern = re.compile(r'\r\n?')
+continuation_pattern = re.compile(r'\\ *\n')
+
+# Error recovery: strings and comments (skipped), braces, and line breaks
+# before unindented lines
+resync_pattern = re.compile(r'''
+    "(?:[^"\\\n]|\\.)*"|'(?:[^'\\\n]|\\.)*'
+    |//[^\n]*|/\*.*?(?:\*/|\Z)
+    |[{}]|\n(?=[^\s}])
+''', re.VERBOSE | re.DOTALL)
 
 Match = type(re.match('', ''))
 
+SKIPPED = object()
+""" Returned by the rules that skip input without making a token (comments in
+the production profile, line continuations), so the next token is lexed (and
+gets its own position) """
+
+interned_tokens = (IdentifierToken, SelectorToken, StringToken)
+""" Tokens whose values are interned (names, selector parts and strings) """
+
 operator_aliases = {
     'and': '&&',
     'or': '||',
@@ -18,6 +67,40 @@ operator_aliases = {
 }
 
 
+_all_rules = (
+    '_l_eof', '_l_null', '_l_statement_sep', '_l_keyword', '_l_urlchars',
+    '_l_comment', '_l_newline_and_indents', '_l_escaped_char', '_l_important',
+    '_l_literal_css', '_l_anon_func', '_l_atrule', '_l_function_start',
+    '_l_brace', '_l_paren', '_l_color', '_l_string_val', '_l_number',
+    '_l_textual_operator', '_l_bool', '_l_unicode', '_l_identifier',
+    '_l_operator', '_l_eol', '_l_space', '_l_selector',
+)
+
+_stylus_only_rules = ('_l_null', '_l_keyword', '_l_literal_css',
+                      '_l_anon_func', '_l_textual_operator', '_l_bool')
+
+profiles = {
+    # Every rule
+    'default': _all_rules,
+    # Comments are skipped while scanning, without making tokens of them
+    'production': tuple('_l_skipped_comment' if rule == '_l_comment' else rule
+                        for rule in _all_rules),
+    # Plain CSS (for .css imports): no stylus syntax or // comments
+    'css': tuple('_l_skipped_css_comment' if rule == '_l_comment' else rule
+                 for rule in _all_rules if rule not in _stylus_only_rules),
+}
+""" The rule chains of the lexer profiles, by name. Each chain is the
+StylusLexer methods to try (in order) for each token """
+
+
+LexerState = namedtuple('LexerState', [
+    'buf', 'line_num', 'column', 'indents', 'indentation_type', 'is_in_url',
+    'prev', 'stash', 'selector_line'])
+""" A position of a StylusLexer (see StylusLexer.snapshot). The remaining
+buffer is an immutable string, so it's shared rather than copied; the indent
+stack and the peeked tokens are only ever a few items deep """
+
+
 def lex(regex, token_func, with_spaces=False):
     """ Tries to match the regex from the beginning of the buffer.
     If it matches, consume all of it (via _skip()) and call token_func with the
@@ -28,11 +111,13 @@ def lex(regex, token_func, with_spaces=False):
     :param with_spaces: Whether to add [ \t]+ to the end of the regex
     :return: The token from token_func or None
     """
+    pattern = re.compile(regex + (r'[ \t]*' if with_spaces else ''))
+
     def lex_func(self):
         """
         :type self: StylusLexer
         """
-        match = self._match(regex, with_spaces=with_spaces)
+        match = self._match(pattern)
         if match:
             self._skip(match)
             return token_func(match)
@@ -40,21 +125,33 @@ def lex(regex, token_func, with_spaces=False):
 
 
 class StylusLexer(object):
-    def __init__(self, input_buffer):
+    def __init__(self, input_buffer, interner=None, profile='default'):
+        """
+        :param unicode input_buffer: The stylus source
+        :param InternTable interner: The table to intern names and strings in
+            (a new one by default)
+        :param str profile: The name of the rule set to lex with (see
+            profiles)
+        """
         super(StylusLexer, self).__init__()
+        self.interner = interner or InternTable()
+        self.profile = profile
+        self.rules = [getattr(self, name) for name in profiles[profile]]
+        """ The bound _l_* methods of the profile, in the order they're
+        tried """
         self.line_num = 1
         self.column = 1
 
         # Remove BOM
         if input_buffer.startswith(u'\ufeff'):
-            input_buffer = self.buf[1:]
+            input_buffer = input_buffer[1:]
 
         # Normalize EOF
-        input_buffer = re.sub(r'\s+$', '\n', input_buffer)
+        input_buffer = trailing_space_pattern.sub('\n', input_buffer)
         # Normalize line breaks
-        input_buffer = re.sub(r'\r\n?', '\n', input_buffer, flags=re.MULTILINE)
+        input_buffer = carriage_return_pattern.sub('\n', input_buffer)
         # Backslash at line end means to continue at the next line
-        input_buffer = re.sub(r'\\ *\n', '\r', input_buffer, flags=re.MULTILINE)
+        input_buffer = continuation_pattern.sub('\r', input_buffer)
 
         self.stash = []  # where we store peeked tokens
         self.indents = []
@@ -63,11 +160,16 @@ class StylusLexer(object):
 
         # state
         self.is_in_url = False
+        self.selector_line = None
+        """ type: (int, int, int) The start and end of the line of the last
+        selector, and where selector_at() can resume scanning on it (see
+        _l_selector) """
 
         # TODO: integrate this after understanding why it's here
         # .replace(/([,(:](?!\/\/[^ ])) *(?:\/\/[^\n]*)?\n\s*/g, comment)
         # .replace(/\s*\n[ \t]*([,)])/g, comment);
         self.buf = self.original_buffer = input_buffer
+        self.indent_table = IndentTable(input_buffer)
 
     def _skip(self, amount):
         """
@@ -107,14 +209,82 @@ class StylusLexer(object):
         self.prev = token
         return token
 
+    def peeked(self):
+        """ :return: The next token if it was lexed already, or None """
+        return self.stash[0] if self.stash else None
+
+    @property
+    def offset(self):
+        """ The position of the lexer in the (normalized) source """
+        return len(self.original_buffer) - len(self.buf)
+
+    def resync(self, offset):
+        """
+        Restarts lexing at the first top-level position after the offset: the
+        start of the next unindented line, or the end of the braces block that
+        starts after the offset (for recovering from errors in the statement
+        at the offset)
+        :param int offset: A position in the (normalized) source
+        """
+        source = self.original_buffer
+        pos = len(source)
+        depth = 0
+        for match in resync_pattern.finditer(source, offset):
+            token = match.group()
+            if token == '{':
+                depth += 1
+            elif token == '}':
+                depth -= 1
+                if depth <= 0:
+                    pos = match.end()
+                    break
+            elif token == '\n':
+                pos = match.end()
+                break
+        self.buf = source[pos:]
+        self.line_num = source.count('\n', 0, pos) + 1
+        self.column = pos - source.rfind('\n', 0, pos)
+        self.indents = []
+        self.is_in_url = False
+        self.selector_line = None
+        self.prev = None
+        self.stash = []
+
+    def snapshot(self):
+        """
+        Captures the lexer's position, so it can be rolled back to it (for
+        speculative parsing)
+        :rtype: LexerState
+        """
+        return LexerState(self.buf, self.line_num, self.column,
+                          tuple(self.indents), self.indentation_type,
+                          self.is_in_url, self.prev, tuple(self.stash),
+                          self.selector_line)
+
+    def restore(self, state):
+        """
+        Rolls the lexer back to a position captured by snapshot(). Tokens
+        lexed after the snapshot will be lexed again
+        :param LexerState state: The position
+        """
+        self.buf = state.buf
+        self.line_num = state.line_num
+        self.column = state.column
+        self.indents = list(state.indents)
+        self.indentation_type = state.indentation_type
+        self.is_in_url = state.is_in_url
+        self.prev = state.prev
+        self.stash = list(state.stash)
+        self.selector_line = state.selector_line
+
     def __repr__(self):
-        orig_buf = self.buf
+        state = self.snapshot()
         tokens = []
         token = self.next()
         while not isinstance(token, EOFToken):
             tokens.append(token)
             token = self.next()
-        self.buf = orig_buf
+        self.restore(state)
         return repr(tokens)
 
     def push_token(self, token):
@@ -125,19 +295,15 @@ class StylusLexer(object):
         """
         self.stash.insert(0, token)
 
-    def _match(self, pattern, flags=0, with_spaces=False):
+    def _match(self, pattern):
         """
         Performs a match from the start of the buffer
-        :param str pattern: The pattern to match
-        :param int flags: Flags to use while matching
-        :param bool with_spaces: Whether to capture optional spaces and tabs
-            at the end of the match
+        :param pattern: The compiled pattern to match (see the patterns at the
+            top of the module)
         :return: The Match object if found. None otherwise
         :rtype: Match
         """
-        if with_spaces:
-            pattern += r'[ \t]*'
-        return re.match(pattern, self.buf, flags)
+        return pattern.match(self.buf)
 
     def _lex_next(self):
         """
@@ -145,38 +311,18 @@ class StylusLexer(object):
         :return: The next token (EOF is used for the end of the buffer)
         :rtype: Token
         """
-        line_num = self.line_num
-        col = self.column
-        token = (
-            self._l_eof()
-            or self._l_null()
-            or self._l_statement_sep()
-            or self._l_keyword()
-            or self._l_urlchars()
-            or self._l_comment()
-            or self._l_newline_and_indents()
-            or self._l_escaped_char()
-            or self._l_important()
-            or self._l_literal_css()
-            or self._l_anon_func()
-            or self._l_atrule()
-            or self._l_function_start()
-            or self._l_brace()
-            or self._l_paren()
-            or self._l_color()
-            or self._l_string_val()
-            or self._l_number()
-            or self._l_textual_operator()
-            or self._l_bool()
-            or self._l_unicode()
-            or self._l_identifier()
-            or self._l_operator()
-            or self._l_eol()
-            or self._l_space()
-            or self._l_selector()
-        )
+        token = SKIPPED
+        while token is SKIPPED:
+            line_num = self.line_num
+            col = self.column
+            for rule in self.rules:
+                token = rule()
+                if token:
+                    break
         token.line_num = line_num
         token.column = col
+        if isinstance(token, interned_tokens):
+            token.val = self.interner.intern(token.val)
         return token
 
     def _l_eof(self):
@@ -192,7 +338,7 @@ class StylusLexer(object):
 
     def _l_null(self):
         """ Try to match null tokens """
-        match = self._match(r'(null)\b', with_spaces=True)
+        match = self._match(null_pattern)
         if match:
             self._skip(match)
             # TODO: implement this once I figure out how is_in_selector
@@ -206,8 +352,7 @@ class StylusLexer(object):
 
     def _l_keyword(self):
         """ Try to match the keywords: if, else, unless, return, for, in """
-        match = self._match(r'(return|if|else|unless|for|in)\b',
-                            with_spaces=True)
+        match = self._match(keyword_pattern)
         if match:
             self._skip(match)
             # TODO: implement this once I figure out how is_in_selector
@@ -220,10 +365,10 @@ class StylusLexer(object):
         """ Try to match misc chars inside of url() parens """
         if not self.is_in_url:
             return
-        match = self._match(r'[/:@.;?&=*!,<>#%0-9]+')
+        match = self._match(urlchars_pattern)
         if match:
             self._skip(match)
-            return LiteralToken(match.string.group())
+            return LiteralToken(match.group())
 
     def _l_comment(self):
         """ Try to match a CSS multi-line comment or stylus' single-line
@@ -231,6 +376,27 @@ class StylusLexer(object):
         """
         return self._l_stylus_comment() or self._l_css_comment()
 
+    def _l_skipped_comment(self):
+        """ Skip a stylus or a CSS comment (without making a token of it) """
+        if self.buf.startswith('//'):
+            comment_end = self.buf.find('\n')
+            if comment_end == -1:
+                comment_end = len(self.buf)
+        elif self.buf.startswith('/*'):
+            comment_end = self.buf.find('*/') + 2  # len of '*/'
+            if comment_end == 1:  # not found + len of '*/'
+                comment_end = len(self.buf)
+            self.line_num += self.buf.count('\n', 0, comment_end)
+        else:
+            return
+        self._skip(comment_end)
+        return SKIPPED
+
+    def _l_skipped_css_comment(self):
+        """ Skip a CSS comment (without making a token of it) """
+        if self.buf.startswith('/*'):
+            return self._l_skipped_comment()
+
     def _l_stylus_comment(self):
         """ Try to match stylus' single-line comment.
         It's ignored by the parser/lexer
@@ -240,7 +406,7 @@ class StylusLexer(object):
             if comment_end == -1:
                 comment_end = len(self.buf)
             self._skip(comment_end)
-            return self._lex_next()
+            return SKIPPED
 
     def _l_css_comment(self):
         """ Try to match a CSS multi-line comment """
@@ -265,42 +431,46 @@ class StylusLexer(object):
 
     def _l_newline_and_indents(self):
         """ Tries to match a new line and a subsequent indent or outdent """
-        match = self._match(r'\n([\t ]*)')
-        if match:
-            self._skip(match)
-            indent = match.group(1)
-
-            # blank line
-            if self.buf.startswith('\n'):
-                return self._lex_next()
-
-            # Outdent
-            prev_indent = self.indents[-1] if self.indents else ''
-            if self.indents and self.indents[-1].startswith(indent):
-                # NOTE: the JS version only checks the length of the indent
-                # NOTE: ('  ' == '\t '). we compare the indentation exactly.
-                # NOTE: Now let's see if we pass the tests...
-                print 'outing! new indent is %r' % indent
-                while self.indents and self.indents[-1].startswith(indent) \
-                        and self.indents[-1] != indent:
-                    self.stash.append(OutdentToken())
-                    self.indents.pop()
-                return self.stash.pop()
-            # Indent
-            elif indent and (not prev_indent or indent.startswith(prev_indent)):
-                self.indents.append(indent)
-                return IndentToken()
-            # New line
-            elif indent == prev_indent:
-                return NewLineToken()
-            # Indentation doesn't match with previous one (neither starts
-            # with the other)
-            else:
-                indent = indent.replace(' ', '<space>').replace('\t', '<tab>')
-                prev_indent = self.indents[-1].replace(' ', '<space>')\
-                                              .replace('\t', '<tab>')
-                raise SyntaxError("Invalid indentation. %r doesn't match with "
-                                  "previous indent: %r" % (indent, prev_indent))
+        if not self.buf.startswith('\n'):
+            return None
+        table = self.indent_table
+        row = table.row(len(self.original_buffer) - len(self.buf))
+        width = table.widths[row]
+        style = table.styles[row]
+        self.line_num += table.line_counts[row]
+        self.column = width + 1
+        self.buf = self.buf[table.lengths[row]:]
+        if style:
+            if style != self.indentation_type:
+                if self.indentation_type is None and style != MIXED:
+                    self.indentation_type = style
+                else:
+                    raise SyntaxError(self._indentation_error(style))
+
+        prev_width = self.indents[-1] if self.indents else 0
+        # New line
+        if width == prev_width:
+            return NewLineToken()
+        # Indent
+        elif width > prev_width:
+            self.indents.append(width)
+            return IndentToken()
+        # Outdent
+        else:
+            while self.indents and self.indents[-1] > width:
+                self.stash.append(OutdentToken())
+                self.indents.pop()
+            return self.stash.pop()
+
+    def _indentation_error(self, style):
+        """ :return: The message for a line indented with the wrong style """
+        if style == MIXED:
+            problem = 'mixed tabs and spaces'
+        else:
+            problem = 'indented with %s, but the sheet is indented with %s' \
+                      % (style_names[style],
+                         style_names[self.indentation_type])
+        return 'Invalid indentation on line %d: %s' % (self.line_num, problem)
 
     _l_escaped_char = lex(r'\\(.)', lambda m: IdentifierToken(m.group(1)),
                           with_spaces=True)
@@ -314,7 +484,7 @@ class StylusLexer(object):
         """ Try to match a literal CSS block @css { (...) }
         Try to find it's end when the braces close
         """
-        match = self._match(r'@css[ \t]*\{')
+        match = self._match(literal_css_pattern)
         if match:
             self._skip(match)
             braces = 1
@@ -328,7 +498,7 @@ class StylusLexer(object):
                 elif c == '\n':
                     self.line_num += 1
                 css_buf += c
-            css_buf = re.sub(r'\s*}$', '', css_buf)
+            css_buf = literal_css_end_pattern.sub('', css_buf)
             return LiteralCSSToken(css_buf)
 
     _l_anon_func = lex('@\(', lambda m: AnonymousFunctionToken())
@@ -336,8 +506,9 @@ class StylusLexer(object):
 
     def _l_atrule(self):
         """ Try to match keywords starting with an at sign (@) """
-        match = self._match(r'@(?:-(\w+)-)?([\w-]+)', with_spaces=True)
+        match = self._match(atrule_pattern)
         if match:
+            self._skip(match)
             vendor_prefix = match.group(1)
             rule = match.group(2)
             if rule in ('require', 'import', 'charset', 'namespace', 'media',
@@ -356,7 +527,7 @@ class StylusLexer(object):
 
     def _l_function_start(self):
         """ Try to match a function name (ending with an opening paren) """
-        match = self._match(r'(-*[_a-zA-Z$][-\w$]*)\(([ \t]*)')
+        match = self._match(function_start_pattern)
         if match:
             self._skip(match)
             func_name = match.group(1)
@@ -369,13 +540,13 @@ class StylusLexer(object):
 
     def _l_paren(self):
         """ Try to match opening or closing parens '(' or ')' """
-        match = self._match(r'([()])', with_spaces=True)
+        match = self._match(paren_pattern)
         if match:
             self._skip(match)
             is_closing = match.group(1) == ')'
             if is_closing:
                 self.is_in_url = False
-            return ParenToken(not is_closing)
+            return ParenToken(not is_closing, match.group(2))
 
     def _l_color(self):
         """
@@ -384,31 +555,14 @@ class StylusLexer(object):
         """
         if not self.buf.startswith('#'):
             return
-
-        # n(1), nn(2), rgb(3), rgba(4), rrggbb(6), rrggbbaa(8)
-        choices = ['[a-fA-F0-9]{%d}' % length for length in (1, 2, 3, 4, 6, 8)]
-        match = self._match('#(%s)' % ('|'.join(choices)), with_spaces=True)
+        match = self._match(color_pattern)
         if match:
             self._skip(match)
-            hex_num = match.group(1)
-            if len(hex_num) in (2, 6, 8):
-                parts = map(''.join, chunks(hex_num, 2))  # divide to parts
-            else:
-                parts = map(lambda c: c * 2, hex_num)  # double each char
-            values = tuple(map(lambda c: int(c, 16), parts))  # unhex
-
-            a = 255
-            if len(values) == 1:
-                r, g, b = values[0] * 3
-            elif len(values) == 3:
-                r, g, b = values
-            else:
-                r, g, b, a = values
-            return ColorToken(r, g, b, a / 255.0)
+            return ColorToken(parse_hex(match.group(1)), raw=match.group())
 
     def _l_string_val(self):
         """  Try to match a string, starting and ending with quote marks """
-        match = self._match(r'''("[^"]*"|'[^']*')''', with_spaces=True)
+        match = self._match(string_pattern)
         if match:
             self._skip(match)
             val = match.group(1)[1:-1].replace('\\n', '\n')
@@ -417,19 +571,18 @@ class StylusLexer(object):
 
     def _l_number(self):
         """ Try to match a number with an optional unit """
-        match = self._match(r'^(-?\d+\.\d+|-?\d+|-?\.\d+)(%s)?[ \t]*'
-                            % '|'.join(units))
+        match = self._match(number_pattern)
         if match:
             self._skip(match)
             raw = match.group()
-            return NumberToken(float(match.group(1)), raw, match.group(2))
+            return NumberToken(float(match.group(1)), raw,
+                               units.get(match.group(2)))
 
     def _l_textual_operator(self):
         """ Try to match the operators: not, and, or, is, is not, isnt,
         is a, is defined
         """
-        match = self._match(r'(not|and|or|is a|is defined|'
-                            r'isnt|is not|is)(?!-)\b([ \t]*)')
+        match = self._match(textual_operator_pattern)
         if match:
             self._skip(match)
             # if self.is_in_selector:
@@ -455,8 +608,7 @@ class StylusLexer(object):
         **, !, &, &&, ||, >, >=, <, <=, =, ==, !=, !, ~, ?=, :=, ?, :, [, ], .,
         .., ...,
         """
-        match = self._match(r'(\.{1,3}|&&|\|\||[!<>=?:]=|\*\*|[-+*/%]=?|'
-                            r'[,=?:!~<>&\[\]])([ \t]*)')
+        match = self._match(operator_pattern)
         if match:
             self._skip(match)
             self.is_in_url = False
@@ -472,18 +624,35 @@ class StylusLexer(object):
         if self.buf[0] == '\r':
             self._skip(1)
             self.line_num += 1
-            return self._lex_next()
+            return SKIPPED
 
     def _l_space(self):
         """ Try to match a space """
-        match = self._match('', with_spaces=True)
+        match = self._match(space_pattern)
         if match:
             self._skip(match)
             return SpaceToken()
 
-    _l_selector = lex(r'.*?(?=//(?![^\[]*\])|[,\n{])',
-                      lambda m: SelectorToken(m.group()))
-    """ Anything that afterwards has a comma, a line break, an opening brace
-    or a single-line comment (//) (we also check that the // sign is not inside
-    of an attribute selector like "a[href=//]")
-    """
+    def _l_selector(self):
+        """ Anything up to a comma, a line break, an opening brace or a
+        single-line comment (//), outside of attribute selectors (a[href=//])
+        and pseudo-class arguments (:not(.a, .b)). The selector is scanned
+        from the start of its line, since this is often in the middle of an
+        attribute (see selectors.selector_at). The next selector on the same
+        line is scanned from the start of this one, so a long selector list
+        is scanned in linear time
+        """
+        source = self.original_buffer
+        pos = self.offset
+        line = self.selector_line
+        if line is None or not line[0] <= pos <= line[1] or line[2] > pos:
+            line_start = source.rfind('\n', 0, pos) + 1
+            line_end = source.find('\n', pos)
+            # the selector's first components were lexed by the other rules
+            line = (line_start, line_end if line_end >= 0 else len(source),
+                    indent_pattern.match(source, line_start).end())
+        selector, end, start = selector_at(source, pos, line[2])
+        self.selector_line = line[0], line[1], start
+        if end > pos:
+            self._skip(end - pos)
+            return SelectorToken(source[pos:end], selector)
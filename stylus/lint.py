@@ -0,0 +1,52 @@
+"""
+Checks stylus files for syntax errors. Each file is parsed once, recovering
+from the errors in its root statements (see StylusParser's recover mode), so
+all the errors of a file are reported by one run.
+
+Usage: python -m <package>.stylus.lint FILE...
+"""
+import codecs
+import sys
+
+from .parser import StylusParser
+
+__all__ = ['lint', 'lint_files']
+
+
+def lint(source):
+    """
+    :param unicode source: The stylus source
+    :return: The errors in the source
+    :rtype: list[Diagnostic]
+    """
+    # function bodies are parsed too, so their errors are found
+    parser = StylusParser(source, lazy_bodies=False, profile='production',
+                          recover=True)
+    parser.parse()
+    return parser.errors
+
+
+def lint_files(paths):
+    """
+    :param list[str] paths: The paths of the stylus files
+    :return: The errors of the files, with the path of each one's file
+    :rtype: collections.Iterable[(str, Diagnostic)]
+    """
+    for path in paths:
+        with codecs.open(path, encoding='utf-8') as source_file:
+            source = source_file.read()
+        for diagnostic in lint(source):
+            yield path, diagnostic
+
+
+def main(paths):
+    count = 0
+    for path, diagnostic in lint_files(paths):
+        print '%s:%d:%d: %s' % (path, diagnostic.line_num, diagnostic.column,
+                                diagnostic.error)
+        count += 1
+    return 1 if count else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
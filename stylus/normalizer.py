@@ -0,0 +1,135 @@
+"""
+Flattens the nested selector blocks of an AST into a list of rules with full
+selectors, and applies the @extend directives to them (like normalizer.js)
+"""
+from ..ast import Block, SelectorBlock, Extend
+from ..exceptions import CompileError
+from .extend import ExtendIndex, is_placeholder
+from .selectors import as_selector
+
+__all__ = ['Rule', 'Normalizer', 'nest_selectors']
+
+
+class Rule(object):
+    """ A flattened selector block: its full selectors and its statements """
+    is_shared = False
+    """ Whether the statements come from a shared (frozen) block, so they're
+    the same nodes in every compile that shares it (see CSSEmitter) """
+
+    def __init__(self, local_selectors, parent=None):
+        """
+        :param list[Selector] local_selectors: The selectors as written in the
+            block
+        :param Rule|None parent: The rule of the enclosing selector block
+        """
+        super(Rule, self).__init__()
+        self.local_selectors = map(as_selector, local_selectors)
+        self.parent = parent
+        self.selectors = nest_selectors(parent.selectors if parent else None,
+                                        self.local_selectors)
+        self.statements = []
+
+    def __repr__(self):
+        return '<Rule %s (%d statements)>' % (', '.join(self.selectors),
+                                              len(self.statements))
+
+
+class Normalizer(object):
+    def __init__(self, root):
+        """
+        :param Block root: The (evaluated) tree to normalize
+        """
+        super(Normalizer, self).__init__()
+        self.root = root
+        self.extends = ExtendIndex()
+
+    def normalize(self):
+        """
+        :return: The rules that should be emitted, in document order
+        :rtype: list[Rule]
+        """
+        found = set()
+        rules = self.extend_rules(self.collect(self.root), found)
+        self.extends.check_found(found)
+        return rules
+
+    def collect(self, block):
+        """
+        Flattens the selector blocks in block into rules, and indexes their
+        @extend directives. The rules are final once all the directives are
+        indexed and extend_rules() ran on them (the root can be collected a
+        statement at a time, see bounded.py)
+        :rtype: list[Rule]
+        """
+        rules = []
+        self._collect(block, None, rules)
+        return rules
+
+    def _collect(self, block, parent, rules):
+        """
+        Flattens the selector blocks in block into rules (parents before their
+        children), and indexes the @extend directives on the way
+        """
+        for stmt in block.statements:
+            if isinstance(stmt, SelectorBlock):
+                rule = Rule(stmt.selectors, parent)
+                rule.is_shared = stmt.is_shared
+                rules.append(rule)
+                self._collect(stmt, rule, rules)
+            elif isinstance(stmt, Extend):
+                if parent is None:
+                    raise CompileError(
+                        'Cannot @extend "%s" outside of a selector block%s'
+                        % (', '.join(stmt.selectors),
+                           '' if stmt.line_num is None
+                           else ' on line %d' % stmt.line_num))
+                self.extends.add(stmt.selectors, parent.selectors,
+                                 optional=stmt.optional)
+            elif isinstance(stmt, Block):
+                self._collect(stmt, parent, rules)
+            elif parent is not None:
+                parent.statements.append(stmt)
+
+    def extend_rules(self, rules, found):
+        """
+        Adds the extending selectors to every rule in one pass. Parents come
+        before their children, so nested rules inherit the extended selectors
+        of their parents. Placeholder selectors are dropped from the output.
+        :param list[Rule] rules: Collected rules (with their parents)
+        :param set found: The extended selectors are added to it (for
+            ExtendIndex.check_found)
+        :return: The rules to emit
+        :rtype: list[Rule]
+        """
+        output = []
+        extends = self.extends
+        for rule in rules:
+            if rule.parent is not None:
+                rule.selectors = nest_selectors(rule.parent.selectors,
+                                                rule.local_selectors)
+            if extends:
+                rule.selectors = extends.extend(rule.selectors, found)
+            if rule.statements:
+                visible = [s for s in rule.selectors if not is_placeholder(s)]
+                if visible:
+                    emitted = Rule(rule.local_selectors)
+                    emitted.selectors = visible
+                    emitted.statements = rule.statements
+                    emitted.is_shared = rule.is_shared
+                    output.append(emitted)
+        return output
+
+
+def nest_selectors(parents, selectors):
+    """
+    Resolves the selectors of a nested block against its parent's selectors.
+    '&' is replaced by the parent selector, otherwise the parent is prepended
+    :param list[Selector]|None parents: The full selectors of the parent block
+    :param list[Selector] selectors: The selectors of the nested block
+    :rtype: list[Selector]
+    """
+    if not parents:
+        return list(selectors)
+    selectors = map(as_selector, selectors)
+    return [selector.nest(parent) for parent in map(as_selector, parents)
+            for selector in selectors]
@@ -1,17 +1,41 @@
+from collections import namedtuple
 from contextlib import contextmanager
-from ast import Root, FunctionCall, Expression, Conditional, LoopBlock, Block
-from ..exceptions import ParseError
+from functools import partial
+from ..ast import Root, FunctionCall, Expression, Conditional, LoopBlock, \
+    Block, SelectorBlock, Extend, Identifier, Literal, ExpressionList, \
+    BinaryOperation, UnaryOperation, Ternary, Property, Return, Function, \
+    LazyBlock
+from ..ast.values import Number, String, Ident
+from ..exceptions import ParseError, SyntaxError
 from .lexer import StylusLexer
-from stylus.tokens import *
+from .selectors import parse_selector
+from .tokens import *
+
+Diagnostic = namedtuple('Diagnostic', ['line_num', 'column', 'error'])
+""" An error the parser recovered from (its message is formatted when
+str(error) is called) """
 
 
 class StylusParser(object):
-    def __init__(self, input_str, parent_node=None):
+    def __init__(self, input_str, parent_node=None, lazy_bodies=True,
+                 lexer=None, profile='default', recover=False):
         """
         :type parent_node: ast.Block
+        :param bool lazy_bodies: Whether to keep the (indented) bodies of
+            functions as tokens, and parse them only when they're used (see
+            ast.LazyBlock)
+        :param lexer: The lexer to read the tokens from (instead of lexing
+            input_str)
+        :param str profile: The lexer profile (see lexer.profiles)
+        :param bool recover: Whether to recover from errors in root
+            statements: the error is recorded in `errors`, the statement is
+            dropped, and parsing goes on from the next unindented line or
+            closing brace (see StylusLexer.resync)
         """
         super(StylusParser, self).__init__()
-        self.lexer = StylusLexer(input_str)
+        self.lexer = lexer or StylusLexer(input_str, profile=profile)
+        self.interner = getattr(self.lexer, 'interner', None)
+        self.lazy_bodies = lazy_bodies
         self.states = []
         self.tok_stash = []  # some states change the tokens because of
         self.parent_node = parent_node or Root()
@@ -19,6 +43,9 @@ class StylusParser(object):
         self.accept = TokenMatcher(self, False)
         self.expect = TokenMatcher(self, True)
         self.matches = TokenMatcher(self, False, consumes=False)
+        self.recover = recover
+        self.errors = []
+        """ type: list[Diagnostic] """
         # context
 
     def peek(self):
@@ -32,6 +59,44 @@ class StylusParser(object):
     def next(self):
         return self.tok_stash.pop(0) if self.tok_stash else self.lexer.next()
 
+    def peeked(self):
+        """ :return: The next token if it was lexed already, or None """
+        return self.tok_stash[0] if self.tok_stash else self.lexer.peeked()
+
+    def snapshot(self):
+        """
+        Captures the parser's position in the tokens (and its state stack)
+        :return: An opaque value for restore()
+        """
+        return self.lexer.snapshot(), tuple(self.tok_stash), len(self.states)
+
+    def restore(self, snapshot):
+        """
+        Rolls back to a position captured by snapshot(). Nodes made since
+        then are not removed from the tree, so only use it with productions
+        that return their nodes rather than adding them
+        """
+        lexer_state, tok_stash, depth = snapshot
+        self.lexer.restore(lexer_state)
+        self.tok_stash = list(tok_stash)
+        del self.states[depth:]
+
+    def attempt(self, production, *args):
+        """
+        Tries to match a production, and rolls back if it doesn't match
+        :param production: A parsing method
+        :return: What the production returned, or None if it raised a
+            ParseError (or returned None)
+        """
+        snapshot = self.snapshot()
+        try:
+            result = production(*args)
+        except ParseError:
+            result = None
+        if result is None:
+            self.restore(snapshot)
+        return result
+
     @contextmanager
     def push_state(self, state):
         self.states.append(state)
@@ -48,15 +113,14 @@ class StylusParser(object):
         with the block
         :param Block block: The block to push
         """
-        grandparent = self.current_block
-        grandparent.statements.push(block)
+        grandparent = self.parent_node
         self.parent_node = block
         yield
         self.parent_node = grandparent
 
     def skip_tokens(self, token_type_or_types, token_matcher=None):
         while self.accept(token_type_or_types, token_matcher) is not None:
-            self.next()
+            pass
 
     def skip_whitespaces(self):
         self.skip_tokens((SpaceToken, IndentToken, OutdentToken, NewLineToken))
@@ -70,16 +134,48 @@ class StylusParser(object):
     def parse(self):
         block = self.parent_node
         with self.push_state('root'):
-            self.skip_whitespaces()
-            while not isinstance(self.peek(), EOFToken):
-                stmt = self._p_statement()
-                if not stmt:
-                    raise ParseError(self, 'Unexpected token {peek}, '
-                                           'not allowed at root level')
-                self.accept(SemicolonToken)
-                block.statements.append(stmt)
+            depth = len(self.states)
+            while True:
+                offset = None
+                try:
+                    self.skip_whitespaces()
+                    token = self.peek()
+                    if isinstance(token, EOFToken):
+                        break
+                    if self.recover:
+                        offset = self.lexer.offset
+                    stmt = self._p_statement()
+                    if not stmt:
+                        raise ParseError(self, 'Unexpected token {peek}, '
+                                               'not allowed at root level')
+                    self.accept(SemicolonToken)
+                    stmt.line_num = token.line_num
+                    block.statements.append(stmt)
+                except (ParseError, SyntaxError) as error:
+                    if not self.recover:
+                        raise
+                    self._recover(error, block, depth, offset)
         return block
 
+    def _recover(self, error, block, depth, offset):
+        """
+        Records an error in a root statement, and skips to where the next
+        statement can start
+        :param int depth: The depth of the state stack at the root
+        :param int offset: The position of the lexer after the first token of
+            the statement (None if the error came before it)
+        """
+        self.errors.append(Diagnostic(
+            getattr(error, 'line_num', self.lexer.line_num),
+            getattr(error, 'column', self.lexer.column), error))
+        if offset is None or isinstance(error, SyntaxError):
+            # a bad line break: the lexer is past it
+            offset = self.lexer.offset
+        del self.states[depth:]
+        self.tok_stash = []
+        self.parent_node = self.current_block = block
+        self.lexer.resync(offset)
+
     def _p_statement(self):
         """
         Matches a statement (as in _p_inner_stmt) with an optional postfix
@@ -156,7 +252,164 @@ class StylusParser(object):
         raise ParseError(self, 'Unexpected {peek}')
 
     def _p_expression(self):
-        raise NotImplementedError()
+        """ Matches a comma separated list of space separated expressions """
+        first = self._p_space_list()
+        if first is None:
+            return None
+        items = [first]
+        while self.accept.operators(','):
+            self.skip_spaces()
+            item = self._p_space_list()
+            if item is None:
+                raise ParseError(self, 'Expected an expression after a comma, '
+                                       'but got {peek}')
+            items.append(item)
+        return items[0] if len(items) == 1 else ExpressionList(items, ',')
+
+    def _p_space_list(self):
+        """ Matches expressions separated by spaces (1px solid red) """
+        items = []
+        while True:
+            self.skip_spaces()
+            if not self._starts_expression():
+                break
+            items.append(self._p_ternary())
+        if not items:
+            return None
+        return items[0] if len(items) == 1 else ExpressionList(items, ' ')
+
+    def _starts_expression(self):
+        token = self.peek()
+        if isinstance(token, OperatorToken):
+            return token.val in unary_operators
+        if isinstance(token, ParenToken):
+            return token.is_opening
+        return isinstance(token, expression_start_tokens)
+
+    def _p_ternary(self):
+        """ Matches cond ? true_expr : false_expr (or just a binary op) """
+        condition = self._p_binary(0)
+        self.skip_spaces()
+        if not self.accept.operators('?'):
+            return condition
+        self.skip_spaces()
+        true_expr = self._p_ternary()
+        self.skip_spaces()
+        self.expect.operators(':')
+        self.skip_spaces()
+        return Ternary(condition, true_expr, self._p_ternary())
+
+    def _p_binary(self, min_precedence):
+        """ Matches binary operations with at least min_precedence """
+        left = self._p_unary()
+        while True:
+            self.skip_spaces()
+            token = self.peek()
+            if not isinstance(token, OperatorToken):
+                return left
+            precedence = binary_precedence.get(token.val)
+            if precedence is None or precedence < min_precedence:
+                return left
+            op = self.next().val
+            self.skip_spaces()
+            # '**' is right associative, the rest are left associative
+            right = self._p_binary(precedence if op == '**'
+                                   else precedence + 1)
+            if right is None:
+                raise ParseError(self, 'Expected an expression after "%s", '
+                                       'but got {peek}' % op)
+            if op == '/' and self.states[-1] == 'property':
+                # font: 12px/1.5 - a slash in a property value is literal,
+                # unless it's in parens
+                left = ExpressionList([left, Literal(Ident('/')), right], '')
+            else:
+                left = BinaryOperation(op, left, right)
+
+    def _p_unary(self):
+        """ Matches a unary operation (-x, !x, not x) or a primary """
+        if self.matches.operators(*unary_operators):
+            op = self.next().val
+            self.skip_spaces()
+            operand = self._p_unary()
+            if operand is None:
+                raise ParseError(self, 'Expected an expression after "%s", '
+                                       'but got {peek}' % op)
+            return UnaryOperation('!' if op == 'not' else op, operand)
+        return self._p_primary()
+
+    def _p_primary(self):
+        """ Matches a literal, an identifier, a call or a parenthesized
+        expression
+        """
+        token = self.peek()
+        if isinstance(token, NumberToken):
+            self.next()
+            return Literal(Number(token.val, token.unit))
+        if isinstance(token, ColorToken):
+            self.next()
+            return Literal(token.val)
+        if isinstance(token, StringToken):
+            self.next()
+            return Literal(String(token.val, token.quote))
+        if isinstance(token, BooleanValueToken):
+            self.next()
+            return Literal(token.val)
+        if isinstance(token, NullToken):
+            self.next()
+            return Literal(None)
+        if isinstance(token, LiteralToken):
+            self.next()
+            return Literal(Ident(token.val))
+        if isinstance(token, FunctionToken):
+            if token.val == 'url':
+                return self._p_url()
+            return self._p_function_call()
+        if isinstance(token, IdentifierToken):
+            self.next()
+            if token.val == '!important':
+                return Literal(Ident(token.val))
+            return Identifier(token.val)
+        if self.accept(ParenToken, _is_opening_paren):
+            with self.push_state('paren'):
+                self.skip_spaces()
+                expr = self._p_expression()
+                self.skip_spaces()
+                self.expect(ParenToken, _is_closing_paren)
+            return expr
+        return None
+
+    def _p_function_call(self):
+        """ Matches name(arg, arg...) """
+        name = self.expect(FunctionToken).val
+        args = []
+        with self.push_state('paren'):
+            self.skip_spaces()
+            if not self.accept(ParenToken, _is_closing_paren):
+                while True:
+                    arg = self._p_space_list()
+                    if arg is None:
+                        raise ParseError(self, 'Unexpected {peek} in the '
+                                               'arguments of %s()' % name)
+                    args.append(arg)
+                    self.skip_spaces()
+                    if not self.accept.operators(','):
+                        self.expect(ParenToken, _is_closing_paren)
+                        break
+                    self.skip_spaces()
+        return FunctionCall(name, args)
+
+    def _p_url(self):
+        """ Matches url(...), keeping its content as is """
+        self.expect(FunctionToken)
+        parts = ['url(']
+        while not self.matches(ParenToken, _is_closing_paren):
+            if isinstance(self.peek(), (NewLineToken, EOFToken)):
+                raise ParseError(self, 'Expected ")" to close url(), but '
+                                       'got {peek}')
+            parts.append(_selector_text(self.next()))
+        self.next()
+        parts.append(')')
+        return Literal(Ident(''.join(parts)))
 
     def _p_keyframes(self):
         raise NotImplementedError()
@@ -174,7 +427,75 @@ class StylusParser(object):
         raise NotImplementedError()
 
     def _p_selector(self):
-        raise NotImplementedError()
+        """ Matches a group of comma separated selectors and their block """
+        selectors = [self._p_selector_parts()]
+        while self.accept.operators(','):
+            self.skip_whitespaces()
+            selectors.append(self._p_selector_parts())
+        block = SelectorBlock(selectors, parent=self.parent_node)
+        with self.push_state('selector'):
+            return self._p_block(block)
+
+    def _p_selector_parts(self):
+        """
+        Matches the tokens of a single selector (up to a comma, a line end or
+        a block start) and returns it
+        :rtype: Selector
+        """
+        parts = []
+        depth = 0
+        scanned = None
+        while True:
+            token = self.peek()
+            if isinstance(token, selector_end_tokens):
+                break
+            if isinstance(token, SelectorToken):
+                # the lexer scanned the rest of the selector, brackets and all
+                scanned = token.selector
+                depth = 0
+            elif isinstance(token, OperatorToken):
+                if depth == 0 and token.val in (',', '!'):
+                    break
+                if token.val == '[':
+                    depth += 1
+                elif token.val == ']':
+                    depth -= 1
+            elif isinstance(token, ParenToken):
+                depth += 1 if token.is_opening else -1
+            elif isinstance(token, FunctionToken):
+                depth += 1
+            parts.append(_selector_text(self.next()))
+        selector = ' '.join(''.join(parts).split())
+        if not selector:
+            raise ParseError(self, 'Expected a selector, but got {peek}')
+        if scanned is not None and scanned == selector:
+            return scanned
+        return parse_selector(selector)
+
+    def _p_block(self, block):
+        """
+        Matches an indented (or braced) list of statements, and adds them to
+        the block
+        :param Block block: The block to fill
+        :return: The filled block
+        """
+        if self.accept(OpeningBraceToken):
+            end_token = ClosingBraceToken
+            separators = (SpaceToken, IndentToken, OutdentToken, NewLineToken,
+                          SemicolonToken)
+        else:
+            self.expect(IndentToken)
+            end_token = OutdentToken
+            separators = (SpaceToken, NewLineToken, SemicolonToken)
+        with self.push_block(block):
+            self.skip_tokens(separators)
+            while not self.accept(end_token):
+                if self.matches(EOFToken):
+                    raise ParseError(self, 'Unexpected end of input, '
+                                           'expected the end of the block')
+                block.statements.append(self._p_statement())
+                self.skip_tokens(separators)
+        return block
 
     def _p_literal(self):
         raise NotImplementedError()
@@ -192,7 +513,20 @@ class StylusParser(object):
         raise NotImplementedError()
 
     def _p_extend(self):
-        raise NotImplementedError()
+        """ Matches an @extend directive: @extend sel[, sel...] [!optional] """
+        self.expect.atrules('extend')
+        selectors = [self._p_selector_parts()]
+        while self.accept.operators(','):
+            self.skip_spaces()
+            selectors.append(self._p_selector_parts())
+        optional = False
+        if self.matches.operators('!'):
+            token = self.lookahead(1)
+            if isinstance(token, IdentifierToken) and token.val == 'optional':
+                self.next()
+                self.next()
+                optional = True
+        return Extend(selectors, optional=optional)
 
     def _p_media(self):
         raise NotImplementedError()
@@ -207,33 +541,314 @@ class StylusParser(object):
         raise NotImplementedError()
 
     def _p_identifier(self):
-        raise NotImplementedError()
+        """
+        Matches a statement starting with an identifier: a function
+        definition, a selector, an assignment, a property or an expression
+        (like a mixin call)
+        """
+        if isinstance(self.peek(), FunctionToken):
+            if self.looks_like_function_definition():
+                return self._p_function_definition()
+            return self._p_expression()
+        if self.looks_like_selector():
+            return self._p_selector()
+        i = 1
+        while isinstance(self.lookahead(i), SpaceToken):
+            i += 1
+        token = self.lookahead(i)
+        if isinstance(token, OperatorToken):
+            if token.val in assignment_operators:
+                return self._p_assignment()
+            if token.val != ':':
+                return self._p_expression()
+        elif isinstance(token, expression_end_tokens):
+            return self._p_expression()
+        if self.states[-1] == 'root':
+            return self._p_expression()
+        return self._p_property()
+
+    def _p_assignment(self):
+        """ Matches name = expr (or ?=, +=, -=, etc...) """
+        name = self._p_id_name()
+        op = self.expect(OperatorToken).val
+        self.skip_spaces()
+        expr = self._p_expression()
+        if expr is None:
+            raise ParseError(self, 'Expected a value to assign to "%s", but '
+                                   'got {peek}' % name)
+        if op not in ('=', '?='):
+            expr = BinaryOperation(op[0], Identifier(name), expr)
+        return Identifier(name, expr, is_default=op == '?=')
+
+    def _p_function_definition(self):
+        """ Matches name(param, param=default...) followed by a block """
+        name = self.expect(FunctionToken).val
+        params = []
+        self.skip_spaces()
+        if not self.accept(ParenToken, _is_closing_paren):
+            while True:
+                param = self._p_id_name()
+                default = None
+                if self.accept.operators('='):
+                    self.skip_spaces()
+                    default = self._p_space_list()
+                params.append(Identifier(param, default))
+                self.skip_spaces()
+                if not self.accept.operators(','):
+                    self.expect(ParenToken, _is_closing_paren)
+                    break
+                self.skip_spaces()
+        self.skip_spaces()
+        if self.lazy_bodies and self.matches(IndentToken):
+            return Function(name, params, self._p_lazy_block())
+        block = Block(self.parent_node)
+        with self.push_state('function'):
+            self._p_block(block)
+        return Function(name, params, block)
+
+    def _p_lazy_block(self):
+        """
+        Collects the tokens of an indented block (up to its matching outdent)
+        without parsing them
+        :rtype: LazyBlock
+        """
+        tokens = [self.expect(IndentToken)]
+        depth = 1
+        while depth:
+            token = self.next()
+            if isinstance(token, IndentToken):
+                depth += 1
+            elif isinstance(token, OutdentToken):
+                depth -= 1
+            elif isinstance(token, EOFToken):
+                raise ParseError(self, 'Unexpected end of input, expected the '
+                                       'end of the block')
+            tokens.append(token)
+        return LazyBlock(self.parent_node, tokens,
+                         partial(parse_lazy_block, interner=self.interner))
 
     def _p_unless(self):
-        raise NotImplementedError()
+        return self._p_conditional()
 
     def _p_for(self):
-        raise NotImplementedError()
+        """ Matches for val[, key] in expr followed by a block """
+        self.expect.keywords('for')
+        self.skip_spaces()
+        val_name = self._p_id_name()
+        key_name = None
+        if self.accept.operators(','):
+            self.skip_spaces()
+            key_name = self._p_id_name()
+        self.expect.keywords('in')
+        self.skip_spaces()
+        loop = LoopBlock(parent=self.parent_node, val_name=val_name,
+                         key_name=key_name, loop_expr=self._p_expression())
+        with self.push_state('for'):
+            return self._p_block(loop)
 
     def _p_conditional(self):
-        raise NotImplementedError()
+        """ Matches if/unless cond, its block and the optional else part """
+        negate = self.expect.keywords('if', 'unless').val == 'unless'
+        self.skip_spaces()
+        condition = self._p_expression()
+        if condition is None:
+            raise ParseError(self, 'Expected a condition, but got {peek}')
+        block = Block(self.parent_node)
+        with self.push_state('conditional'):
+            self._p_block(block)
+        node = Conditional(condition, block, negate=negate)
+        self.skip_tokens((NewLineToken, SpaceToken))
+        if self.accept.keywords('else'):
+            self.skip_spaces()
+            if self.matches.keywords('if', 'unless'):
+                node.else_block = self._p_conditional()
+            else:
+                node.else_block = Block(self.parent_node)
+                with self.push_state('conditional'):
+                    self._p_block(node.else_block)
+        return node
 
     def _p_return(self):
-        raise NotImplementedError()
+        self.expect.keywords('return')
+        self.skip_spaces()
+        return Return(self._p_expression())
 
     def _p_property(self):
-        raise NotImplementedError()
+        """ Matches a property: name[:] value """
+        name = self.expect(IdentifierToken).val
+        self.skip_spaces()
+        self.accept.operators(':')
+        with self.push_state('property'):
+            expr = self._p_expression()
+        if expr is None:
+            raise ParseError(self, 'Expected a value for the property "%s", '
+                                   'but got {peek}' % name)
+        return Property(name, expr)
 
     def _p_functionCall(self):
         raise NotImplementedError()
 
     def looks_like_keyframe(self):
-        raise NotImplementedError()
-
+        """ Checks whether the current line is a keyframe selector (0%, 50%),
+        by matching it and rolling back
+        """
+        snapshot = self.snapshot()
+        try:
+            return self._p_keyframe_selector()
+        except ParseError:
+            return False
+        finally:
+            self.restore(snapshot)
+
+    def _p_keyframe_selector(self):
+        """ Matches a comma separated list of percentages that's followed by
+        a block """
+        while True:
+            number = self.expect(NumberToken)
+            if number.unit != '%':
+                raise ParseError(self, 'Expected a percentage, but got {peek}')
+            self.skip_spaces()
+            if not self.accept.operators(','):
+                break
+            self.skip_spaces()
+        self.expect((IndentToken, OpeningBraceToken))
+        return True
 
-postfix_allowed_nodes = (Expression,)  # tuple, not list (for isinstance)
+    def looks_like_function_definition(self):
+        """ Checks whether the current name(...) is followed by a block """
+        i = 1
+        depth = 1
+        while depth:
+            token = self.lookahead(i)
+            if isinstance(token, ParenToken):
+                depth += 1 if token.is_opening else -1
+            elif isinstance(token, FunctionToken):
+                depth += 1
+            elif isinstance(token, (NewLineToken, IndentToken, OutdentToken,
+                                    EOFToken)):
+                return False
+            i += 1
+        while isinstance(self.lookahead(i), SpaceToken):
+            i += 1
+        return isinstance(self.lookahead(i), (IndentToken, OpeningBraceToken))
+
+    def looks_like_selector(self):
+        """
+        Checks whether the current line is a selector, by looking for a block
+        (or a selector on the next line) after it
+        """
+        i = 0
+        while True:
+            token = self.lookahead(i)
+            if isinstance(token, (IndentToken, OpeningBraceToken)):
+                return True
+            if isinstance(token, OperatorToken) and token.val == ',' \
+                    and isinstance(self.lookahead(i + 1), NewLineToken):
+                return True
+            if isinstance(token, selector_end_tokens):
+                return False
+            i += 1
+
+
+postfix_allowed_nodes = (Expression, Property, Return)  # tuple, not list (for isinstance)
 selector_allowed_states = ('root', 'atblock', 'selector', 'conditional', 'function',
                            'atrule', 'for',)
+expression_start_tokens = (NumberToken, ColorToken, StringToken, BooleanValueToken,
+                           NullToken, LiteralToken, IdentifierToken)
+expression_end_tokens = (NewLineToken, IndentToken, OutdentToken, SemicolonToken,
+                         ClosingBraceToken, EOFToken)
+unary_operators = ('-', '+', '!', '~', 'not')
+assignment_operators = ('=', '?=', '+=', '-=', '*=', '/=', '%=')
+binary_precedence = {
+    '||': 1,
+    '&&': 2,
+    '==': 3, '!=': 3,
+    '<': 4, '<=': 4, '>': 4, '>=': 4,
+    '..': 5, '...': 5,
+    '+': 6, '-': 6,
+    '*': 7, '/': 7, '%': 7,
+    '**': 8,
+}
+selector_end_tokens = (NewLineToken, IndentToken, OutdentToken, OpeningBraceToken,
+                       ClosingBraceToken, SemicolonToken, CommentToken, EOFToken)
+
+
+def _is_opening_paren(token):
+    return token.is_opening
+
+
+def _is_closing_paren(token):
+    return not token.is_opening
+
+
+def _selector_text(token):
+    """ Returns the text a token had in the source, for building selectors """
+    if isinstance(token, SpaceToken):
+        return ' '
+    if isinstance(token, (OperatorToken, ParenToken)):
+        return token.val + token.spaces
+    if isinstance(token, FunctionToken):
+        return token.val + '(' + token.space
+    if isinstance(token, (ColorToken, NumberToken)):
+        return token.raw
+    if isinstance(token, StringToken):
+        return token.quote + token.val + token.quote
+    if isinstance(token, BooleanValueToken):
+        return ('true' if token.val else 'false') + token.spaces
+    if isinstance(token, NullToken):
+        return 'null'
+    return token.val
+
+
+class TokenReplay(object):
+    """ Serves recorded tokens to a parser (in place of a lexer) """
+    def __init__(self, tokens, interner=None):
+        """
+        :param list[Token] tokens: The tokens. They're followed by an EOF
+        :param InternTable interner: The intern table of the tokens' lexer
+        """
+        super(TokenReplay, self).__init__()
+        self.tokens = tokens
+        self.interner = interner
+        self.pos = 0
+        self.eof = EOFToken()
+        if tokens:
+            self.eof.line_num = tokens[-1].line_num
+            self.eof.column = tokens[-1].column
+
+    def lookahead(self, skip=1):
+        index = self.pos + skip - 1
+        return self.tokens[index] if index < len(self.tokens) else self.eof
+
+    def next(self):
+        token = self.lookahead()
+        self.pos += 1
+        return token
+
+    def peeked(self):
+        return self.lookahead()
+
+    def snapshot(self):
+        return self.pos
+
+    def restore(self, pos):
+        self.pos = pos
+
+
+def parse_lazy_block(block, interner=None):
+    """
+    Parses the tokens of a function body that was kept as tokens
+    :param LazyBlock block: The block
+    :param InternTable interner: The intern table of the tokens' lexer
+    :return: The statements of the block
+    :rtype: list[Statement]
+    """
+    parser = StylusParser(None, parent_node=block.parent,
+                          lexer=TokenReplay(block.tokens, interner))
+    body = Block(block.parent)
+    with parser.push_state('function'):
+        parser._p_block(body)
+    return body.statements
 
 
 class TokenMatcher(object):
@@ -257,8 +872,9 @@ class TokenMatcher(object):
             else:
                 msg += type_or_types.__name__
         if f:
-            msg += 'matching filter'
-        raise ParseError(self, 'Expected {0}, but got {{peek}}'.format(msg))
+            msg += ' matching filter'
+        raise ParseError(self.parser,
+                         'Expected {0}, but got {{peek}}'.format(msg))
 
     def operators(self, operator, *more_operators):
         keywords = [operator] + list(more_operators)
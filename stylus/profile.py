@@ -0,0 +1,285 @@
+"""
+Profiles the compilation of a stylus file, phase by phase (lex, parse,
+compile), for hot-spot reports against real sheets:
+
+    python -m <package>.stylus.profile sheet.styl [--top 20] [--output DIR]
+
+Each phase runs on a fresh input (so folding and caching in one run don't
+speed up the next) in several modes:
+- under cProfile: the top functions of the phase, and the time of every
+  parser production (_p_*). The stats are saved to <output>/<name>.<phase>.pstats
+- under a sampling profiler (SIGPROF): the stacks of all the phases are
+  written to <output>/<name>.collapsed, in the collapsed format of
+  flamegraph.pl and speedscope. Frames of lexer rules are named by their rule
+- with every lexer rule timed (lex phase only): the calls, matches and time
+  of each _l_* rule. Most rules are made by lexer.lex(), so cProfile can't
+  tell them apart
+- for memory: the growth of the resident memory, and the objects left
+  allocated by the phase, by the line that allocated them (with tracemalloc,
+  where it's available) or by type (from the garbage collector, which only
+  sees container objects)
+"""
+import argparse
+import codecs
+import cProfile
+import gc
+import os
+import pstats
+import signal
+import sys
+from collections import Counter
+from timeit import default_timer
+
+from .bounded import resident_memory
+from .emitter import CSSEmitter
+from .evaluator import Evaluator
+from .lexer import StylusLexer
+from .normalizer import Normalizer
+from .parser import StylusParser
+from .tokens import EOFToken
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+__all__ = ['Phase', 'phases', 'profile_phase', 'Sampler', 'time_rules',
+           'measure_memory', 'main']
+
+rule_names = dict((function, name) for name, function in
+                  vars(StylusLexer).iteritems() if name.startswith('_l_'))
+""" The names of the lexer rules, by their functions """
+
+
+class Phase(object):
+    def __init__(self, name, setup, run):
+        """
+        :param str name: The name of the phase
+        :param (unicode)->tuple setup: Makes the arguments of run from the
+            source (not profiled)
+        :param run: Runs the phase
+        """
+        super(Phase, self).__init__()
+        self.name = name
+        self.setup = setup
+        self.run = run
+
+
+def lex(lexer):
+    token = lexer.next()
+    while not isinstance(token, EOFToken):
+        token = lexer.next()
+
+
+def compile_tree(root):
+    tree = Evaluator(root).evaluate()
+    return CSSEmitter().emit(Normalizer(tree).normalize())
+
+
+phases = [
+    Phase('lex', lambda source: (StylusLexer(source, profile='production'),),
+          lex),
+    Phase('parse', lambda source: (StylusParser(source,
+                                                profile='production'),),
+          StylusParser.parse),
+    Phase('compile', lambda source: (StylusParser(
+        source, profile='production').parse(),), compile_tree),
+]
+
+
+def profile_phase(phase, source):
+    """ :rtype: pstats.Stats """
+    args = phase.setup(source)
+    profiler = cProfile.Profile()
+    profiler.runcall(phase.run, *args)
+    return pstats.Stats(profiler)
+
+
+def productions(stats):
+    """
+    :param pstats.Stats stats: The stats of a run
+    :return: The (name, calls, own secs, cumulative secs) of the parser
+        productions, slowest first
+    """
+    rows = [(name, calls, own, cumulative) for (_, _, name), (_, calls, own,
+            cumulative, _) in stats.stats.iteritems() if name.startswith('_p_')]
+    return sorted(rows, key=lambda row: -row[3])
+
+
+class Sampler(object):
+    """ A statistical profiler: samples the stack on every SIGPROF, and counts
+    the stacks in the collapsed format """
+    def __init__(self, interval=0.001):
+        """
+        :param float interval: The seconds of CPU time between samples
+        """
+        super(Sampler, self).__init__()
+        self.interval = interval
+        self.stacks = Counter()
+        self._prefix = None
+        self._base = None
+
+    def run(self, prefix, function, *args):
+        """
+        Runs the function, sampling its stacks
+        :param str prefix: The root frame of the stacks (the phase's name)
+        """
+        self._prefix = prefix
+        self._base = sys._getframe()
+        previous = signal.signal(signal.SIGPROF, self._sample)
+        signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+        try:
+            return function(*args)
+        finally:
+            signal.setitimer(signal.ITIMER_PROF, 0)
+            signal.signal(signal.SIGPROF, previous)
+
+    def _sample(self, signum, frame):
+        names = []
+        while frame is not None and frame is not self._base:
+            names.append(frame_name(frame))
+            frame = frame.f_back
+        names.append(self._prefix)
+        self.stacks[';'.join(reversed(names))] += 1
+
+    def write(self, path):
+        with open(path, 'w') as output:
+            for stack, count in sorted(self.stacks.iteritems()):
+                output.write('%s %d\n' % (stack, count))
+
+
+def frame_name(frame):
+    code = frame.f_code
+    name = code.co_name
+    if name == 'lex_func' and frame.f_back is not None:
+        # a rule made by lexer.lex(): the lexer is trying it in _lex_next
+        rule = frame.f_back.f_locals.get('rule')
+        name = rule_names.get(getattr(rule, 'im_func', None), name)
+    return '%s:%s' % (os.path.basename(code.co_filename), name)
+
+
+def time_rules(source):
+    """
+    Lexes the source with every rule timed
+    :return: The (name, calls, matches, secs) of each rule, slowest first
+    """
+    lexer = StylusLexer(source, profile='production')
+    counters = []
+
+    def timed(rule, name):
+        counter = [name, 0, 0, 0.0]
+        counters.append(counter)
+
+        def run():
+            start = default_timer()
+            token = rule()
+            counter[3] += default_timer() - start
+            counter[1] += 1
+            if token:
+                counter[2] += 1
+            return token
+        return run
+
+    lexer.rules = [timed(rule, rule_names.get(rule.im_func, rule.__name__))
+                   for rule in lexer.rules]
+    lex(lexer)
+    return sorted(map(tuple, counters), key=lambda row: -row[3])
+
+
+def measure_memory(phase, source, top):
+    """
+    :return: The growth of the resident memory (in bytes, or None), and the
+        (size in bytes or None, count, where) of the top allocations left by
+        the phase
+    """
+    args = phase.setup(source)
+    gc.collect()
+    memory = resident_memory()
+    if tracemalloc is not None:
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        result = phase.run(*args)
+        after = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        rows = [(stat.size_diff, stat.count_diff, str(stat.traceback))
+                for stat in after.compare_to(before, 'lineno')[:top]]
+    else:
+        before = _count_types()
+        result = phase.run(*args)
+        after = _count_types()
+        after.subtract(before)
+        rows = [(None, count, name) for name, count in after.most_common(top)
+                if count > 0]
+    growth = resident_memory()
+    growth = growth - memory if None not in (growth, memory) else None
+    del result
+    return growth, rows
+
+
+def _count_types():
+    return Counter(type(obj).__name__ for obj in gc.get_objects())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m %s' % __name__, description=__doc__.split('\n\n')[0])
+    parser.add_argument('file', help='The stylus file to profile')
+    parser.add_argument('--top', type=int, default=20,
+                        help='The number of rows in each table')
+    parser.add_argument('--output', default='.',
+                        help='The directory for the stats and stacks')
+    parser.add_argument('--interval', type=float, default=1.0,
+                        help='The milliseconds between stack samples')
+    options = parser.parse_args(argv)
+
+    with codecs.open(options.file, encoding='utf-8') as source_file:
+        source = source_file.read()
+    name = os.path.splitext(os.path.basename(options.file))[0]
+    prefix = os.path.join(options.output, name)
+    top = options.top
+
+    sampler = Sampler(options.interval / 1000.0)
+    for phase in phases:
+        stats = profile_phase(phase, source)
+        stats.dump_stats('%s.%s.pstats' % (prefix, phase.name))
+        print '=== %s ===' % phase.name
+        args = phase.setup(source)
+        start = default_timer()
+        sampler.run(phase.name, phase.run, *args)
+        print 'time (sampled run): %.1f ms' % (
+            (default_timer() - start) * 1000)
+        print
+        stats.sort_stats('tottime').print_stats(top)
+
+        if phase.name == 'lex':
+            print '%-28s %9s %9s %10s' % ('lexer rule', 'calls', 'matches',
+                                          'ms')
+            for rule, calls, matches, secs in time_rules(source)[:top]:
+                print '%-28s %9d %9d %10.2f' % (rule, calls, matches,
+                                                secs * 1000)
+            print
+        elif phase.name == 'parse':
+            print '%-28s %9s %10s %10s' % ('parser production', 'calls',
+                                           'own ms', 'total ms')
+            for production, calls, own, cumulative in \
+                    productions(stats)[:top]:
+                print '%-28s %9d %10.2f %10.2f' % (
+                    production, calls, own * 1000, cumulative * 1000)
+            print
+
+        growth, rows = measure_memory(phase, source, top)
+        if growth is not None:
+            print 'resident memory growth: %.1f MB' % (growth / 1e6)
+        print 'allocations left by the phase (%s):' % (
+            'by line' if tracemalloc is not None else 'by type')
+        for size, count, where in rows:
+            size = '%10.1f KB' % (size / 1024.0) if size is not None else ''
+            print '%s %9d  %s' % (size, count, where)
+        print
+
+    sampler.write(prefix + '.collapsed')
+    print 'wrote %s.collapsed and %s.<phase>.pstats' % (prefix, prefix)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,398 @@
+"""
+Static scope resolution.
+
+The ScopeAnalyzer gives every scope of the tree (the root, selector blocks,
+functions and loops) a SymbolTable mapping the names assigned in it to slot
+numbers, and resolves every identifier to the (level, slot) addresses it may
+refer to. At runtime, each scope gets a Frame, whose `display` holds the slot
+lists of all the enclosing frames by level, so a variable lookup is two list
+indexings instead of dict lookups up a chain of scopes.
+
+The analyzer stores its results on the tree:
+- Block.symbols / Function.symbols - The SymbolTable of the scope. A selector
+    block that assigns nothing shares its parent's table (and frame)
+- Identifier.address / Function.address - The (level, slot) a variable or a
+    function definition is stored in
+- Identifier.binding / FunctionCall.binding - The Binding of a reference
+"""
+from collections import namedtuple
+
+from ..ast import Block, SelectorBlock, LoopBlock, Expression, Literal, \
+    Identifier, ExpressionList, BinaryOperation, UnaryOperation, Ternary, \
+    FunctionCall, Conditional, Property, Return, Function, is_unloaded
+
+__all__ = ['ScopeAnalyzer', 'SymbolTable', 'Frame', 'Binding', 'UNSET',
+           'walk_expr', 'walk_expressions']
+
+UNSET = object()
+""" The value of slots that were not assigned (yet) """
+
+Binding = namedtuple('Binding', ['addresses', 'negate'])
+"""
+The resolution of a reference. addresses are the (level, slot) of every
+visible assignment of the name, innermost first. At runtime the first assigned
+one is used (a name assigned later in a scope is still unset before that).
+negate is set for -$name (lexed as a single identifier)
+"""
+
+
+class SymbolTable(object):
+    def __init__(self, parent=None):
+        """
+        :param SymbolTable parent: The table of the enclosing scope
+        """
+        super(SymbolTable, self).__init__()
+        self.parent = parent
+        self.level = parent.level + 1 if parent else 0
+        self.slots = {}
+        """ type: dict[str, int] """
+        self.definitions = {}
+        """ type: dict[int, list[Function]] functions defined in each slot """
+        self.variables = set()
+        """ type: set[int] slots that variables (or params) are assigned to """
+        self._bindings = {}
+
+    @property
+    def size(self):
+        return len(self.slots)
+
+    def declare(self, name, definition=None):
+        """
+        :param Function definition: The function defined by this name, if it's
+            not a variable
+        :return: The (level, slot) address of the name in this scope
+        """
+        slot = self.slots.get(name)
+        if slot is None:
+            slot = self.slots[name] = len(self.slots)
+            self._bindings.clear()
+        if definition is None:
+            self.variables.add(slot)
+        else:
+            self.definitions.setdefault(slot, []).append(definition)
+        return self.level, slot
+
+    def table_at(self, level):
+        """ :return: The table of the enclosing scope at the given level """
+        table = self
+        while table.level > level:
+            table = table.parent
+        return table
+
+    def definition_at(self, slot):
+        """
+        :return: The function that's always in the slot, or None if the slot
+            might hold a variable, or one of several definitions
+        :rtype: Function
+        """
+        definitions = self.definitions.get(slot)
+        if slot in self.variables or not definitions or len(definitions) > 1:
+            return None
+        return definitions[0]
+
+    def resolve(self, name):
+        """
+        :return: The binding of a reference to name from this scope
+        :rtype: Binding
+        """
+        binding = self._bindings.get(name)
+        if binding is None:
+            addresses = self._addresses(name)
+            negate = False
+            if not addresses and name.startswith('-') \
+                    and not name.startswith('--'):
+                addresses = self._addresses(name[1:])
+                negate = bool(addresses)
+            binding = self._bindings[name] = Binding(addresses, negate)
+        return binding
+
+    def _addresses(self, name):
+        addresses = []
+        table = self
+        while table is not None:
+            slot = table.slots.get(name)
+            if slot is not None:
+                addresses.append((table.level, slot))
+            table = table.parent
+        return tuple(addresses)
+
+
+class Frame(object):
+    """ The runtime storage of a scope """
+    def __init__(self, table, parent=None):
+        """
+        :param SymbolTable table: The table of the scope
+        :param Frame parent: The frame of the (lexically) enclosing scope
+        """
+        super(Frame, self).__init__()
+        self.table = table
+        self.parent = parent
+        self.values = [UNSET] * table.size
+        self.display = (parent.display if parent else ()) + (self.values,)
+
+    def get(self, binding, default=UNSET):
+        """ Returns the value of a resolved reference """
+        display = self.display
+        for level, slot in binding.addresses:
+            value = display[level][slot]
+            if value is not UNSET:
+                return value
+        return default
+
+    def set(self, address, value):
+        level, slot = address
+        self.display[level][slot] = value
+
+    def reset(self):
+        """ Unsets all the slots, so the frame can be reused (by loops) """
+        values = self.values
+        for i in xrange(len(values)):
+            values[i] = UNSET
+
+    def lookup_name(self, name, default=UNSET):
+        """ Looks a variable up by name (for dynamic lookups, like lookup()) """
+        frame = self
+        while frame is not None:
+            slot = frame.table.slots.get(name)
+            if slot is not None and frame.values[slot] is not UNSET:
+                return frame.values[slot]
+            frame = frame.parent
+        return default
+
+
+class ScopeAnalyzer(object):
+    def analyze(self, root):
+        """
+        Builds the symbol tables of the tree and resolves its identifiers
+        :param Block root: The tree (after constant folding)
+        """
+        root.symbols = SymbolTable()
+        self._declare_block(root, root.symbols)
+        self._resolve_block(root, root.symbols)
+        return root
+
+    def analyze_statement(self, stmt, table):
+        """
+        Analyzes one more statement of a scope whose earlier statements were
+        analyzed already (for compiling the root a statement at a time, see
+        bounded.py). Its references only see the names declared so far
+        :param SymbolTable table: The table of the scope
+        """
+        self._declare_statement(stmt, table)
+        self._resolve_statement(stmt, table)
+
+    def refresh(self, function):
+        """
+        Resolves the references in a function definition again, after more
+        names were declared in the enclosing scopes (a function defined before
+        the variables it reads, when the root is analyzed a statement at a
+        time). The cacheability of the functions is checked again too
+        :param Function function: The (analyzed) definition
+        """
+        for node in _scope_nodes(function):
+            if node.symbols is not None:
+                node.symbols._bindings.clear()
+            if isinstance(node, Function):
+                node.cacheable = None
+        self._resolve_statement(function, function.symbols.parent)
+
+    # Declarations
+
+    def _declare_block(self, block, table):
+        for stmt in block.statements:
+            self._declare_statement(stmt, table)
+
+    def _declare_statement(self, stmt, table):
+        if isinstance(stmt, Function):
+            stmt.address = table.declare(stmt.name, definition=stmt)
+            stmt.symbols = SymbolTable(table)
+            stmt.symbols.declare('arguments')
+            for param in stmt.params:
+                param.address = stmt.symbols.declare(param.name)
+                self._declare_expr(param.value, stmt.symbols)
+            if is_unloaded(stmt.block):
+                stmt.block.on_load.append(
+                    lambda block, function=stmt: self._analyze_loaded(function))
+            else:
+                self._declare_block(stmt.block, stmt.symbols)
+        elif isinstance(stmt, LoopBlock):
+            self._declare_expr(stmt.loop_expr, table)
+            stmt.symbols = SymbolTable(table)
+            stmt.symbols.declare(stmt.val_name)
+            if stmt.key_name:
+                stmt.symbols.declare(stmt.key_name)
+            self._declare_block(stmt, stmt.symbols)
+        elif isinstance(stmt, SelectorBlock):
+            if _assigns(stmt):
+                stmt.symbols = SymbolTable(table)
+            else:
+                stmt.symbols = table
+            self._declare_block(stmt, stmt.symbols)
+        elif isinstance(stmt, Conditional):
+            self._declare_expr(stmt.condition, table)
+            for branch in (stmt.block, stmt.else_block):
+                if branch is not None:
+                    self._declare_statement(branch, table)
+        elif isinstance(stmt, Block):
+            self._declare_block(stmt, table)
+        elif isinstance(stmt, Property):
+            self._declare_expr(stmt.expr, table)
+        elif isinstance(stmt, Return):
+            self._declare_expr(stmt.expr, table)
+        elif isinstance(stmt, Expression):
+            self._declare_expr(stmt, table)
+
+    def _analyze_loaded(self, function):
+        """ Analyzes a lazy function body once it's parsed """
+        self._declare_block(function.block, function.symbols)
+        for param in function.params:
+            self._resolve_expr(param.value, function.symbols)
+        self._resolve_block(function.block, function.symbols)
+
+    def _declare_expr(self, expr, table):
+        for node in walk_expr(expr):
+            if isinstance(node, Identifier) and node.value is not None:
+                node.address = table.declare(node.name)
+
+    # References
+
+    def _resolve_block(self, block, table):
+        for stmt in block.statements:
+            self._resolve_statement(stmt, table)
+
+    def _resolve_statement(self, stmt, table):
+        if isinstance(stmt, Function):
+            if is_unloaded(stmt.block):
+                return
+            for param in stmt.params:
+                self._resolve_expr(param.value, stmt.symbols)
+            self._resolve_block(stmt.block, stmt.symbols)
+        elif isinstance(stmt, LoopBlock):
+            self._resolve_expr(stmt.loop_expr, table)
+            self._resolve_block(stmt, stmt.symbols)
+        elif isinstance(stmt, SelectorBlock):
+            self._resolve_block(stmt, stmt.symbols)
+        elif isinstance(stmt, Conditional):
+            self._resolve_expr(stmt.condition, table)
+            for branch in (stmt.block, stmt.else_block):
+                if branch is not None:
+                    self._resolve_statement(branch, table)
+        elif isinstance(stmt, Block):
+            self._resolve_block(stmt, table)
+        elif isinstance(stmt, Property):
+            self._resolve_expr(stmt.expr, table)
+        elif isinstance(stmt, Return):
+            self._resolve_expr(stmt.expr, table)
+        elif isinstance(stmt, Expression):
+            self._resolve_expr(stmt, table)
+
+    def _resolve_expr(self, expr, table):
+        for node in walk_expr(expr):
+            if isinstance(node, Identifier):
+                node.binding = table.resolve(node.name)
+            elif isinstance(node, FunctionCall):
+                binding = table.resolve(node.name)
+                node.binding = binding if binding.addresses else None
+
+
+def walk_expr(expr):
+    """ Yields the expression and all of its sub-expressions """
+    stack = [expr]
+    while stack:
+        node = stack.pop()
+        if node is None or isinstance(node, Literal):
+            continue
+        yield node
+        if isinstance(node, Identifier):
+            stack.append(node.value)
+        elif isinstance(node, BinaryOperation):
+            stack.append(node.right)
+            stack.append(node.left)
+        elif isinstance(node, UnaryOperation):
+            stack.append(node.operand)
+        elif isinstance(node, ExpressionList):
+            stack.extend(reversed(node.items))
+        elif isinstance(node, FunctionCall):
+            stack.extend(reversed(node.args))
+        elif isinstance(node, Ternary):
+            stack.extend((node.false_expr, node.true_expr, node.condition))
+        elif isinstance(node, Conditional):
+            stack.append(node.condition)
+
+
+def _scope_nodes(stmt):
+    """ Yields the statement and the (loaded) blocks and functions in it """
+    stack = [stmt]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, Function):
+            yield node
+            if not is_unloaded(node.block):
+                stack.append(node.block)
+        elif isinstance(node, Conditional):
+            stack.extend(branch for branch in (node.block, node.else_block)
+                         if branch is not None)
+        elif isinstance(node, Block):
+            yield node
+            stack.extend(node.statements)
+
+
+def _assigns(block):
+    """ Whether the block (outside of nested scopes) assigns a variable or
+    defines a function
+    """
+    return any(_statement_assigns(stmt) for stmt in block.statements)
+
+
+def _statement_assigns(stmt):
+    if isinstance(stmt, Function):
+        return True
+    if isinstance(stmt, SelectorBlock):
+        return False
+    if isinstance(stmt, LoopBlock):
+        exprs = [stmt.loop_expr]
+    elif isinstance(stmt, Conditional):
+        if any(_statement_assigns(branch) for branch in
+               (stmt.block, stmt.else_block) if branch is not None):
+            return True
+        exprs = [stmt.condition]
+    elif isinstance(stmt, Block):
+        return _assigns(stmt)
+    elif isinstance(stmt, (Property, Return)):
+        exprs = [stmt.expr]
+    else:
+        exprs = [stmt]
+    return any(isinstance(node, Identifier) and node.value is not None
+               for expr in exprs for node in walk_expr(expr))
+
+
+def walk_expressions(stmt):
+    """
+    Yields all the expressions (and their sub-expressions) in a statement,
+    including the ones in nested blocks and function definitions
+    """
+    stack = [stmt]
+    while stack:
+        node = stack.pop()
+        if node is None:
+            continue
+        if isinstance(node, Function):
+            for param in node.params:
+                for expr in walk_expr(param.value):
+                    yield expr
+            stack.append(node.block)
+        elif isinstance(node, Block):
+            if isinstance(node, LoopBlock):
+                for expr in walk_expr(node.loop_expr):
+                    yield expr
+            stack.extend(reversed(node.statements))
+        elif isinstance(node, Conditional):
+            for expr in walk_expr(node.condition):
+                yield expr
+            stack.extend((node.else_block, node.block))
+        elif isinstance(node, (Property, Return)):
+            for expr in walk_expr(node.expr):
+                yield expr
+        elif isinstance(node, Expression):
+            for expr in walk_expr(node):
+                yield expr
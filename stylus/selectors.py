@@ -0,0 +1,244 @@
+"""
+Selectors as components: type (div), class (.btn), id (#main), attribute
+([href^="//"]), pseudo-class (:hover), pseudo-element (::before), combinator
+(' ', >, +, ~), parent reference (&) and placeholder ($name).
+
+scan() reads the components of a selector in one pass (each step matches one
+component, by its first character), stopping at the end of the selector: a
+comma, a line break, an opening brace or a // comment that isn't inside of an
+attribute or a pseudo-class's arguments (or, for a scan that might start
+inside of brackets, followed by a ] or ) that closes them).
+
+The lexer reaches a selector only where its other rules don't match, often in
+the middle of an attribute (a[href^="//x"]), so it scans the selector from the
+start of its line, or from the start of the last selector it scanned on the
+line (see selector_at), and passes the Selector on to the parser.
+The parser scans the selectors the lexer didn't (see parse_selector), so each
+one is scanned once.
+
+A Selector is a string (so it can be emitted, hashed and compared as one)
+that also has its components. Nesting (see normalizer.nest_selectors) joins
+the components of the parent and the nested selector, without parsing the
+resulting selector again.
+"""
+import re
+from collections import namedtuple
+
+from ..css_consts import pseudo_classes
+from ..utils import LRUCache
+
+__all__ = ['Selector', 'Component', 'scan', 'selector_at', 'parse_selector',
+           'as_selector', 'is_pseudo_class']
+
+TYPE = 'type'
+CLASS = 'class'
+ID = 'id'
+ATTRIBUTE = 'attribute'
+PSEUDO_CLASS = 'pseudo_class'
+PSEUDO = 'pseudo'
+""" A pseudo-class that isn't a known one (a vendor-specific one, a typo, or
+something that's not a selector at all) """
+PSEUDO_ELEMENT = 'pseudo_element'
+COMBINATOR = 'combinator'
+PARENT = 'parent'
+PLACEHOLDER = 'placeholder'
+OTHER = 'other'
+""" Anything else (a keyframe's 50%, an interpolation) """
+
+pseudo_class_names = frozenset(pseudo_classes)
+
+_args = r'(?:\((?:[^()\n]|\([^()\n]*\))*\))?'
+component_pattern = re.compile(r'''
+    (?P<attribute>\[(?:[^\]"'\n]|"[^"\n]*"|'[^'\n]*')*\])
+    |(?P<pseudo_element>::[\w-]+%(args)s)
+    |(?P<pseudo>:(?P<pseudo_name>[\w-]+)%(args)s)
+    |(?P<id>\#[\w-]+)
+    |(?P<class>\.[\w-]+)
+    |(?P<placeholder>\$[\w-]+)
+    |(?P<parent>&)
+    |(?P<type>\*|[A-Za-z_-][\w-]*)
+    |(?P<combinator>[ \t]*[>+~][ \t]*|[ \t]+)
+    |(?P<other>[\w%%]+|/(?!/)|[^,\n{/])
+''' % {'args': _args}, re.VERBOSE)
+
+spaces_pattern = re.compile(r'[ \t]*')
+closing_pattern = re.compile(r'//[^\[(\n]*[\])]')
+""" A // followed by a ] or ) that closes a bracket opened before it """
+
+Component = namedtuple('Component', ['kind', 'text'])
+
+DESCENDANT = Component(COMBINATOR, ' ')
+
+
+def is_pseudo_class(name):
+    """ Whether the name is a known pseudo-class (hover, nth-child,
+    -moz-focusring) """
+    if name.startswith('-'):
+        # a vendor prefix (-webkit-autofill)
+        name = name[name.find('-', 1) + 1:]
+    return name in pseudo_class_names
+
+
+def scan(text, pos=0, nested=False):
+    """
+    Reads the components of the selector at pos
+    :param unicode text: The text
+    :param int pos: Where the selector starts
+    :param bool nested: Whether pos might be inside of brackets opened before
+        it (a // followed by an unopened ] or ) is then inside of them, and
+        not a comment)
+    :return: The components, and the position where the selector ends
+    :rtype: (list[Component], int)
+    """
+    components = []
+    match = component_pattern.match(text, pos)
+    while True:
+        while match is not None:
+            kind = match.lastgroup
+            if kind == 'pseudo':
+                name = match.group('pseudo_name')
+                kind = PSEUDO_CLASS if is_pseudo_class(name) else PSEUDO
+            components.append(Component(kind, match.group()))
+            pos = match.end()
+            match = component_pattern.match(text, pos)
+        if not nested or closing_pattern.match(text, pos) is None:
+            return components, pos
+        components.append(Component(OTHER, u'//'))
+        pos += 2
+        match = component_pattern.match(text, pos)
+
+
+def selector_at(text, pos, start):
+    """
+    Reads the selector that goes on at pos, scanning it from the start of its
+    line (so the brackets and quotes opened before pos are known)
+    :param unicode text: The text
+    :param int pos: A position inside of the selector
+    :param int start: The start of the line (after its indentation), or the
+        start of a selector on the line that was returned before
+    :return: The selector (None if it couldn't be scanned from the start of
+        the line), the position where it ends, and the start of the last
+        selector scanned (a later call on the line can start there)
+    :rtype: (Selector, int, int)
+    """
+    while True:
+        components, end = scan(text, start)
+        if end > pos:
+            # the space before a brace isn't part of the selector
+            while components and components[-1].kind == COMBINATOR and \
+                    components[-1].text.isspace():
+                components.pop()
+            selector_text = u''.join([component.text
+                                      for component in components])
+            selector = _cache.get(selector_text)
+            if selector is None:
+                selector = _cache[selector_text] = Selector(components,
+                                                            selector_text)
+            return selector, end, start
+        if end == start or text[end:end + 1] not in (u',', u'{'):
+            break
+        # the next selector of a list (or of a nested block on the line)
+        start = spaces_pattern.match(text, end + 1).end()
+    return None, scan(text, pos, nested=True)[1], start
+
+
+class Selector(unicode):
+    """ The text of a selector, with its components """
+    __slots__ = ('_components', '_nested', 'has_parent_ref', 'is_placeholder')
+
+    def __new__(cls, components, text=None):
+        """
+        :param tuple[Component] components: The components
+        :param unicode text: The text (the joined components, by default)
+        """
+        components = tuple(components)
+        if text is None:
+            text = ''.join([component.text for component in components])
+        is_placeholder = False
+        for component in components:
+            if component.kind == PLACEHOLDER:
+                is_placeholder = True
+                break
+        return _make(cls, text, '&' in text, is_placeholder,
+                     components=components)
+
+    def __reduce__(self):
+        return parse_selector, (unicode(self),)
+
+    @property
+    def components(self):
+        """ type: tuple[Component] (the components of nested selectors are
+        joined when they're first needed, since mostly they're only emitted)
+        """
+        if self._components is None:
+            parent, nested = self._nested
+            if not nested.has_parent_ref:
+                components = parent.components + (DESCENDANT,) + \
+                    nested.components
+            else:
+                components = []
+                for component in nested.components:
+                    if component.kind == PARENT:
+                        components.extend(parent.components)
+                    elif '&' in component.text:
+                        # inside of a pseudo-class's arguments (:not(&))
+                        components.append(Component(
+                            component.kind,
+                            component.text.replace('&', parent)))
+                    else:
+                        components.append(component)
+                components = tuple(components)
+            self._components = components
+            self._nested = None
+        return self._components
+
+    def nest(self, parent):
+        """
+        :param Selector parent: The full selector of the enclosing block
+        :return: The full selector: the parent replacing the parent references
+            (&), or followed by this selector
+        :rtype: Selector
+        """
+        if self.has_parent_ref:
+            text = self.replace('&', parent)
+        else:
+            text = parent + ' ' + self
+        return _make(Selector, text, parent.has_parent_ref,
+                     parent.is_placeholder or self.is_placeholder,
+                     nested=(parent, self))
+
+
+def _make(cls, text, has_parent_ref, is_placeholder, components=None,
+          nested=None):
+    selector = unicode.__new__(cls, text)
+    selector._components = components
+    selector._nested = nested
+    selector.has_parent_ref = has_parent_ref
+    selector.is_placeholder = is_placeholder
+    return selector
+
+
+_cache = LRUCache(4096)
+
+
+def parse_selector(text):
+    """
+    Parses a selector (through a cache, so equal selectors are usually the
+    same object)
+    :param unicode text: The text of a single selector
+    :rtype: Selector
+    """
+    selector = _cache.get(text)
+    if selector is None:
+        components, end = scan(text)
+        if end < len(text):
+            components.append(Component(OTHER, text[end:]))
+        selector = _cache[text] = Selector(components, text)
+    return selector
+
+
+def as_selector(selector):
+    """ :return: The selector as a Selector (parsing it if it's a string) """
+    if isinstance(selector, Selector):
+        return selector
+    return parse_selector(selector)
@@ -0,0 +1,110 @@
+"""
+A compiler for servers: compiles sources (with per-request overrides, like
+user-customised themes) from many threads at once, sharing the work between
+them.
+
+Every compilation has its own lexer, parser, evaluator and output tree; what
+the threads share is read-only once it's made, or guarded by a lock:
+
+- the parsed, prepared tree of each source (a VariantCompiler per source, so
+  the nodes that don't depend on the overrides are shared too), made once:
+  the threads that ask for a source while it's being parsed wait for that
+  parse (see SharedCompiler.compiler). Function bodies parsed lazily are loaded under
+  ast._load_lock
+- the memo caches of the built-in functions, the call cache and the emitted
+  rules (LRUCaches, which lock their own operations)
+- the lexer's patterns and the unit and pseudo-class tables (compiled at
+  import)
+
+    compiler = SharedCompiler()
+    # in any thread
+    css = compiler.compile(source, {'$brand': parse_value(user_color)})
+"""
+import hashlib
+import threading
+
+from ..utils import LRUCache
+from . import instrumentation
+from .variants import VariantCompiler
+
+__all__ = ['SharedCompiler']
+
+stats = instrumentation.get_stats('shared')
+
+
+class SharedCompiler(object):
+    def __init__(self, indent='  ', max_sources=64):
+        """
+        :param str indent: The indentation of the output
+        :param int max_sources: The number of sources whose trees are kept
+        """
+        super(SharedCompiler, self).__init__()
+        self.indent = indent
+        self._compilers = LRUCache(max_sources)
+        """ type: LRUCache[str, VariantCompiler] by the hash of the source """
+        self._lock = threading.Lock()
+        self._pending = {}
+        """ type: dict[str, _Build] The sources being parsed, so each is parsed
+        once even when many threads ask for it (guarded by _lock) """
+
+    def compile(self, source, overrides=None):
+        """
+        Compiles a source
+        :param unicode source: The stylus source
+        :param dict overrides: Values for root variables, by name ('$brand')
+        :return: The CSS text
+        :rtype: str
+        """
+        return self.compiler(source).compile(overrides)
+
+    def compiler(self, source):
+        """
+        :return: The compiler of the source's tree (parsing the source if it's
+            not cached)
+        :rtype: VariantCompiler
+        """
+        key = hashlib.sha1(source.encode('utf-8')).digest()
+        compiler = self._compilers.get(key)
+        if compiler is not None:
+            stats.incr('tree_hits')
+            return compiler
+        with self._lock:
+            # the build is stored in _compilers before it leaves _pending, so
+            # checking both under the lock never misses a finished build
+            compiler = self._compilers.get(key)
+            build = self._pending.get(key) if compiler is None else None
+            is_builder = compiler is None and build is None
+            if is_builder:
+                build = self._pending[key] = _Build()
+        if compiler is not None:
+            stats.incr('tree_hits')
+            return compiler
+        if not is_builder:
+            build.done.wait()
+            if build.error is not None:
+                raise build.error
+            stats.incr('tree_hits')
+            return build.compiler
+        try:
+            build.compiler = VariantCompiler(source, self.indent)
+            self._compilers[key] = build.compiler
+            stats.incr('tree_misses')
+        except Exception as error:
+            build.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._pending[key]
+            build.done.set()
+        return build.compiler
+
+
+class _Build(object):
+    """ A source being parsed by one thread, that other threads wait for """
+    def __init__(self):
+        super(_Build, self).__init__()
+        self.done = threading.Event()
+        self.compiler = None
+        self.error = None
+        """ The exception the parse raised (raised again in the waiting
+        threads) """
@@ -1,4 +1,4 @@
-from ast.values import Color
+from ..ast.values import Color
 
 
 __all__ = ['OutdentToken', 'IndentToken', 'EOFToken', 'NullToken', 'LiteralToken',
@@ -29,7 +29,7 @@ class ValuableToken(Token):
         self.val = val
 
     def __str__(self):
-        return self.val
+        return '%s' % (self.val,)
 
     def __repr__(self):
         return '<%s (%r) at %d:%d>' % (type(self).__name__, self.val,
@@ -89,13 +89,15 @@ class ClosingBraceToken(Token):
 
 
 class ParenToken(ValuableToken):
-    def __init__(self, is_opening):
+    def __init__(self, is_opening, spaces=''):
         """
         :param bool is_opening: Whether this is an opening paren '('.
             False for closing one ')'
+        :param spaces: The spaces after the paren
         """
         super(ParenToken, self).__init__('(' if is_opening else ')')
         self.is_opening = is_opening
+        self.spaces = spaces
 
 
 class KeywordToken(ValuableToken):
@@ -173,11 +175,23 @@ class StringToken(ValuableToken):
 
 
 class ColorToken(ValuableToken):
-    """ A color value """
-    def __init__(self, r, g, b, a):
-        super(ColorToken, self).__init__(Color(r, g, b, a))
+    """ A color value (containing the raw text it was written as) """
+    def __init__(self, color, raw=None):
+        """
+        :param Color color: The color
+        :param str raw: The color as written in the source
+        """
+        super(ColorToken, self).__init__(color)
+        self.raw = raw
 
 
 class SelectorToken(ValuableToken):
-    """ A part of a selector """
-    pass
+    """ The rest of a selector (from where the other tokens don't match) """
+    def __init__(self, val, selector=None):
+        """
+        :param unicode val: The text of the token
+        :param Selector selector: The whole selector the token ends, as the
+            lexer scanned it from its start (None if it couldn't be)
+        """
+        super(SelectorToken, self).__init__(val)
+        self.selector = selector
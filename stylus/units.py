@@ -0,0 +1,141 @@
+"""
+The CSS units: their dimensions, how to recognize them and how to convert
+between them.
+
+The registry is built once, when the module is imported:
+- Unit objects are interned (one per name). They are strings, so they can be
+    used anywhere a unit name is, but they also know their dimension
+- A compiled pattern matches a unit name, longest names first (so 'vmax' is
+    not read as 'vm' + 'ax', and 'ms' is not read as 'm' + 's')
+- A conversion matrix holds the factor between every two convertible units,
+    so converting a value is a single dict lookup
+"""
+import math
+import re
+
+from ..css_consts import units as unit_names
+
+__all__ = ['Unit', 'UnitRegistry', 'registry', 'get_unit',
+           'conversion_factor', 'LENGTH', 'ANGLE', 'TIME', 'FREQUENCY',
+           'RESOLUTION', 'PERCENTAGE', 'FLEX']
+
+LENGTH = 'length'
+ANGLE = 'angle'
+TIME = 'time'
+FREQUENCY = 'frequency'
+RESOLUTION = 'resolution'
+PERCENTAGE = 'percentage'
+FLEX = 'flex'
+
+_definitions = {
+    # name: (dimension, size in the dimension's base unit). Relative units
+    # have no fixed size, so they can't be converted
+    'em': (LENGTH, None), 'ex': (LENGTH, None), 'ch': (LENGTH, None),
+    'rem': (LENGTH, None), 'vw': (LENGTH, None), 'vh': (LENGTH, None),
+    'vmin': (LENGTH, None), 'vmax': (LENGTH, None),
+    'px': (LENGTH, 1.0), 'in': (LENGTH, 96.0), 'cm': (LENGTH, 96 / 2.54),
+    'mm': (LENGTH, 96 / 25.4), 'pt': (LENGTH, 96 / 72.0),
+    'pc': (LENGTH, 96 / 6.0),
+    'deg': (ANGLE, 1.0), 'grad': (ANGLE, 0.9), 'rad': (ANGLE, 180 / math.pi),
+    'turn': (ANGLE, 360.0),
+    's': (TIME, 1.0), 'ms': (TIME, 0.001),
+    'Hz': (FREQUENCY, 1.0), 'kHz': (FREQUENCY, 1000.0),
+    'dppx': (RESOLUTION, 1.0), 'x': (RESOLUTION, 1.0),
+    'dpi': (RESOLUTION, 1 / 96.0), 'dpcm': (RESOLUTION, 2.54 / 96),
+    '%': (PERCENTAGE, None),
+    'fr': (FLEX, None),
+}
+
+
+class Unit(str):
+    """ A (interned) unit name, with its dimension """
+    def __new__(cls, name, dimension, size=None):
+        """
+        :param str name: The unit name
+        :param str dimension: LENGTH, ANGLE, TIME, FREQUENCY, RESOLUTION,
+            PERCENTAGE or FLEX
+        :param float|None size: The size of the unit in the base unit of its
+            dimension (px, deg, s, Hz, dppx), if it's absolute
+        """
+        unit = super(Unit, cls).__new__(cls, name)
+        unit.dimension = dimension
+        unit.size = size
+        return unit
+
+    def __reduce__(self):
+        # unpickle into the interned unit
+        return get_unit, (str(self),)
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __repr__(self):
+        return 'Unit(%s)' % str.__repr__(self)
+
+
+class UnitRegistry(object):
+    def __init__(self, names, definitions):
+        """
+        :param list[str] names: The names of the units to register
+        :param dict[str, tuple] definitions: The (dimension, size) of each
+            unit (see Unit)
+        """
+        super(UnitRegistry, self).__init__()
+        self.units = {}
+        """ type: dict[str, Unit] """
+        for name in names:
+            dimension, size = definitions[name]
+            self.units[name] = Unit(name, dimension, size)
+
+        ordered = sorted(self.units, key=lambda name: (-len(name), name))
+        self.pattern = '|'.join(re.escape(name) for name in ordered)
+        """ A regex alternation of the unit names, longest first """
+        self.matcher = re.compile(self.pattern)
+
+        self.factors = {}
+        """ type: dict[(str, str), float] The factor to multiply a value by,
+        to convert it from the first unit to the second """
+        for source in self.units.itervalues():
+            for target in self.units.itervalues():
+                if source.dimension == target.dimension and \
+                        source.size is not None and target.size is not None:
+                    self.factors[(source, target)] = source.size / target.size
+
+    def get(self, name):
+        """ :return: The interned unit with that name (or None) """
+        return self.units.get(name)
+
+    def match(self, text, pos=0):
+        """ :return: The name of the unit at pos in text (or None) """
+        match = self.matcher.match(text, pos)
+        return self.units[match.group()] if match else None
+
+    def factor(self, source, target):
+        """ :return: The conversion factor between the units, or None if they
+        can't be converted
+        """
+        if source == target:
+            return 1.0
+        return self.factors.get((source, target))
+
+
+registry = UnitRegistry(unit_names, _definitions)
+
+
+def get_unit(name):
+    """ :return: The interned unit with that name, or the name itself if it's
+    not a known unit
+    """
+    if name is None:
+        return None
+    return registry.units.get(name, name)
+
+
+def conversion_factor(source, target):
+    """ :return: The factor that converts values from source to target units
+    (None if they are not convertible)
+    """
+    return registry.factor(source, target)
@@ -0,0 +1,288 @@
+"""
+Compiles many variants of one stylus source (themes, dark mode, densities),
+each with different values for some root variables.
+
+The source is parsed, folded and scope-analyzed once, and all the variants
+are evaluated against that one tree. Root statements that can't be affected
+by the overridden variables (they don't read them, directly or through other
+variables and functions) are evaluated once; the evaluated nodes are frozen
+and shared by all the variants, and so is their emitted text (within one
+compile_all() call). Calls of cacheable functions and mixins are shared too
+(see call_cache).
+
+    compiler = VariantCompiler(source)
+    css = compiler.compile_all({
+        'light': {},
+        'dark': {'$background': parse_value('#222')},
+    }, processes=4)
+"""
+import multiprocessing
+import threading
+from collections import OrderedDict
+
+from ..ast import Block, Root, Identifier, Literal, FunctionCall, \
+    Conditional, Function
+from ..utils import LRUCache
+from ..exceptions import CompileError
+from . import instrumentation
+from .call_cache import CallCache, share
+from .emitter import CSSEmitter
+from .evaluator import Evaluator, ConstantFolder
+from .functions import builtins
+from .normalizer import Normalizer
+from .parser import StylusParser
+from .scope import walk_expressions
+
+__all__ = ['VariantCompiler', 'VariantEvaluator', 'parse_value']
+
+stats = instrumentation.get_stats('variants')
+
+
+class VariantEvaluator(Evaluator):
+    """ An evaluator that reuses the evaluated nodes of some root statements
+    instead of evaluating them
+    """
+    def __init__(self, root, shared=None, **kwargs):
+        """
+        :param dict[int, tuple] shared: The (frozen) evaluated nodes of root
+            statements, by their index
+        """
+        super(VariantEvaluator, self).__init__(root, **kwargs)
+        self.shared = shared or {}
+
+    def evaluate(self):
+        self.prepare()
+        output = Root()
+        frame = self.root_frame()
+        for index, stmt in enumerate(self.root.statements):
+            nodes = self.shared.get(index)
+            if nodes is None:
+                self.eval_statement(stmt, output, frame)
+                stats.incr('evaluated_statements')
+            else:
+                output.statements.extend(nodes)
+                stats.incr('reused_statements')
+        return output
+
+
+class VariantCompiler(object):
+    def __init__(self, source, indent='  '):
+        """
+        :param unicode source: The stylus source (parsed right away)
+        :param str indent: The indentation of the output
+        """
+        super(VariantCompiler, self).__init__()
+        self.root = StylusParser(source, profile='production').parse()
+        self.indent = indent
+        self.call_cache = CallCache()
+        self._shared = LRUCache(64)
+        """ type: LRUCache[frozenset, dict[int, tuple]] The shared nodes, by
+        the names of the overridden variables """
+        self._lock = threading.Lock()
+        """ Guards evaluating the shared nodes (compile() can be called from
+        many threads) """
+        Evaluator(self.root).prepare()
+
+    def compile(self, overrides=None, names=None, rule_cache=None):
+        """
+        Compiles one variant
+        :param dict overrides: Values for root variables, by name ('$brand')
+        :param names: The names of all the variables overridden in this batch
+            of variants (the nodes that don't depend on any of them are shared)
+        :param dict rule_cache: The emitted text of the shared rules, kept
+            between the variants of a batch (see CSSEmitter)
+        :return: The CSS text
+        :rtype: str
+        """
+        overrides = overrides or {}
+        names = frozenset(names or ()) | frozenset(overrides)
+        evaluator = VariantEvaluator(self.root, self.shared_nodes(names),
+                                     call_cache=self.call_cache,
+                                     overrides=overrides)
+        tree = evaluator.evaluate()
+        stats.incr('variants')
+        rules = Normalizer(tree).normalize()
+        return CSSEmitter(self.indent, cache=rule_cache).emit(rules)
+
+    def compile_all(self, variants, processes=None):
+        """
+        Compiles all the variants
+        :param dict[str, dict] variants: The overrides of each variant, by
+            the variant's name
+        :param int processes: The number of processes to compile in. By
+            default everything is compiled in this process
+        :return: The CSS of each variant, by name (in the order of variants)
+        :rtype: OrderedDict[str, str]
+        """
+        names = frozenset(name for overrides in variants.itervalues()
+                          for name in overrides)
+        # evaluate the shared nodes before forking, so all the workers get
+        # them
+        self.shared_nodes(names)
+        items = [(variant, overrides, names)
+                 for variant, overrides in variants.iteritems()]
+        if processes and processes > 1 and len(items) > 1:
+            pool = multiprocessing.Pool(processes, _init_worker, (self,))
+            try:
+                results = pool.map(_compile_in_worker, items)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            rule_cache = {}
+            results = [(variant, self.compile(overrides, names, rule_cache))
+                       for variant, overrides, names in items]
+        return OrderedDict(results)
+
+    def write_all(self, variants, writer, processes=None):
+        """
+        Compiles all the variants into artifacts, named by their variants
+        (see compile_all)
+        :param ArtifactWriter writer: The writer of the artifacts
+        :return: The artifacts of each variant, by name
+        :rtype: OrderedDict[str, Artifact]
+        """
+        artifacts = OrderedDict(
+            (variant, writer.write(variant, css)) for variant, css in
+            self.compile_all(variants, processes).iteritems())
+        writer.save()
+        return artifacts
+
+    def shared_nodes(self, names):
+        """
+        Evaluates the root statements that don't depend on the given
+        variables (once per set of names)
+        :param frozenset[str] names: The names of the overridden variables
+        :return: The frozen nodes of each independent statement, by index
+        :rtype: dict[int, tuple]
+        """
+        shared = self._shared.get(names)
+        if shared is not None:
+            return shared
+        with self._lock:
+            shared = self._shared.get(names)
+            if shared is None:
+                shared = self._shared[names] = self._evaluate_shared(names)
+        return shared
+
+    def _evaluate_shared(self, names):
+        independent = self.independent_statements(names)
+        evaluator = Evaluator(self.root, call_cache=self.call_cache)
+        frame = evaluator.root_frame()
+        output = Root()
+        shared = {}
+        for index, stmt in enumerate(self.root.statements):
+            if index in independent:
+                block = Block(None)
+                evaluator.eval_statement(stmt, block, frame)
+                shared[index] = share(block.statements)
+                output.statements.extend(block.statements)
+            else:
+                evaluator.eval_statement(stmt, output, frame)
+        return shared
+
+    def independent_statements(self, names):
+        """
+        Finds the root statements whose output is the same in all the
+        variants: statements that don't read any of the overridden variables
+        (or variables and functions assigned from them), don't call impure
+        built-ins, and don't assign root variables themselves (those are
+        cheap, and have to run in every variant to set up its frame)
+        :param frozenset[str] names: The names of the overridden variables
+        :rtype: set[int]
+        """
+        table = self.root.symbols
+        effects = [root_effects(stmt, table.level)
+                   for stmt in self.root.statements]
+        tainted = set(table.slots[name] for name in names
+                      if name in table.slots)
+        dependent = set(index for index, (_, _, impure) in enumerate(effects)
+                        if impure)
+        changed = True
+        while changed:
+            changed = False
+            for index, (reads, writes, _) in enumerate(effects):
+                if index not in dependent and not reads.isdisjoint(tainted):
+                    dependent.add(index)
+                    changed = True
+                if index in dependent and not writes <= tainted:
+                    tainted |= writes
+                    changed = True
+        return set(index for index, (_, writes, _) in enumerate(effects)
+                   if index not in dependent and not writes)
+
+
+def root_effects(stmt, level):
+    """
+    :return: The root slots the statement reads (variables and functions),
+        the root slots it assigns, and whether it calls impure built-ins
+    :rtype: (set[int], set[int], bool)
+    """
+    reads, writes = set(), set()
+    impure = False
+    for expr in walk_expressions(stmt):
+        if isinstance(expr, Identifier):
+            if expr.binding is not None:
+                reads.update(slot for slot_level, slot in
+                             expr.binding.addresses if slot_level == level)
+            if expr.address is not None and expr.address[0] == level:
+                writes.add(expr.address[1])
+        elif isinstance(expr, FunctionCall):
+            if expr.binding is not None:
+                reads.update(slot for slot_level, slot in
+                             expr.binding.addresses if slot_level == level)
+            else:
+                builtin = builtins.get(expr.name)
+                impure = impure or (builtin is not None and not builtin.pure)
+    for function in defined_functions(stmt):
+        if function.address[0] == level:
+            writes.add(function.address[1])
+    return reads, writes, impure
+
+
+def defined_functions(stmt):
+    """ Yields the function definitions in a statement (and its blocks) """
+    if isinstance(stmt, Function):
+        yield stmt
+        stmt = stmt.block
+    if isinstance(stmt, Conditional):
+        branches = (stmt.block, stmt.else_block)
+    elif isinstance(stmt, Block):
+        branches = stmt.statements
+    else:
+        branches = ()
+    for branch in branches:
+        for function in defined_functions(branch):
+            yield function
+
+
+def parse_value(text):
+    """
+    Parses a constant stylus value (for overrides): '#222', '14px',
+    'lighten(#000, 10%)', 'Helvetica, Arial'
+    :param unicode text: The value
+    :return: The value (from ast.values)
+    """
+    root = StylusParser(u'$value = %s\n' % text, profile='production').parse()
+    ConstantFolder().fold(root)
+    stmt = root.statements[0] if len(root.statements) == 1 else None
+    if not isinstance(stmt, Identifier) or \
+            not isinstance(stmt.value, Literal):
+        raise CompileError('Not a constant value: %s' % text)
+    return stmt.value.value
+
+
+_worker_compiler = None
+_worker_rule_cache = None
+
+
+def _init_worker(compiler):
+    global _worker_compiler, _worker_rule_cache
+    _worker_compiler = compiler
+    _worker_rule_cache = {}
+
+
+def _compile_in_worker(item):
+    variant, overrides, names = item
+    return variant, _worker_compiler.compile(overrides, names,
+                                             _worker_rule_cache)
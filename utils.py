@@ -1,3 +1,6 @@
+import threading
+from collections import OrderedDict
+
 
 def chunks(l, n):
     """ Yield successive n-sized chunks from l.
@@ -5,3 +8,42 @@ def chunks(l, n):
     """
     for i in xrange(0, len(l), n):
         yield l[i:i+n]
+
+
+class LRUCache(object):
+    """ A mapping holding up to maxsize items. When full, the least recently
+    used item is dropped. It's safe to share between threads
+    """
+    def __init__(self, maxsize=1024):
+        super(LRUCache, self).__init__()
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value = self._data.pop(key)
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data[key] = value  # move to the end (most recently used)
+            self.hits += 1
+            return value
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = value
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def __len__(self):
+        return len(self._data)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = 0